@@ -0,0 +1,222 @@
+"""
+AkShare 接口的磁盘缓存
+- 以 (函数名, 参数) 的哈希为键，DataFrame 存为 Parquet (未安装 pyarrow 时退化为 pickle)
+- 支持 TTL 过期、按总大小的 LRU 淘汰、bypass (强制走网络并刷新缓存)
+- 三大报表接口缓存半天：同一天内重复加载不走网络，新披露的报告期最迟半天后即可取到
+- 目录总大小只在首次写入时扫描一次，之后按写入增量维护，超过上限时才扫描淘汰
+
+用法:
+    import akshare
+    from ak_cache import CachedAPI
+    ak = CachedAPI(akshare)
+    df = ak.stock_financial_report_sina(stock="600519", symbol="利润表")
+"""
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import pandas as pd
+
+# 尝试导入 pyarrow (Parquet 存储)
+try:
+    import pyarrow  # noqa: F401
+    HAS_PARQUET = True
+except ImportError:
+    HAS_PARQUET = False
+
+CACHE_DIR = Path(__file__).parent / "cache" / "akshare"
+
+# 默认过期时间 (秒)
+DEFAULT_TTL = 24 * 3600
+# 三大报表的过期时间：必须有限，否则 fetch_many / 定时增量刷新永远取不到新披露的报告期
+STATEMENT_TTL = 12 * 3600
+# 按接口单独设置过期时间
+TTL_OVERRIDES = {
+    'stock_financial_report_sina': STATEMENT_TTL,
+    'stock_financial_hk_report_em': STATEMENT_TTL,
+    # 实时类接口
+    'stock_individual_info_em': 300,
+}
+# 缓存目录总大小上限 (超过后按最近使用时间淘汰到上限的 EVICT_TO 比例，避免每次写入都触发淘汰)
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+EVICT_TO = 0.9
+# 每写入 RESCAN_EVERY 次重新扫描一次目录，校准总大小 (计入其他进程写入的条目)
+RESCAN_EVERY = 1000
+
+
+class CachedAPI:
+    """akshare 模块的缓存代理，接口调用方式与 akshare 完全一致"""
+
+    def __init__(self, api, cache_dir=CACHE_DIR, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES, bypass=None):
+        self.api = api
+        self.cache_dir = Path(cache_dir)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        # bypass=True：不读缓存，但仍写入最新结果 (用于"强制更新")
+        if bypass is None:
+            bypass = os.getenv('AK_CACHE_BYPASS') == '1'
+        self.bypass = bypass
+        self.hits = 0
+        self.misses = 0
+        # 缓存目录总大小 (首次写入时扫描，之后增量维护)
+        self._total = None
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        func = getattr(self.api, name)
+        if not callable(func):
+            return func
+
+        def cached(*args, **kwargs):
+            return self.call(name, *args, **kwargs)
+        return cached
+
+    def call(self, func_name, *args, **kwargs):
+        """带缓存地调用 api.func_name(*args, **kwargs)"""
+        key = self._key(func_name, args, kwargs)
+        ttl = TTL_OVERRIDES.get(func_name, self.ttl)
+
+        if not self.bypass:
+            result = self._read(key, ttl)
+            if result is not None:
+                with self._lock:
+                    self.hits += 1
+                return result
+
+        with self._lock:
+            self.misses += 1
+        result = getattr(self.api, func_name)(*args, **kwargs)
+        self._write(key, result)
+        return result
+
+    def clear(self):
+        """清空缓存"""
+        for path in self._entries():
+            path.unlink(missing_ok=True)
+        with self._lock:
+            self._total = 0
+
+    # --- 内部实现 ---
+
+    def _key(self, func_name, args, kwargs):
+        payload = json.dumps([func_name, list(args), sorted(kwargs.items())], ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _paths(self, key):
+        base = self.cache_dir / key[:2] / key
+        return base.with_suffix('.parquet'), base.with_suffix('.pkl')
+
+    def _entries(self):
+        if not self.cache_dir.exists():
+            return []
+        return [p for p in self.cache_dir.glob('*/*') if p.suffix in ('.parquet', '.pkl')]
+
+    def _read(self, key, ttl):
+        for path in self._paths(key):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            if time.time() - stat.st_mtime > ttl:
+                path.unlink(missing_ok=True)
+                self._track(-stat.st_size, write=False)
+                return None
+            try:
+                if path.suffix == '.parquet':
+                    result = pd.read_parquet(path)
+                else:
+                    with open(path, 'rb') as f:
+                        result = pickle.load(f)
+            except Exception as e:
+                print(f"  ⚠️ 缓存读取失败，重新下载: {e}")
+                path.unlink(missing_ok=True)
+                return None
+            # 记录访问时间 (LRU 依据)，TTL 仍以写入时间为准
+            os.utime(path, (time.time(), stat.st_mtime))
+            return result
+        return None
+
+    def _write(self, key, result):
+        parquet_path, pickle_path = self._paths(key)
+        parquet_path.parent.mkdir(parents=True, exist_ok=True)
+
+        old_size = _size(parquet_path) + _size(pickle_path)
+
+        # 先写临时文件再原子替换，避免并发读到半个文件
+        fd, tmp = tempfile.mkstemp(dir=parquet_path.parent, suffix='.tmp')
+        os.close(fd)
+        try:
+            target = pickle_path
+            if HAS_PARQUET and isinstance(result, pd.DataFrame):
+                try:
+                    result.to_parquet(tmp)
+                    target = parquet_path
+                except Exception:
+                    # 混合类型的 object 列等 Parquet 不支持的情况，退化为 pickle
+                    target = pickle_path
+            if target is pickle_path:
+                with open(tmp, 'wb') as f:
+                    pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, target)
+            # 同一个键只保留一种格式
+            other = pickle_path if target is parquet_path else parquet_path
+            other.unlink(missing_ok=True)
+        except Exception as e:
+            print(f"  ⚠️ 缓存写入失败: {e}")
+            Path(tmp).unlink(missing_ok=True)
+            return
+
+        if self._track(_size(target) - old_size):
+            self._evict()
+
+    def _track(self, delta, write=True):
+        """维护目录总大小，返回是否超过上限 (首次写入与每 RESCAN_EVERY 次写入时扫描目录校准)"""
+        with self._lock:
+            if not write:
+                # 删除条目：还没扫描过时，首次写入的扫描会一并计入
+                if self._total is not None:
+                    self._total += delta
+                return False
+            self._writes += 1
+            if self._total is None or self._writes % RESCAN_EVERY == 0:
+                self._total = sum(size for _, size, _ in self._scan())
+            else:
+                self._total += delta
+            return self._total > self.max_bytes
+
+    def _scan(self):
+        """[(最近访问时间, 大小, 路径)]"""
+        entries = []
+        for path in self._entries():
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_atime, stat.st_size, path))
+        return entries
+
+    def _evict(self):
+        """总大小超过上限时，按最近访问时间淘汰最旧的条目，直到低于上限的 EVICT_TO"""
+        entries = self._scan()
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * EVICT_TO
+        for _, size, path in sorted(entries):
+            if total <= target:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+        with self._lock:
+            self._total = total
+
+
+def _size(path):
+    try:
+        return path.stat().st_size
+    except FileNotFoundError:
+        return 0
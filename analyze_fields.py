@@ -1,8 +1,12 @@
-import akshare as ak
+import akshare
+from ak_cache import CachedAPI
 import pandas as pd
 import sqlite3
 from pathlib import Path
 
+# 走磁盘缓存，重复运行不再访问网络 (AK_CACHE_BYPASS=1 强制刷新)
+ak = CachedAPI(akshare)
+
 # 模拟 HKShareFetcher 的逻辑获取所有科目
 def get_hk_full_fields():
     print("📡 正在获取港股(01810)全量字段...")
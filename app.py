@@ -2,13 +2,15 @@ import streamlit as st
 import pandas as pd
 import akshare as ak
 import plotly.graph_objects as go
-import sqlite3
 import json
-from datetime import datetime
 from pathlib import Path
 from fetchers.a_share import AShareFetcher
 from fetchers.hk_share import HKShareFetcher
 from calculator import FinancialCalculator
+from database import init_db
+import repository
+from ak_cache import CachedAPI
+from field_mapping import FIELD_LABELS, FIELD_STATEMENTS, LABEL_TO_FIELD, RAW_TO_FIELD, STATEMENT_NAMES
 
 # 数据库路径
 DB_PATH = Path(__file__).parent / "finance.db"
@@ -17,11 +19,13 @@ DB_PATH = Path(__file__).parent / "finance.db"
 # 初始化工具
 # fetcher = AShareFetcher() (已移除全局实例)
 calculator = FinancialCalculator()
+ak_cached = CachedAPI(ak)
 
-def get_fetcher(stock_code):
+def get_fetcher(stock_code, refresh=False):
+    # refresh=True 时跳过 akshare 磁盘缓存
     if len(stock_code) == 5 and stock_code.isdigit():
-        return HKShareFetcher()
-    return AShareFetcher()
+        return HKShareFetcher(refresh=refresh)
+    return AShareFetcher(refresh=refresh)
 
 # 设置页面配置
 st.set_page_config(
@@ -30,32 +34,37 @@ st.set_page_config(
     layout="wide"
 )
 
+@st.cache_resource(show_spinner=False)
+def ensure_schema(db_path):
+    """旧版本数据库自动升级：每个 Streamlit 进程只执行一次，页面重跑不再开写事务"""
+    init_db(db_path)
+    return True
+
+ensure_schema(str(DB_PATH))
+
 def get_stock_data(stock_code):
     """
     获取股票数据：先查库，没有则抓取
     """
-    conn = sqlite3.connect(DB_PATH)
-    
     # 1. 检查数据库是否有数据
-    df = pd.read_sql(f"SELECT * FROM financial_indicators_derived WHERE stock_code='{stock_code}' ORDER BY report_period DESC LIMIT 1", conn)
+    df = repository.latest_indicators(stock_code)
     
     if df.empty:
         st.info(f"本地无 {stock_code} 数据，正在从云端抓取 (2010-2024)...")
         fetcher = get_fetcher(stock_code)
         success = fetcher.fetch_financial_data(stock_code)
         if success:
-            calculator.calculate_indicators(stock_code)
+            calculator.calculate_changed(stock_code)
             # 重新读取
-            df = pd.read_sql(f"SELECT * FROM financial_indicators_derived WHERE stock_code='{stock_code}' ORDER BY report_period DESC LIMIT 1", conn)
+            df = repository.latest_indicators(stock_code)
         else:
             st.error("抓取失败，请检查股票代码是否正确。")
             return None, None
             
-    conn.close()
     
     # 获取实时行情（用于展示市值等）
     try:
-        stock_info = ak.stock_individual_info_em(symbol=stock_code)
+        stock_info = ak_cached.stock_individual_info_em(symbol=stock_code)
         info_dict = dict(zip(stock_info['item'], stock_info['value']))
     except:
         info_dict = {}
@@ -183,8 +192,9 @@ with st.sidebar:
     report_type = st.selectbox("报告类型", ["全部", "年报 (A)", "三季报 (Q3)", "半年报 (S1)", "一季报 (Q1)"], index=0)
     
     if st.button("强制更新数据"):
-        fetcher = get_fetcher(selected_stock)
+        fetcher = get_fetcher(selected_stock, refresh=True)
         fetcher.fetch_financial_data(selected_stock)
+        # 强制更新时全量重算该股票全部报告期 (不依赖增量判断)
         calculator.calculate_indicators(selected_stock)
         # 清除缓存以重新加载数据
         if 'df_raw' in st.session_state:
@@ -197,9 +207,7 @@ with st.sidebar:
         st.caption("手动修改数据将锁定该记录，防止被自动覆盖。")
         
         # 获取当前股票的所有报告期
-        conn = sqlite3.connect(DB_PATH)
-        periods = pd.read_sql(f"SELECT report_period FROM financial_reports_raw WHERE stock_code='{selected_stock}' ORDER BY report_period DESC", conn)['report_period'].tolist()
-        conn.close()
+        periods = repository.periods(selected_stock)
         
         edit_period = st.selectbox("选择报告期", periods)
         
@@ -227,32 +235,20 @@ with st.sidebar:
         # 获取当前值
         current_val = 0.0
         if edit_period:
-            conn = sqlite3.connect(DB_PATH)
-            cursor = conn.cursor()
-            cursor.execute(f"SELECT {edit_field_key} FROM financial_reports_raw WHERE stock_code=? AND report_period=?", (selected_stock, edit_period))
-            row = cursor.fetchone()
-            if row and row[0] is not None:
-                current_val = float(row[0])
-            conn.close()
+            row = repository.raw_row(selected_stock, edit_period, [edit_field_key])
+            if row and row[edit_field_key] is not None:
+                current_val = float(row[edit_field_key])
             
         new_val = st.number_input("新值 (单位: 元)", value=current_val, format="%.2f")
         st.caption(f"当前值: {current_val/1e8:.2f} 亿")
         
         if st.button("保存并锁定"):
             try:
-                conn = sqlite3.connect(DB_PATH)
-                cursor = conn.cursor()
-                # 更新数据并锁定
-                cursor.execute(f'''
-                    UPDATE financial_reports_raw 
-                    SET {edit_field_key} = ?, is_locked = 1, data_quality = 'MANUAL'
-                    WHERE stock_code = ? AND report_period = ?
-                ''', (new_val, selected_stock, edit_period))
-                conn.commit()
-                conn.close()
+                # 更新数据并锁定 (updated_at 用于增量重算指标)
+                repository.update_raw(selected_stock, edit_period, {edit_field_key: new_val}, lock=True)
                 
-                # 重新计算指标
-                calculator.calculate_indicators(selected_stock)
+                # 只重算该报告期及依赖它的报告期
+                calculator.calculate_changed(selected_stock)
                 
                 # 清除缓存
                 if 'df_raw' in st.session_state:
@@ -268,11 +264,7 @@ st.title(f"📊 {selected_stock} 财务数据全景")
 
 # 获取数据函数
 def get_all_history(stock_code):
-    conn = sqlite3.connect(DB_PATH)
-    df_raw = pd.read_sql(f"SELECT * FROM financial_reports_raw WHERE stock_code='{stock_code}' ORDER BY report_period DESC", conn)
-    df_derived = pd.read_sql(f"SELECT * FROM financial_indicators_derived WHERE stock_code='{stock_code}' ORDER BY report_period DESC", conn)
-    conn.close()
-    return df_raw, df_derived
+    return repository.history(stock_code)
 
 # 初始化 session_state
 if 'df_raw' not in st.session_state:
@@ -284,15 +276,11 @@ if 'df_derived' not in st.session_state:
 if st.button("加载/刷新数据", type="primary"):
     with st.spinner("正在提取历史数据..."):
         # 检查是否需要抓取
-        conn = sqlite3.connect(DB_PATH)
-        check_df = pd.read_sql(f"SELECT id FROM financial_reports_raw WHERE stock_code='{selected_stock}' LIMIT 1", conn)
-        conn.close()
-        
-        if check_df.empty:
+        if not repository.has_data(selected_stock):
             st.info("本地无数据，正在云端抓取...")
             fetcher = get_fetcher(selected_stock)
             fetcher.fetch_financial_data(selected_stock)
-            calculator.calculate_indicators(selected_stock)
+            calculator.calculate_changed(selected_stock)
             
         raw, derived = get_all_history(selected_stock)
         st.session_state.df_raw = raw
@@ -408,15 +396,8 @@ if not st.session_state.df_raw.empty:
                             
                             if conflict_fields:
                                 for field, info in conflict_fields.items():
-                                    field_name_map = {
-                                        'revenue': ('营业收入', '利润表'),
-                                        'net_income_parent': ('归母净利润', '利润表'),
-                                        'total_assets': ('总资产', '资产负债表'),
-                                        'total_equity': ('股东权益', '资产负债表')
-                                    }
-                                    field_info = field_name_map.get(field, (field, '未知表'))
-                                    field_cn = field_info[0]
-                                    table_name = field_info[1]
+                                    field_cn = FIELD_LABELS.get(field, field).split(' [')[0]
+                                    table_name = STATEMENT_NAMES.get(FIELD_STATEMENTS.get(field), '未知表')
                                     
                                     st.warning(
                                         f"⚠️ **{field_cn}** ({table_name}): "
@@ -458,73 +439,8 @@ if not st.session_state.df_raw.empty:
         # 转置
         return df.T
 
-    # --- 5. 字段映射字典 (补全) ---
-    field_map = {
-        # 衍生指标
-        'gross_margin': '毛利率 (Gross Margin) [%]',
-        'net_margin': '净利率 (Net Margin) [%]',
-        'roe': '净资产收益率 (ROE) [%]',
-        'roa': '总资产收益率 (ROA) [%]',
-        'revenue_yoy': '营收增长率 (YoY) [%]',
-        'net_profit_yoy': '净利增长率 (YoY) [%]',
-        'debt_to_asset': '资产负债率 [%]',
-        'current_ratio': '流动比率',
-        'inventory_turnover_days': '存货周转天数 [天]',
-        'receivables_turnover_days': '应收账款周转天数 [天]',
-        'fcf': '自由现金流 (FCF) [亿]',
-        'cfo_to_net_income': '净现比 (CFO/NetIncome)',
-        'dividend_payout_ratio': '分红率 (Payout Ratio) [%]',
-        'dividend_per_share': '每股分红 (DPS) [元]',
-        'dividend_total': '分红总额 [亿]',
-        'eps_basic': '基本每股收益 (EPS) [元]',
-        'eps_ttm': '滚动每股收益 (EPS-TTM) [元]',
-        'bps': '每股净资产 (BPS) [元]',
-        
-        # 原始报表 - 利润表
-        'revenue': '营业收入 [亿]',
-        'cost_of_revenue': '营业成本 [亿]',
-        'gross_profit': '毛利 [亿]',
-        'selling_expenses': '销售费用 [亿]',
-        'admin_expenses': '管理费用 [亿]',
-        'rd_expenses': '研发费用 [亿]',
-        'financial_expenses': '财务费用 [亿]',
-        'income_tax_expenses': '所得税费用 [亿]', # 新增
-        'investment_income': '投资收益 [亿]',
-        'operating_income': '营业利润 [亿]',
-        'total_profit': '利润总额 [亿]',
-        'net_income': '净利润 [亿]',
-        'net_income_parent': '归母净利润 [亿]',
-        'net_income_deducted': '扣非净利润 [亿]',
-        
-        # 资产负债表
-        'total_assets': '总资产 [亿]',
-        'current_assets': '流动资产 [亿]',      # 新增
-        'non_current_assets': '非流动资产 [亿]',  # 新增
-        'total_liabilities': '总负债 [亿]',
-        'current_liabilities': '流动负债 [亿]',   # 新增
-        'non_current_liabilities': '非流动负债 [亿]', # 新增
-        'total_equity': '股东权益 [亿]',
-        'share_capital': '股本 [亿]',          # 新增
-        'retained_earnings': '未分配利润 [亿]',   # 新增
-        'cash_equivalents': '货币资金 [亿]',
-        'accounts_receivable': '应收账款 [亿]',
-        'inventory': '存货 [亿]',
-        'fixed_assets': '固定资产 [亿]',
-        'intangible_assets': '无形资产 [亿]',     # 新增
-        'goodwill': '商誉 [亿]',
-        'short_term_debt': '短期借款 [亿]',
-        'long_term_debt': '长期借款 [亿]',
-        'accounts_payable': '应付账款 [亿]',
-        'contract_liabilities': '合同负债 [亿]',
-        
-        # 现金流量表
-        'cfo_net': '经营现金流净额 [亿]',
-        'cfi_net': '投资现金流净额 [亿]',
-        'cff_net': '筹资现金流净额 [亿]',
-        'net_cash_flow': '现金净增加额 [亿]',    # 新增
-        'capex': '资本开支 [亿]',
-        'cash_paid_for_dividends': '分红支付现金 [亿]'
-    }
+    # --- 5. 字段映射字典 (见 field_mapping.FIELD_LABELS) ---
+    field_map = FIELD_LABELS
 
     # --- 6. 高亮样式函数 ---
     def highlight_conflicts(df_display, df_source):
@@ -552,15 +468,8 @@ if not st.session_state.df_raw.empty:
                         
                         # 遍历显示表格的每一行（即每一个字段）
                         for idx in df_display.index:
-                            # idx 是中文显示名，如 "营业收入 [亿]"
-                            # 我们需要反向映射回英文字段名，或者在 field_map 里找
-                            # 简单起见，我们检查 field_map 的 value 是否包含 idx
-                            
-                            original_field = None
-                            for k, v in field_map.items():
-                                if v == idx:
-                                    original_field = k
-                                    break
+                            # idx 是中文显示名，如 "营业收入 [亿]"，反向查找回英文字段名
+                            original_field = LABEL_TO_FIELD.get(idx)
                             
                             if original_field and original_field in conflict_fields:
                                 # 标记冲突：背景淡红，文字红色加粗
@@ -583,42 +492,13 @@ if not st.session_state.df_raw.empty:
     # 7.2 原始财务报表 (全量数据)
     st.subheader("📄 原始财务报表 (Raw Data)")
     
-    # 定义映射字典 (用于在 UI 上标注核心变量)
-    # 注意：这里只是为了显示，实际逻辑在 Fetcher 里
-    # 我们做一个简单的反向查找： 原始中文 -> 内部英文
-    hk_mapping_display = {}
-    # 搬运自 hk_share.py 的映射逻辑
-    raw_map = {
-        'revenue': ['营业额', '营业收入', '营业总收入', '收入'],
-        'gross_profit': ['毛利'],
-        'net_income_parent': ['本公司拥有人应占溢利', '归属于母公司股东的净利润', '归母净利润', '股东应占溢利'],
-        'net_income': ['年度溢利', '净利润', '除税后溢利'],
-        'eps_basic': ['基本每股盈利', '基本每股收益'],
-        'rd_expenses': ['研究及开发成本', '研发费用'],
-        'total_assets': ['资产总值', '资产合计', '总资产'],
-        'total_liabilities': ['负债总额', '负债合计', '总负债'],
-        'total_equity': ['本公司拥有人应占权益', '权益合计', '股东权益合计', '股东权益'],
-        'cash_equivalents': ['现金及现金等价物', '货币资金', '银行结余及现金'],
-        'cfo_net': ['经营业务现金净额', '经营活动产生的现金流量净额'],
-        'capex': ['购建固定资产', '购买物业、厂房及设备']
-    }
-    for internal_key, raw_list in raw_map.items():
-        for raw_name in raw_list:
-            hk_mapping_display[raw_name] = internal_key
-
-    if 'raw_data' in df_raw.columns and not df_raw['raw_data'].isna().all():
-        # 解析所有行的 JSON
-        all_rows = []
-        for idx, row in df_raw.iterrows():
-            if row['raw_data']:
-                try:
-                    row_dict = json.loads(row['raw_data'])
-                    # 加上报告期作为第一列
-                    row_dict['report_period'] = row['report_period']
-                    all_rows.append(row_dict)
-                except:
-                    pass
-        
+    # 原始中文科目 -> 内部英文字段 (用于在 UI 上标注核心变量，与 Fetcher 共用同一份映射)
+    hk_mapping_display = RAW_TO_FIELD['HK']
+
+    # 全量科目：一次查询取回宽表 (行: 报告期, 列: 接口原始科目)，只保留当前筛选的报告期
+    df_full = repository.full_items(selected_stock, periods=df_raw['report_period'].unique().tolist())
+
+    if not df_full.empty:
         # 辅助函数：格式化报告期
         def format_period(date_str):
             try:
@@ -633,126 +513,121 @@ if not st.session_state.df_raw.empty:
             except:
                 return date_str
 
-        if all_rows:
-            df_full = pd.DataFrame(all_rows)
+        # 格式化报告期索引
+        df_full.index = df_full.index.map(format_period)
+        
+        # --- 控制选项 ---
+        col1, col2 = st.columns(2)
+        with col1:
+            unit_opt = st.radio("单位", ["原始值 (元)", "亿"], horizontal=True, key="full_data_unit")
+        with col2:
+            transpose_opt = st.checkbox("转置表格 (时间横轴)", value=True, key="full_data_transpose")
+        
+        # --- 数据处理 ---
+        # 1. 单位转换 (基于规则的硬编码模式)
+        # 规则：默认都转为亿，除非字段名包含特定关键词 (如 '每股', '率')
+        converted_cols = set()
+        exclude_keywords = ['每股', '率', '日数', '次数', 'Year', 'Date', '日期']
+        
+        if unit_opt == "亿":
+            for col in df_full.columns:
+                # 尝试转为数字
+                df_full[col] = pd.to_numeric(df_full[col], errors='ignore')
+                
+                if pd.api.types.is_numeric_dtype(df_full[col]):
+                    # 检查是否在黑名单里
+                    is_excluded = any(k in str(col) for k in exclude_keywords)
+                    
+                    if not is_excluded:
+                        # 确认为金额字段，执行转换
+                        df_full[col] = df_full[col] / 1e8
+                        converted_cols.add(col)
+        
+        # 2. 转置
+        if transpose_opt:
+            df_display = df_full.T
             
-            # 格式化 report_period 列
-            if 'report_period' in df_full.columns:
-                df_full['report_period'] = df_full['report_period'].apply(format_period)
-                df_full.set_index('report_period', inplace=True)
+            # 新增一列：系统内部变量名
+            system_vars = []
+            new_index = [] # 用于存储带单位的新索引名
             
-            # --- 控制选项 ---
-            col1, col2 = st.columns(2)
-            with col1:
-                unit_opt = st.radio("单位", ["原始值 (元)", "亿"], horizontal=True, key="full_data_unit")
-            with col2:
-                transpose_opt = st.checkbox("转置表格 (时间横轴)", value=True, key="full_data_transpose")
+            for idx in df_display.index:
+                clean_idx = str(idx).strip()
+                internal_name = hk_mapping_display.get(clean_idx, "")
+                system_vars.append(internal_name)
+                
+                # 如果该字段被转换了单位，加后缀
+                if idx in converted_cols:
+                    new_index.append(f"{idx} (亿)")
+                else:
+                    new_index.append(idx)
             
-            # --- 数据处理 ---
-            # 1. 单位转换 (基于规则的硬编码模式)
-            # 规则：默认都转为亿，除非字段名包含特定关键词 (如 '每股', '率')
-            converted_cols = set()
-            exclude_keywords = ['每股', '率', '日数', '次数', 'Year', 'Date', '日期']
+            # 更新索引名
+            df_display.index = new_index
             
-            if unit_opt == "亿":
-                for col in df_full.columns:
-                    # 尝试转为数字
-                    df_full[col] = pd.to_numeric(df_full[col], errors='ignore')
-                    
-                    if pd.api.types.is_numeric_dtype(df_full[col]):
-                        # 检查是否在黑名单里
-                        is_excluded = any(k in str(col) for k in exclude_keywords)
-                        
-                        if not is_excluded:
-                            # 确认为金额字段，执行转换
-                            df_full[col] = df_full[col] / 1e8
-                            converted_cols.add(col)
+            # 插入到第一列
+            df_display.insert(0, "System Variable", system_vars)
             
-            # 2. 转置
-            if transpose_opt:
-                df_display = df_full.T
-                
-                # 新增一列：系统内部变量名
-                system_vars = []
-                new_index = [] # 用于存储带单位的新索引名
-                
-                for idx in df_display.index:
-                    clean_idx = str(idx).strip()
-                    internal_name = hk_mapping_display.get(clean_idx, "")
-                    system_vars.append(internal_name)
-                    
-                    # 如果该字段被转换了单位，加后缀
-                    if idx in converted_cols:
-                        new_index.append(f"{idx} (亿)")
-                    else:
-                        new_index.append(idx)
-                
-                # 更新索引名
-                df_display.index = new_index
-                
-                # 插入到第一列
-                df_display.insert(0, "System Variable", system_vars)
-                
-                # 重命名索引列名为 "AkShare Field"
-                df_display.index.name = "AkShare Field"
-                
-                # --- 行级操作 (Row Operations) ---
-                st.caption("🛠️ 行操作")
-                r_col1, r_col2 = st.columns([1, 2])
-                with r_col1:
-                    search_query = st.text_input("🔍 搜索字段", placeholder="输入关键词过滤...", key="row_search")
-                with r_col2:
-                    pinned_fields = st.multiselect("📌 置顶字段 (Pin)", options=df_display.index, key="row_pin")
-                
-                # 1. 筛选 (Filter)
-                if search_query:
-                    # 模糊匹配索引
-                    df_display = df_display[df_display.index.str.contains(search_query, case=False)]
-                
-                # 2. 置顶 (Pinning)
-                if pinned_fields:
-                    # 找出在当前显示列表中存在的置顶字段
-                    valid_pins = [f for f in pinned_fields if f in df_display.index]
-                    if valid_pins:
-                        pinned_df = df_display.loc[valid_pins]
-                        unpinned_df = df_display.drop(valid_pins)
-                        df_display = pd.concat([pinned_df, unpinned_df])
-                
-            else:
-                df_display = df_full
-                pass
+            # 重命名索引列名为 "AkShare Field"
+            df_display.index.name = "AkShare Field"
+            
+            # --- 行级操作 (Row Operations) ---
+            st.caption("🛠️ 行操作")
+            r_col1, r_col2 = st.columns([1, 2])
+            with r_col1:
+                search_query = st.text_input("🔍 搜索字段", placeholder="输入关键词过滤...", key="row_search")
+            with r_col2:
+                pinned_fields = st.multiselect("📌 置顶字段 (Pin)", options=df_display.index, key="row_pin")
+            
+            # 1. 筛选 (Filter)
+            if search_query:
+                # 模糊匹配索引
+                df_display = df_display[df_display.index.str.contains(search_query, case=False)]
+            
+            # 2. 置顶 (Pinning)
+            if pinned_fields:
+                # 找出在当前显示列表中存在的置顶字段
+                valid_pins = [f for f in pinned_fields if f in df_display.index]
+                if valid_pins:
+                    pinned_df = df_display.loc[valid_pins]
+                    unpinned_df = df_display.drop(valid_pins)
+                    df_display = pd.concat([pinned_df, unpinned_df])
+            
+        else:
+            df_display = df_full
+            pass
 
-            # --- 样式应用 ---
-            # 定义负值红字样式函数
-            def highlight_negative(val):
-                color = 'red' if isinstance(val, (int, float)) and val < 0 else ''
-                return f'color: {color}'
+        # --- 样式应用 ---
+        # 定义负值红字样式函数
+        def highlight_negative(val):
+            color = 'red' if isinstance(val, (int, float)) and val < 0 else ''
+            return f'color: {color}'
 
-            # 展示
-            try:
-                # 组合样式：负值红字 + 2位小数
-                styler = df_display.style.map(highlight_negative)
-                
-                # 定义强力格式化函数
-                def format_float(val):
-                    if isinstance(val, (int, float)):
-                        return "{:,.2f}".format(val) # 增加千分位分隔符，更易读
-                    return val
-
-                # 排除 'System Variable' 列进行格式化
-                data_cols = [c for c in df_display.columns if c != 'System Variable']
-                styler = styler.format(format_float, subset=data_cols)
-                
-                st.dataframe(styler, height=600)
-                
-                st.info("💡 说明：AkShare 源数据未提供特定单位字段，默认通常为原始币种（元）。上表已根据您的设置进行了单位转换（如转为亿）。")
-                
-            except Exception as e:
-                # 降级处理
-                st.warning(f"样式渲染出错: {e}")
-                st.dataframe(df_display, height=600)
-                
-            st.caption(f"共包含 {len(df_full.columns)} 个原始字段。'System Variable' 列显示了系统识别的核心变量名。")
+        # 展示
+        try:
+            # 组合样式：负值红字 + 2位小数
+            styler = df_display.style.map(highlight_negative)
+            
+            # 定义强力格式化函数
+            def format_float(val):
+                if isinstance(val, (int, float)):
+                    return "{:,.2f}".format(val) # 增加千分位分隔符，更易读
+                return val
+
+            # 排除 'System Variable' 列进行格式化
+            data_cols = [c for c in df_display.columns if c != 'System Variable']
+            styler = styler.format(format_float, subset=data_cols)
+            
+            st.dataframe(styler, height=600)
+            
+            st.info("💡 说明：AkShare 源数据未提供特定单位字段，默认通常为原始币种（元）。上表已根据您的设置进行了单位转换（如转为亿）。")
+            
+        except Exception as e:
+            # 降级处理
+            st.warning(f"样式渲染出错: {e}")
+            st.dataframe(df_display, height=600)
+            
+        st.caption(f"共包含 {len(df_full.columns)} 个原始字段。'System Variable' 列显示了系统识别的核心变量名。")
     else:
         st.info("暂无原始数据，请点击侧边栏'强制更新数据'。")
 
@@ -1,17 +1,79 @@
 #!/usr/bin/env python
 """
 批量下载 PDF 并验证数据质量
+验证阶段并发执行 (FinancialDataValidator.validate_many)，模型调用按 --rpm / --tpm 限速
+
+用法:
+    python batch_validate.py 688005                 # 下载并验证单只股票
+    python batch_validate.py 688005 600519 --workers 16
+    python batch_validate.py --all --rpm 120        # 重新验证所有已解析 TXT 的股票 (不下载)
+    python batch_validate.py 688005 --batch-size 1  # 每个报告期单独请求模型 (默认同一股票 4 期合并一次请求)
+    python batch_validate.py 688005 --autofill      # 同时用报表表格回填数据库中为空的字段
 """
+import argparse
 import os
-import sqlite3
 import json
 from pathlib import Path
+import repository
 from pdf_downloader import PDFDownloader
 from validator import FinancialDataValidator
 
 DB_PATH = Path(__file__).parent / "finance.db"
 
-def batch_validate(stock_code, gemini_api_key=None):
+def _make_validator(gemini_api_key=None, rpm=FinancialDataValidator.DEFAULT_RPM,
+                    tpm=FinancialDataValidator.DEFAULT_TPM, autofill=False):
+    # 从环境变量或参数获取 API Key
+    if not gemini_api_key:
+        gemini_api_key = os.getenv('GEMINI_API_KEY')
+    
+    if not gemini_api_key:
+        print("⚠️ 未设置 GEMINI_API_KEY，将使用正则表达式验证（准确率较低）")
+        use_llm = False
+    else:
+        use_llm = True
+    
+    return FinancialDataValidator(use_llm=use_llm, gemini_api_key=gemini_api_key, db_path=DB_PATH, rpm=rpm, tpm=tpm,
+                                  autofill=autofill)
+
+
+def _print_results(validator, results, missing=0):
+    """逐个报告期打印验证结果，返回 (成功数, 失败数)；missing 为缺少 TXT 的报告期数"""
+    success_count = 0
+    fail_count = missing
+    
+    for (stock_code, report_period), result in sorted(results.items()):
+        if result['status'] == 'VERIFIED':
+            success_count += 1
+            print(f"  ✅ {stock_code} {report_period} 通过")
+        elif result['status'] == 'CONFLICT':
+            success_count += 1  # 虽然有冲突，但也算验证了
+            print(f"  ⚠️ {stock_code} {report_period} 发现冲突")
+            if 'details' in result:
+                for field, detail in result['details'].items():
+                    if detail.get('status') == 'CONFLICT':
+                        print(f"       - {field}: AkShare={detail['akshare']}亿, PDF={detail['pdf']}亿, 差异={detail['diff_pct']}%")
+        else:
+            fail_count += 1
+            print(f"  ❌ {stock_code} {report_period} {result.get('message', '验证失败')}")
+    
+    cache_stats = validator.cache.stats()
+    print()
+    print("=" * 50)
+    print(f"✅ 验证完成！")
+    print(f"  成功: {success_count}")
+    print(f"  失败: {fail_count}")
+    if validator.use_llm:
+        llm_stats = validator.llm_call_stats()
+        print(f"  LLM 缓存: 命中 {cache_stats['hits']} 次, 未命中 {cache_stats['misses']} 次")
+        print(f"  LLM 请求: {llm_stats['requests']} 次 (覆盖 {llm_stats['periods']} 期), "
+              f"{llm_stats['prompt_tokens'] + llm_stats['output_tokens']} tokens")
+    print("=" * 50)
+    return success_count, fail_count
+
+
+def batch_validate(stock_code, gemini_api_key=None, workers=8, rpm=FinancialDataValidator.DEFAULT_RPM,
+                   tpm=FinancialDataValidator.DEFAULT_TPM, batch_size=FinancialDataValidator.BATCH_MAX_PERIODS,
+                   autofill=False):
     """
     批量验证流程：
     1. 检查哪些报告期缺少 PDF
@@ -22,16 +84,7 @@ def batch_validate(stock_code, gemini_api_key=None):
     print()
     
     # 1. 获取所有报告期
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT report_period, report_type, data_quality
-        FROM financial_reports_raw
-        WHERE stock_code = ?
-        ORDER BY report_period DESC
-    ''', (stock_code,))
-    
-    reports = cursor.fetchall()
+    reports = repository.report_statuses(stock_code, db_path=DB_PATH)
     total = len(reports)
     print(f"📊 共有 {total} 个报告期")
     
@@ -45,8 +98,6 @@ def batch_validate(stock_code, gemini_api_key=None):
     print(f"  ❌ 冲突: {len(conflicts)}")
     print()
     
-    conn.close()
-    
     if len(unverified) == 0 and len(conflicts) == 0:
         print("🎉 所有数据均已验证！")
         # 即使已验证，也可能想重新跑一遍以更新 validation_details
@@ -61,71 +112,63 @@ def batch_validate(stock_code, gemini_api_key=None):
     
     # 3. 验证
     print(f"步骤 2/2: 验证数据质量...")
-    
-    # 从环境变量或参数获取 API Key
-    if not gemini_api_key:
-        gemini_api_key = os.getenv('GEMINI_API_KEY')
-    
-    if not gemini_api_key:
-        print("⚠️ 未设置 GEMINI_API_KEY，将使用正则表达式验证（准确率较低）")
-        use_llm = False
-    else:
-        use_llm = True
-    
-    validator = FinancialDataValidator(use_llm=use_llm, gemini_api_key=gemini_api_key)
+    validator = _make_validator(gemini_api_key, rpm=rpm, tpm=tpm, autofill=autofill)
     
     # 验证未验证的和有冲突的（重新验证以获取详情）
     targets = unverified + conflicts
     # 如果没有未验证的，就验证所有已下载的
     if not targets:
         targets = reports
-        
-    success_count = 0
-    fail_count = 0
     
+    # 没有 TXT 的报告期直接记为失败，不占用线程
+    ready = []
+    missing = 0
     for report_period, report_type, _ in targets:
-        print(f"  验证 {report_period} ({report_type})...")
-        # 检查是否需要验证
-        txt_path = validator._get_txt_path(stock_code, report_period)
-        if not txt_path:
-            print(f"    ❌ PDF/TXT 文件不存在")
-            fail_count += 1
-            continue
-            
-        print(f"  🤖 使用 Gemini 提取财务数据...")
-        result = validator.validate_report(stock_code, report_period)
-        
-        if result['status'] == 'VERIFIED':
-            success_count += 1
-            print(f"    ✅ 通过")
-        elif result['status'] == 'CONFLICT':
-            success_count += 1  # 虽然有冲突，但也算验证了
-            print(f"    ⚠️ 发现冲突")
-            if 'details' in result:
-                for field, detail in result['details'].items():
-                    if detail.get('status') == 'CONFLICT':
-                        print(f"       - {field}: AkShare={detail['akshare']}亿, PDF={detail['pdf']}亿, 差异={detail['diff_pct']}%")
+        if validator._get_txt_path(stock_code, report_period):
+            ready.append((stock_code, report_period))
         else:
-            fail_count += 1
-            print(f"    ❌ {result.get('message', '验证失败')}")
+            print(f"  ❌ {report_period} ({report_type}) PDF/TXT 文件不存在")
+            missing += 1
     
+    results = validator.validate_many(ready, workers=workers, batch_size=batch_size)
+    counts = _print_results(validator, results, missing)
     validator.close()
-    
-    print()
-    print("=" * 50)
-    print(f"✅ 验证完成！")
-    print(f"  成功: {success_count}")
-    print(f"  失败: {fail_count}")
-    print("=" * 50)
+    return counts
+
+
+def revalidate_all(gemini_api_key=None, workers=8, rpm=FinancialDataValidator.DEFAULT_RPM,
+                   tpm=FinancialDataValidator.DEFAULT_TPM, batch_size=FinancialDataValidator.BATCH_MAX_PERIODS,
+                   autofill=False):
+    """重新验证所有已解析 TXT 的股票的全部报告期 (不下载)"""
+    stock_codes = repository.stocks_with_txt(db_path=DB_PATH)
+    print(f"📦 重新验证 {len(stock_codes)} 只股票的数据...")
+    validator = _make_validator(gemini_api_key, rpm=rpm, tpm=tpm, autofill=autofill)
+    targets = [
+        (stock_code, report_period)
+        for stock_code in stock_codes
+        for report_period, _, _ in repository.report_statuses(stock_code, db_path=DB_PATH)
+        if validator._get_txt_path(stock_code, report_period)
+    ]
+    results = validator.validate_many(targets, workers=workers, batch_size=batch_size)
+    counts = _print_results(validator, results)
+    validator.close()
+    return counts
 
 if __name__ == "__main__":
-    import sys
-    
-    # 从命令行参数读取
-    if len(sys.argv) > 1:
-        stock_code = sys.argv[1]
-    else:
-        stock_code = input("请输入股票代码（如 688005）: ")
+    parser = argparse.ArgumentParser(description="批量下载 PDF 并验证数据质量")
+    parser.add_argument("stock_codes", nargs="*", help="股票代码（如 688005），可多个")
+    parser.add_argument("--all", action="store_true", help="重新验证所有已解析 TXT 的股票 (不下载)")
+    parser.add_argument("--workers", type=int, default=8, help="并发验证线程数")
+    parser.add_argument("--rpm", type=int, default=FinancialDataValidator.DEFAULT_RPM, help="模型每分钟请求数上限")
+    parser.add_argument("--tpm", type=int, default=FinancialDataValidator.DEFAULT_TPM, help="模型每分钟 token 数上限")
+    parser.add_argument("--batch-size", type=int, default=FinancialDataValidator.BATCH_MAX_PERIODS,
+                        help="同一股票每次模型请求合并的报告期数")
+    parser.add_argument("--autofill", action="store_true", help="用报表表格回填数据库中为空的字段")
+    args = parser.parse_args()
+    
+    stock_codes = args.stock_codes
+    if not stock_codes and not args.all:
+        stock_codes = [input("请输入股票代码（如 688005）: ")]
     
     # API Key
     api_key = os.getenv('GEMINI_API_KEY')
@@ -135,4 +178,9 @@ if __name__ == "__main__":
         print("或者直接运行，将使用正则表达式（准确率较低）")
         print()
     
-    batch_validate(stock_code, api_key)
+    if args.all:
+        revalidate_all(api_key, workers=args.workers, rpm=args.rpm, tpm=args.tpm, batch_size=args.batch_size,
+                       autofill=args.autofill)
+    for stock_code in stock_codes:
+        batch_validate(stock_code, api_key, workers=args.workers, rpm=args.rpm, tpm=args.tpm,
+                       batch_size=args.batch_size, autofill=args.autofill)
@@ -0,0 +1,1074 @@
+#!/usr/bin/env python
+"""
+性能基准测试（合成数据，不访问网络，不修改 finance.db）
+只计时；新旧实现的一致性等正确性校验在 tests/ (python -m pytest)，合成数据工厂见 synthetic.py
+
+用法:
+    python benchmark.py save_many [--stocks 5000]
+    python benchmark.py indicators [--stocks 5000]
+    python benchmark.py normalize [--stocks 200]
+    python benchmark.py fetch_many [--stocks 20 --concurrency 8 --rate-limit 20]
+    python benchmark.py calculate_all [--stocks 500 --workers 4]
+    python benchmark.py incremental [--stocks 200]
+    python benchmark.py hk_pivot [--stocks 2500]
+    python benchmark.py raw_items [--stocks 300]
+    python benchmark.py connections [--readers 8 --writers 4]
+    python benchmark.py repository [--stocks 200 --reruns 20]
+    python benchmark.py pdf_download [--stocks 20]
+    python benchmark.py pdf_resume [--stocks 10 --drop-rate 0.3]
+    python benchmark.py pdf_parse [--docs 20 --workers 4]
+    python benchmark.py sections [--reports 20]
+    python benchmark.py extractors [--reports 40]
+    python benchmark.py llm_cache [--stocks 5 --periods 4]
+    python benchmark.py validate_pool [--stocks 10 --periods 4 --workers 8 --rpm 600]
+    python benchmark.py llm_batch [--stocks 5 --periods 8 --batch-size 4]
+    python benchmark.py tiered [--stocks 10 --periods 4 --hard-rate 0.25]
+    python benchmark.py tables [--reports 20]
+"""
+import argparse
+import contextlib
+import io
+import os
+import sqlite3
+import random
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import repository
+from calculator import FinancialCalculator, compute_indicators
+from db import get_conn, get_writer
+from field_mapping import A_SHARE_FIELDS
+from legacy import (
+    legacy_extract_with_regex, legacy_hk_merge, legacy_indicators, legacy_normalize, legacy_parse_pdf,
+    legacy_pdf_download, legacy_read_items, legacy_ui_rerun,
+)
+from synthetic import (
+    SINA_STATEMENTS, SYNTHETIC_FIELDS, CninfoStub, CninfoStubHandler, FakeLLM, NullFetcher, SleepParser, StubAkshare,
+    fresh_db, load_sina_columns, make_annual_report, make_hk_long_frames, make_hk_records, make_periods,
+    make_raw_frame, make_records, make_report_pdf, make_sina_statements, make_stock_codes, raw_json_db,
+    tables_fixture, universe_db, validation_fixture, within_tolerance, write_report_pdf, write_report_txt,
+)
+
+
+def bench_save_many(n_stocks, legacy_sample):
+    """对比逐期 save_to_db 与批量 save_many 的写入吞吐 (行/秒)"""
+    rng = random.Random(42)
+    periods = make_periods()
+    codes = make_stock_codes(n_stocks)
+    records = make_records(periods, rng)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # 1. 旧路径：每个报告期一次连接 + 一次提交 (取样本估算)
+        fetcher = NullFetcher(db_path=fresh_db(tmp_dir, "legacy.db"))
+        sample = codes[:min(legacy_sample, n_stocks)]
+        t0 = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            for code in sample:
+                for period, rtype, data in records:
+                    fetcher.save_to_db(code, period, rtype, dict(data))
+        legacy_elapsed = time.perf_counter() - t0
+        legacy_rows = len(sample) * len(records)
+
+        # 2. 新路径：每只股票一次 save_many (全量)
+        fetcher = NullFetcher(db_path=fresh_db(tmp_dir, "bulk.db"))
+        t0 = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            for code in codes:
+                fetcher.save_many(code, records)
+        bulk_elapsed = time.perf_counter() - t0
+        bulk_rows = len(codes) * len(records)
+
+    legacy_rate = legacy_rows / legacy_elapsed
+    bulk_rate = bulk_rows / bulk_elapsed
+    print(f"📊 save_many 基准 ({n_stocks} 只股票 × {len(periods)} 个报告期)")
+    print(f"  逐期 save_to_db: {legacy_rate:,.0f} 行/秒 (样本 {len(sample)} 只, {legacy_rows} 行, {legacy_elapsed:.2f}s)")
+    print(f"  批量 save_many : {bulk_rate:,.0f} 行/秒 ({bulk_rows} 行, {bulk_elapsed:.2f}s)")
+    print(f"  加速比: {bulk_rate / legacy_rate:.1f}x")
+
+
+def bench_indicators(n_stocks, legacy_sample):
+    """向量化指标引擎 vs 旧版逐行引擎的耗时 (一致性见 tests/test_indicators.py)"""
+    rng = random.Random(7)
+    periods = make_periods()
+    frames = [make_raw_frame(code, periods, rng) for code in make_stock_codes(n_stocks)]
+
+    # 逐只计算 (旧引擎太慢，只取样本估算)
+    t0 = time.perf_counter()
+    for df in frames[:legacy_sample]:
+        legacy_indicators(df)
+    legacy_per_stock = (time.perf_counter() - t0) / min(legacy_sample, n_stocks)
+
+    t0 = time.perf_counter()
+    for df in frames:
+        compute_indicators(df)
+    vector_per_stock = (time.perf_counter() - t0) / n_stocks
+
+    # 全市场一次性计算 (分组对齐 YoY/TTM)
+    universe = pd.concat(frames)
+    t0 = time.perf_counter()
+    compute_indicators(universe)
+    universe_elapsed = time.perf_counter() - t0
+
+    print(f"📊 指标计算基准 ({n_stocks} 只股票 × {len(periods)} 个报告期)")
+    print(f"  逐行 apply : {legacy_per_stock * 1000:.2f} ms/只 (估算全量 {legacy_per_stock * n_stocks:.1f}s)")
+    print(f"  列式向量化 : {vector_per_stock * 1000:.2f} ms/只 (全量 {vector_per_stock * n_stocks:.1f}s)")
+    print(f"  全市场单次 : {universe_elapsed:.2f}s ({len(universe)} 行)")
+    print(f"  加速比: {legacy_per_stock / vector_per_stock:.1f}x")
+
+
+def bench_calculate_all(n_stocks, workers):
+    """calculate_all 进程池 vs 逐只 calculate_indicators 的耗时 (入库结果一致性见 tests/test_calculator.py)"""
+    rng = random.Random(31)
+    codes = make_stock_codes(n_stocks)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        source = universe_db(tmp_dir, "source.db", codes, rng)
+
+        # 同一份原始数据复制成三个库，分别用三种方式计算
+        dbs = {}
+        for name in ('per_stock', 'all_serial', 'all_pool'):
+            dbs[name] = Path(tmp_dir) / f"{name}.db"
+            target = sqlite3.connect(dbs[name])
+            get_conn(source).backup(target)
+            target.close()
+
+        timings = {}
+        saved = {}
+        for name, run in (
+            ('per_stock', lambda calc: sum(calc.calculate_indicators(code) for code in codes)),
+            ('all_serial', lambda calc: calc.calculate_all(workers=1)),
+            ('all_pool', lambda calc: calc.calculate_all(workers=workers)),
+        ):
+            calc = FinancialCalculator()
+            calc.db_path = dbs[name]
+            t0 = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                saved[name] = run(calc)
+            timings[name] = time.perf_counter() - t0
+
+    print(f"📊 批量指标计算基准 ({n_stocks} 只股票, {saved['all_pool']} 行, 含 3 月年结与缺失报告期)")
+    print(f"  逐只 calculate_indicators : {timings['per_stock']:6.2f}s")
+    print(f"  calculate_all(workers=1)  : {timings['all_serial']:6.2f}s")
+    print(f"  calculate_all(workers={workers})  : {timings['all_pool']:6.2f}s")
+    print(f"  加速比 (对逐只): {timings['per_stock'] / timings['all_pool']:.1f}x")
+
+
+def bench_incremental(n_stocks):
+    """
+    增量计算：修正一个 Q1 与两个年报 (含 3 月年结股票的年报) 后 calculate_changed vs calculate_all 的耗时
+    (只重写依赖的报告期、结果与全量重算一致见 tests/test_calculator.py)
+    """
+    rng = random.Random(41)
+    codes = make_stock_codes(n_stocks)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = universe_db(tmp_dir, "incremental.db", codes, rng, gap_rate=0.0)
+        calc = FinancialCalculator()
+        calc.db_path = db_path
+        with contextlib.redirect_stdout(io.StringIO()):
+            total = calc.calculate_all(workers=1)
+
+        # universe_db：每 5 只中的第 5 只为 3 月年结
+        repository.update_raw(codes[0], '2020-03-31', {'revenue': 1.23e9}, db_path=db_path)
+        repository.update_raw(codes[1], '2018-12-31', {'net_income_parent': 4.56e8}, db_path=db_path)
+        repository.update_raw(codes[4], '2019-03-31', {'eps_basic': 0.78}, db_path=db_path)
+        t0 = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            saved = calc.calculate_changed()
+        changed_elapsed = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            calc.calculate_all(workers=1)
+        full_elapsed = time.perf_counter() - t0
+
+    print(f"📊 增量计算基准 ({n_stocks} 只股票, {total} 个报告期, 修正 1 个 Q1 + 2 个年报)")
+    print(f"  calculate_changed : {changed_elapsed:6.3f}s ({saved} 行)")
+    print(f"  calculate_all     : {full_elapsed:6.3f}s ({total} 行)")
+
+
+def bench_normalize(n_stocks):
+    """A 股三大报表清洗：逐期 get_val vs 整表向量化的耗时 (按 cols_debug.txt 的列布局，一致性见 tests/test_fetchers.py)"""
+    from fetchers.a_share import AShareFetcher
+
+    rng = random.Random(11)
+    columns = load_sina_columns()
+    stocks = [make_sina_statements(columns, rng) for _ in range(n_stocks)]
+    fetcher = AShareFetcher.__new__(AShareFetcher)
+
+    t0 = time.perf_counter()
+    for frames in stocks:
+        legacy_normalize(A_SHARE_FIELDS, *frames)
+    legacy_per_stock = (time.perf_counter() - t0) / n_stocks
+
+    t0 = time.perf_counter()
+    for frames in stocks:
+        fetcher._build_records('000000', *frames)
+    vector_per_stock = (time.perf_counter() - t0) / n_stocks
+
+    print(f"📊 A 股报表清洗基准 ({n_stocks} 只股票, 列数 {[len(columns[n]) for n in SINA_STATEMENTS]})")
+    print(f"  逐期 get_val : {legacy_per_stock * 1000:.2f} ms/只")
+    print(f"  整表向量化   : {vector_per_stock * 1000:.2f} ms/只")
+    print(f"  加速比: {legacy_per_stock / vector_per_stock:.1f}x")
+
+
+def bench_fetch_many(n_stocks, concurrency, rate_limit, latency, error_rate):
+    """
+    A 股 fetch_many (本地桩接口代替 akshare)：逐只串行 vs 并发的耗时，两次运行共用同一主机令牌桶 (同样限速)
+    延迟必须足够高 (latency × rate_limit ≥ concurrency)，否则请求不会重叠，测不到并发
+    (重试、限速、失败统计与单写入线程的校验见 tests/test_fetch_many.py)
+    """
+    from fetchers.a_share import AShareFetcher
+
+    if latency * rate_limit < concurrency:
+        raise SystemExit(f"❌ 延迟 {latency}s × 限速 {rate_limit} 次/秒 < 并发 {concurrency}：请求不会重叠，"
+                         f"请把 --latency 调到 {concurrency / rate_limit:.2f}s 以上")
+
+    rng = random.Random(12)
+    columns = load_sina_columns()
+    frames = [make_sina_statements(columns, rng) for _ in range(5)]
+    codes = make_stock_codes(n_stocks)
+
+    # 串行与并发都经过 fetch_many 按主机取的同一个令牌桶，串行基线同样受限速约束
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for label, workers in (("逐只串行", 1), (f"并发 {concurrency}", concurrency)):
+            api = StubAkshare(frames, latency, error_rate)
+            fetcher = AShareFetcher(db_path=fresh_db(tmp_dir, f"fetch_{workers}.db"), api=api)
+            fetcher.retry_backoff = 0.01
+            t0 = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                fetcher.fetch_many(codes, max_concurrency=workers, rate_limit=rate_limit)
+            elapsed = time.perf_counter() - t0
+            saved = get_conn(fetcher.db_path).execute("SELECT COUNT(*) FROM financial_reports_raw").fetchone()[0]
+            rows.append((label, elapsed, len(api.times), sum(api.errors.values()), api.max_in_flight, saved))
+
+    print(f"📊 fetch_many 基准 ({n_stocks} 只股票, 桩接口延迟 {latency * 1000:.0f} ms, 错误率 {error_rate:.0%}, 限速 {rate_limit} 次/秒)")
+    for label, elapsed, calls, errors, in_flight, saved in rows:
+        print(f"  {label:8s}: {elapsed:6.2f}s, {calls:3d} 次请求 (重试 {errors} 次), 最多同时 {in_flight} 个, "
+              f"实际 {calls / elapsed:5.1f} 次/秒, 写入 {saved} 行")
+    print(f"  加速: {rows[0][1] / rows[1][1]:.1f}x")
+
+
+def _traced(func, *args):
+    """返回 (结果, 峰值内存 MB, 耗时 s)"""
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, peak / 1024 ** 2, elapsed
+
+
+def bench_hk_pivot(n_stocks, pool, trace_sample):
+    """港股三表透视：单次 pivot_table vs 分表透视 + join 的耗时与内存剖析 (一致性见 tests/test_fetchers.py)"""
+    from fetchers.hk_share import HKShareFetcher, KEEP_COLUMNS
+
+    rng = random.Random(3)
+    fetcher = HKShareFetcher.__new__(HKShareFetcher)
+    samples = [make_hk_long_frames(code, rng) for code in make_stock_codes(pool)]
+
+    # 1. 单只股票：下载结果的内存占用 (裁剪前/后)、透视峰值内存与耗时
+    full_mb = sum(df.memory_usage(deep=True).sum() for df in samples[0]) / 1024 ** 2
+    kept_mb = sum(df[KEEP_COLUMNS].memory_usage(deep=True).sum() for df in samples[0]) / 1024 ** 2
+    _, legacy_peak, legacy_time = _traced(legacy_hk_merge, *samples[0])
+    merged, merge_peak, merge_time = _traced(fetcher._merge_reports, *samples[0])
+    records, build_peak, build_time = _traced(fetcher._build_records, '00000', *samples[0])
+    types = pd.Series([r[1] for r in records]).value_counts().to_dict()
+    rows_per_stock = sum(len(df) for df in samples[0])
+    print(f"📊 港股透视基准 (单只股票, {rows_per_stock} 行长表 → {merged.shape[0]} 期 × {merged.shape[1]} 科目, 报告类型 {types})")
+    print(f"  下载的三张长表  : {full_mb:.1f} MB, 裁剪到 {KEEP_COLUMNS} 后 {kept_mb:.1f} MB")
+    print(f"  分表透视 + join : 峰值 {legacy_peak:.1f} MB, {legacy_time * 1000:.1f} ms")
+    print(f"  单次 pivot_table: 峰值 {merge_peak:.1f} MB, {merge_time * 1000:.1f} ms")
+    print(f"  透视 + 生成记录 : 峰值 {build_peak:.1f} MB, {build_time * 1000:.1f} ms")
+
+    # 2. 全市场批处理：与 fetch_many 一样逐只生成记录、写库后释放，只保留计数
+    #    tracemalloc 会明显拖慢运行，只对前 trace_sample 只股票追踪峰值，全量只计时
+    trimmed = [[df[KEEP_COLUMNS] for df in frames] for frames in samples]
+
+    def run_universe(count):
+        saved = 0
+        for i in range(count):
+            saved += len(fetcher._build_records(f"{i:05d}", *trimmed[i % pool]))
+        return saved
+
+    _, sample_peak, _ = _traced(run_universe, min(trace_sample, n_stocks))
+    t0 = time.perf_counter()
+    saved = run_universe(n_stocks)
+    universe_time = time.perf_counter() - t0
+    # 一只股票的记录 (核心字段 + 全量科目 dict) 生成后实际留在内存中的大小
+    tracemalloc.start()
+    kept = fetcher._build_records('00000', *trimmed[0])
+    record_mb = tracemalloc.get_traced_memory()[0] / 1024 ** 2
+    tracemalloc.stop()
+    del kept
+    print(f"  全市场 {n_stocks} 只: {saved} 个报告期, {universe_time:.1f}s; 逐只处理峰值 {sample_peak:.1f} MB (前 {min(trace_sample, n_stocks)} 只追踪)")
+    print(f"  若一次性保留全部记录: 约 {record_mb * n_stocks:,.0f} MB (每只 {record_mb:.2f} MB，含全量科目)")
+
+
+def bench_raw_items(n_stocks, pool):
+    """全量科目存储：整行 JSON (raw_data) vs 长表 (financial_report_items) 的库大小、读取与迁移耗时 (一致性见 tests/test_report_items.py)"""
+    from report_items import load_items, migrate_raw_json
+
+    rng = random.Random(5)
+    samples = make_hk_records(make_stock_codes(pool), rng)
+    codes = [f"{i:05d}" for i in range(n_stocks)]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # 1. 旧格式：raw_data 存整行 JSON (模拟迁移前的库)
+        json_db = raw_json_db(tmp_dir, "json.db", codes, samples)
+        json_size = os.path.getsize(json_db)
+
+        # 2. 读取：旧版 app 逐行 json.loads 重建宽表 (每种方式读 3 遍取最快一遍，排除页缓存冷启动)
+        sample_codes = codes[:min(50, n_stocks)]
+
+        def timed_read(read):
+            conn = sqlite3.connect(json_db)
+            best = float('inf')
+            for _ in range(3):
+                t0 = time.perf_counter()
+                for code in sample_codes:
+                    read(conn, code)
+                best = min(best, (time.perf_counter() - t0) / len(sample_codes))
+            conn.close()
+            return best
+
+        legacy_read = timed_read(legacy_read_items)
+
+        # 3. 迁移到长表 (就地迁移同一个库)
+        t0 = time.perf_counter()
+        conn = sqlite3.connect(json_db)
+        with conn:
+            migrate_raw_json(conn.cursor())
+        conn.execute("VACUUM")
+        conn.close()
+        migrate_elapsed = time.perf_counter() - t0
+        items_size = os.path.getsize(json_db)
+
+        # 4. 读取：长表直读宽表
+        items_read = timed_read(load_items)
+
+    n_rows = sum(len(samples[i % pool]) for i in range(n_stocks))
+    print(f"📊 全量科目存储基准 ({n_stocks} 只股票, {n_rows} 个报告期)")
+    print(f"  库大小  : JSON {json_size / 1024 ** 2:.1f} MB → 长表 {items_size / 1024 ** 2:.1f} MB ({items_size / json_size:.0%})")
+    print(f"  读取宽表: json.loads 逐行 {legacy_read * 1000:.1f} ms/只 → 长表直读 {items_read * 1000:.1f} ms/只 ({legacy_read / items_read:.1f}x)")
+    print(f"  迁移耗时: {migrate_elapsed:.1f}s")
+
+
+def _mixed_workload(db_path, codes, records, n_readers, n_writers, ops, read, write):
+    """读线程按股票点查、写线程按股票整批写入；返回 (耗时, 读次数, 写次数, 锁冲突次数)"""
+    counts = {'read': 0, 'write': 0, 'locked': 0}
+    lock = threading.Lock()
+
+    def run(kind, worker):
+        for i in range(ops):
+            code = codes[(worker * ops + i) % len(codes)]
+            try:
+                read(db_path, code) if kind == 'read' else write(db_path, code, records)
+                key = kind
+            except sqlite3.OperationalError as e:
+                if 'locked' not in str(e):
+                    raise
+                key = 'locked'
+            with lock:
+                counts[key] += 1
+
+    threads = [threading.Thread(target=run, args=('read', i)) for i in range(n_readers)]
+    threads += [threading.Thread(target=run, args=('write', i)) for i in range(n_writers)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - t0, counts['read'], counts['write'], counts['locked']
+
+
+def _write_rows(conn, code, records):
+    columns = ['stock_code', 'report_period', 'report_type'] + SYNTHETIC_FIELDS
+    sql = f"INSERT OR REPLACE INTO financial_reports_raw ({', '.join(columns)}) VALUES ({', '.join(['?'] * len(columns))})"
+    rows = [[code, period, rtype] + [data[f] for f in SYNTHETIC_FIELDS] for period, rtype, data in records]
+    with conn:
+        conn.executemany(sql, rows)
+
+
+def _legacy_read(db_path, code):
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute("SELECT * FROM financial_reports_raw WHERE stock_code=? ORDER BY report_period DESC", (code,)).fetchall()
+    finally:
+        conn.close()
+
+
+def _legacy_write(db_path, code, records):
+    conn = sqlite3.connect(db_path)
+    try:
+        _write_rows(conn, code, records)
+    finally:
+        conn.close()
+
+
+def _pooled_read(db_path, code):
+    get_conn(db_path).execute("SELECT * FROM financial_reports_raw WHERE stock_code=? ORDER BY report_period DESC", (code,)).fetchall()
+
+
+def _pooled_write(db_path, code, records):
+    get_writer(db_path).submit(lambda: _write_rows(get_conn(db_path), code, records)).result()
+
+
+def bench_connections(n_stocks, n_readers, n_writers, ops):
+    """并发读写：每次操作新建连接 (回滚日志) vs 共享连接层 (WAL + 线程复用连接 + 单写入线程)"""
+    rng = random.Random(13)
+    codes = make_stock_codes(n_stocks)
+    records = make_records(make_periods(), rng)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        results = {}
+        for name, read, write in (('legacy', _legacy_read, _legacy_write), ('pooled', _pooled_read, _pooled_write)):
+            db_path = fresh_db(tmp_dir, f"{name}.db")
+            conn = get_conn(db_path)
+            for code in codes:
+                _write_rows(conn, code, records)
+            if name == 'legacy':
+                # 旧库：默认的回滚日志模式
+                conn.execute("PRAGMA journal_mode=DELETE")
+            results[name] = _mixed_workload(db_path, codes, records, n_readers, n_writers, ops, read, write)
+
+    print(f"📊 并发读写基准 ({n_readers} 读线程 + {n_writers} 写线程, 每线程 {ops} 次操作, {n_stocks} 只股票)")
+    for name, label in (('legacy', '每次新建连接'), ('pooled', '共享连接层  ')):
+        elapsed, reads, writes, locked = results[name]
+        print(f"  {label}: 读 {reads / elapsed:,.0f} 次/秒, 写 {writes / elapsed:,.0f} 次/秒, "
+              f"database is locked {locked} 次 ({elapsed:.2f}s)")
+    legacy, pooled = results['legacy'], results['pooled']
+    print(f"  读吞吐加速比: {(pooled[1] / pooled[0]) / max(legacy[1] / legacy[0], 1e-9):.1f}x")
+
+
+def _repository_ui_rerun(db_path, code):
+    """新版 app 一次页面重跑的读库：repository 绑定参数 + 线程复用连接"""
+    latest = repository.latest_indicators(code, db_path=db_path)
+    periods = repository.periods(code, db_path=db_path)
+    exists = repository.has_data(code, db_path=db_path)
+    df_raw, df_derived = repository.history(code, db_path=db_path)
+    return latest, periods, exists, df_raw, df_derived
+
+
+def bench_repository(n_stocks, reruns):
+    """UI 重跑的读库延迟：f-string SQL + 每次新建连接 vs repository (结果一致性见 tests/test_repository.py)"""
+    rng = random.Random(21)
+    codes = make_stock_codes(n_stocks)
+    records = make_records(make_periods(), rng)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = fresh_db(tmp_dir, "ui.db")
+        fetcher = NullFetcher(db_path=db_path)
+        calc = FinancialCalculator()
+        calc.db_path = db_path
+        with contextlib.redirect_stdout(io.StringIO()):
+            for code in codes:
+                fetcher.save_many(code, records)
+            calc.calculate_all(workers=1)
+
+        # 模拟用户在若干只股票间反复切换 (每次切换整页重跑)
+        timings = {}
+        for name, rerun in (('legacy', legacy_ui_rerun), ('repository', _repository_ui_rerun)):
+            samples = []
+            for i in range(reruns * len(codes[:20])):
+                code = codes[i % 20]
+                t0 = time.perf_counter()
+                rerun(db_path, code)
+                samples.append(time.perf_counter() - t0)
+            timings[name] = np.array(samples) * 1000
+
+    print(f"📊 UI 重跑读库延迟 ({n_stocks} 只股票入库, 每次重跑 5 个查询, {len(timings['legacy'])} 次)")
+    for name, label in (('legacy', 'f-string + 新建连接'), ('repository', 'repository        ')):
+        t = timings[name]
+        print(f"  {label}: p50 {np.percentile(t, 50):.2f} ms, p95 {np.percentile(t, 95):.2f} ms")
+    print(f"  p50 加速比: {np.percentile(timings['legacy'], 50) / np.percentile(timings['repository'], 50):.1f}x")
+
+
+def bench_pdf_download(n_stocks, legacy_sample, latency, pdf_kb, parse_ms, workers, rate_limit):
+    """PDF 回填：旧版串行下载 vs 流水线 (连接池 + 下载线程池 + 主机限流 + 解析进程池) 的耗时，对本地桩服务 (完整性见 tests/test_pdf_downloader.py)"""
+    from pdf_downloader import PDFDownloader
+
+    codes = make_stock_codes(n_stocks)
+    parser = SleepParser(parse_ms)
+    stub = CninfoStub(latency, pdf_kb)
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # 1. 旧版：逐只、逐个文件 (取样本估算)
+            sample = codes[:min(legacy_sample, n_stocks)]
+            t0 = time.perf_counter()
+            for code in sample:
+                save_dir = Path(tmp_dir) / "legacy" / code
+                save_dir.mkdir(parents=True)
+                legacy_pdf_download(stub.url, code, save_dir, parser, sleep=0.5)
+            legacy_per_stock = (time.perf_counter() - t0) / len(sample)
+
+            # 2. 流水线：全部股票一次提交
+            db_path = fresh_db(tmp_dir, "files.db")
+            downloader = PDFDownloader(
+                download_dir=Path(tmp_dir) / "pipeline", max_workers=workers, rate_limit=rate_limit,
+                base_url=stub.url, static_url=stub.url, parser=parser, db_path=db_path,
+            )
+            stub.requests = {'query': 0, 'pdf': 0, 'bytes': 0}
+            t0 = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                stats = downloader.download_many(codes)
+            elapsed = time.perf_counter() - t0
+            requests_made = dict(stub.requests)
+    finally:
+        stub.shutdown()
+
+    print(f"📊 PDF 回填基准 ({n_stocks} 只股票, 桩服务延迟 {latency * 1000:.0f} ms, PDF {pdf_kb} KB, 解析 {parse_ms} ms/份)")
+    print(f"  旧版串行: {legacy_per_stock:.2f} s/只 (样本 {len(sample)} 只)")
+    print(f"  流水线  : {elapsed / n_stocks:.2f} s/只 (共 {elapsed:.1f}s, 下载线程 {workers}, 限速 {rate_limit} 次/秒/主机, "
+          f"{requests_made['query']} 次查询 + {requests_made['pdf']} 次下载, 下载 {stats['downloaded']} 份)")
+    print(f"  加速比: {legacy_per_stock / (elapsed / n_stocks):.1f}x")
+
+
+def bench_pdf_resume(n_stocks, pdf_kb, drop_rate, workers):
+    """
+    断线下的 PDF 下载：旧版直接写正式文件 vs .part 断点续传的传输量；以及重跑时按元数据跳过的耗时
+    (续传结果的 sha256、残留临时文件与失效 .part 的处理见 tests/test_pdf_downloader.py)
+    """
+    from pdf_downloader import PDFDownloader
+
+    codes = make_stock_codes(n_stocks)
+    parser = SleepParser(0)
+    stub = CninfoStub(0.0, pdf_kb, drop_rate=drop_rate)
+    expected = n_stocks * len(CninfoStubHandler.REPORTS)
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # 1. 旧版：断线后留下截断文件，之后因 exists() 永远不会重下
+            legacy_files = []
+            for code in codes:
+                save_dir = Path(tmp_dir) / "legacy" / code
+                save_dir.mkdir(parents=True)
+                with contextlib.suppress(Exception):
+                    legacy_pdf_download(stub.url, code, save_dir, parser, sleep=0)
+                legacy_files += list(save_dir.glob("*.pdf"))
+            legacy_bad = sum(1 for f in legacy_files if f.stat().st_size != len(stub.pdf_bytes))
+
+            # 2. 新版：断线后按 Range 续传，只补传缺少的字节
+            db_path = fresh_db(tmp_dir, "files.db")
+            downloader = PDFDownloader(
+                download_dir=Path(tmp_dir) / "resume", max_workers=workers, rate_limit=1000,
+                base_url=stub.url, static_url=stub.url, parser=parser, parse_workers=0, db_path=db_path,
+            )
+            downloader.retries = 8
+            stub.requests = {'query': 0, 'pdf': 0, 'bytes': 0}
+            with contextlib.redirect_stdout(io.StringIO()):
+                stats = downloader.download_many(codes)
+            first = dict(stub.requests)
+
+            # 3. 重跑：库中大小与哈希都在的文件只看元数据跳过 (不发下载请求、不读文件)
+            stub.drop_rate = 0
+            stub.requests = {'query': 0, 'pdf': 0, 'bytes': 0}
+            t0 = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                rerun = downloader.download_many(codes)
+            rerun_elapsed = time.perf_counter() - t0
+            second = dict(stub.requests)
+    finally:
+        stub.shutdown()
+
+    full = expected * len(stub.pdf_bytes)
+    print(f"📊 断线下载基准 ({n_stocks} 只股票, PDF {pdf_kb} KB, 断线率 {drop_rate:.0%})")
+    print(f"  旧版: {len(legacy_files)}/{expected} 份落盘，其中截断 {legacy_bad} 份 (之后因文件已存在不会重下)")
+    print(f"  续传: {stats['downloaded']}/{expected} 份, {first['pdf']} 次下载请求, "
+          f"传输字节为文件总量的 {first['bytes'] / full:.0%} (断线只补传剩余部分)")
+    print(f"  重跑: {second['pdf']} 次下载请求, {rerun_elapsed:.2f}s (按元数据跳过 {rerun['skipped']} 份)")
+
+
+def bench_pdf_parse(n_docs, pages, workers):
+    """PDF 转 TXT：旧版逐个文件串行 vs parse_many (进程池 + 大文档按页段拆分 + 逐页流式写出)，一致性见 tests/test_pdf_parser.py"""
+    import pdf_parser
+    from pdf_parser import PDFParser
+
+    rng = random.Random(18)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        legacy_dir, new_dir = Path(tmp_dir) / "legacy", Path(tmp_dir) / "new"
+        legacy_dir.mkdir()
+        new_dir.mkdir()
+        # 一半年报 (大文档，会被拆成页段)，一半季报
+        for i in range(n_docs):
+            n_pages = pages if i % 2 == 0 else max(1, pages // 8)
+            make_report_pdf(legacy_dir / f"{i:03d}.pdf", n_pages, rng)
+            shutil.copy(legacy_dir / f"{i:03d}.pdf", new_dir / f"{i:03d}.pdf")
+        total_pages = sum(pages if i % 2 == 0 else max(1, pages // 8) for i in range(n_docs))
+
+        t0 = time.perf_counter()
+        for pdf in sorted(legacy_dir.glob("*.pdf")):
+            legacy_parse_pdf(pdf)
+        legacy_elapsed = time.perf_counter() - t0
+
+        parser = PDFParser()
+        t0 = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            parser.parse_many(sorted(new_dir.glob("*.pdf")), workers=workers)
+        new_elapsed = time.perf_counter() - t0
+
+        # 重跑：TXT 比 PDF 新的全部跳过
+        t0 = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            parser.parse_many(sorted(new_dir.glob("*.pdf")), workers=workers)
+        rerun_elapsed = time.perf_counter() - t0
+
+        # 单份大文档的 Python 侧内存峰值
+        big = sorted(legacy_dir.glob("*.pdf"))[0]
+        legacy_peak = _traced(legacy_parse_pdf, big)[1]
+        new_peak = _traced(pdf_parser._extract_pages, big, 0, pages, Path(tmp_dir) / "big.txt")[1]
+
+    print(f"📊 PDF 转 TXT 基准 (年报 {pages} 页 / 季报 {max(1, pages // 8)} 页, 段大小 {pdf_parser.PAGE_CHUNK} 页, CPU {os.cpu_count()} 核)")
+    print(f"  旧版串行 : {total_pages / legacy_elapsed:.0f} 页/秒 ({legacy_elapsed:.1f}s)")
+    print(f"  parse_many: {total_pages / new_elapsed:.0f} 页/秒 ({new_elapsed:.1f}s, 进程 {workers})")
+    print(f"  加速比: {legacy_elapsed / new_elapsed:.1f}x；重跑全部跳过 {rerun_elapsed * 1000:.0f} ms")
+    print(f"  单份 {pages} 页文档 Python 内存峰值: 旧版 {legacy_peak:.2f} MB → 流式 {new_peak:.2f} MB")
+
+
+def bench_sections(n_reports, filler_pages, workers):
+    """报表章节索引：全文 (LLM 取前 100k 字符 / 正则扫全文) vs 按索引只读相关页 (章节页码校验见 tests/test_sections.py)"""
+    import sections
+    from pdf_parser import PDFParser
+    with contextlib.redirect_stdout(io.StringIO()):
+        from validator import FinancialDataValidator
+
+    rng = random.Random(19)
+    validator = FinancialDataValidator(use_llm=False)
+    validator.USE_TABLES = False        # 只比较文本正则路径 (表格见 bench_tables)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        reports = []
+        for i in range(n_reports):
+            pages, truth, _ = make_annual_report(rng, filler_pages=filler_pages)
+            pdf_path = Path(tmp_dir) / f"{i:03d}.pdf"
+            write_report_pdf(pdf_path, pages)
+            reports.append((pdf_path, truth))
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = PDFParser().parse_many([r[0] for r in reports], workers=workers)
+
+        stats = {'full_chars': 0, 'prefix_chars': 0, 'section_chars': 0, 'prefix_has_statements': 0,
+                 'full_hits': 0, 'section_hits': 0, 'full_time': 0.0, 'section_time': 0.0}
+        for pdf_path, truth in reports:
+            txt_path = results[pdf_path]
+            full_text = txt_path.read_text(encoding='utf-8')
+            prefix = full_text[:validator.LLM_MAX_CHARS]
+            section_text = sections.read_sections(txt_path, validator.STATEMENT_SECTIONS)
+            stats['full_chars'] += len(full_text)
+            stats['prefix_chars'] += len(prefix)
+            stats['section_chars'] += len(section_text)
+            stats['prefix_has_statements'] += "合并资产负债表\n" in prefix
+
+            # 正则：旧版全文扫描 vs 先查章节
+            t0 = time.perf_counter()
+            old = legacy_extract_with_regex(validator.CRITICAL_FIELDS, txt_path)
+            stats['full_time'] += time.perf_counter() - t0
+            t0 = time.perf_counter()
+            new = validator._extract_with_regex(txt_path)
+            stats['section_time'] += time.perf_counter() - t0
+            stats['full_hits'] += len(within_tolerance(old, truth))
+            stats['section_hits'] += len(within_tolerance(new, truth))
+
+    n_fields = n_reports * len(FinancialDataValidator.CRITICAL_FIELDS)
+    print(f"📊 报表章节索引基准 ({n_reports} 份年报, 平均 {stats['full_chars'] / n_reports / 1000:.0f}k 字符)")
+    print(f"  LLM 输入: 前 100k 字符 {stats['prefix_chars'] / n_reports / 1000:.0f}k/份 (含合并报表 {stats['prefix_has_statements']}/{n_reports} 份)"
+          f" → 章节 {stats['section_chars'] / n_reports / 1000:.1f}k/份 ({stats['prefix_chars'] / stats['section_chars']:.0f}x 更少)")
+    print(f"  正则耗时: 全文 {stats['full_time'] / n_reports * 1000:.1f} ms/份 → 章节 {stats['section_time'] / n_reports * 1000:.1f} ms/份"
+          f" ({stats['full_time'] / stats['section_time']:.0f}x)")
+    print(f"  正则命中: 全文 {stats['full_hits']}/{n_fields} → 章节 {stats['section_hits']}/{n_fields} (2% 容差内)")
+
+
+def bench_extractors(n_reports, filler_pages, repeat):
+    """正则提取：旧版逐关键词 findall vs 提取引擎 (mmap 全文检索 / 章节索引单模式)，合成财报 TXT 语料 (准确率校验见 tests/test_extractors.py)"""
+    from extractors import FieldExtractor
+    with contextlib.redirect_stdout(io.StringIO()):
+        from validator import FinancialDataValidator
+
+    rng = random.Random(20)
+    fields = FinancialDataValidator.CRITICAL_FIELDS
+    extractor = FieldExtractor(fields)
+    validator = FinancialDataValidator(use_llm=False)
+    # 报表与主要会计数据的单位组合 (元 / 万元 / 亿元)
+    unit_choices = [('元', '元'), ('元', '万元'), ('万元', '万元'), ('元', '亿元')]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        corpus = []
+        for i in range(n_reports):
+            unit, summary_unit = unit_choices[i % len(unit_choices)]
+            pages, truth, _ = make_annual_report(rng, filler_pages=filler_pages, unit=unit, summary_unit=summary_unit)
+            txt_path = Path(tmp_dir) / f"{i:03d}.txt"
+            write_report_txt(txt_path, pages)
+            corpus.append((txt_path, truth))
+        total_mb = sum(p.stat().st_size for p, _ in corpus) / 1024 ** 2
+
+        methods = {
+            'legacy': lambda p: legacy_extract_with_regex(fields, p),
+            'mmap': extractor.extract_file,
+            'sections': validator._extract_with_regex,
+        }
+        timings, hits = {}, {}
+        for name, extract in methods.items():
+            hits[name] = sum(len(within_tolerance(extract(p), truth)) for p, truth in corpus)
+            t0 = time.perf_counter()
+            for _ in range(repeat):
+                for p, _ in corpus:
+                    extract(p)
+            timings[name] = (time.perf_counter() - t0) / (repeat * n_reports)
+
+    n_fields = n_reports * len(fields)
+    print(f"📊 正则提取基准 ({n_reports} 份合成年报, 共 {total_mb:.1f} MB, 单位 元/万元/亿元 混合)")
+    for name, label in (('legacy', '旧版逐关键词 findall'), ('mmap', 'mmap 全文逐关键词检索'), ('sections', '单模式 + 章节索引')):
+        print(f"  {label}: {timings[name] * 1000:6.2f} ms/份, 命中 {hits[name]}/{n_fields}")
+    print(f"  加速比: 全文 {timings['legacy'] / timings['mmap']:.1f}x, 章节 {timings['legacy'] / timings['sections']:.1f}x")
+
+
+def bench_llm_cache(n_stocks, n_periods, latency):
+    """LLM 提取缓存：首次验证 vs 重复验证 / 调整容差 / 单份 TXT 变化 / 主动失效的调用次数与耗时 (本地假模型，命中与失效校验见 tests/test_validator.py)"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        from validator import FinancialDataValidator
+
+    model = FakeLLM(latency)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path, targets = validation_fixture(tmp_dir, n_stocks, n_periods)
+        validator = FinancialDataValidator(model=model, db_path=db_path, rpm=None, tpm=None)
+        validator.CONFIDENCE_THRESHOLD = 1.01   # 所有字段都交给 LLM (不走正则快速路径)
+
+        def run(label):
+            calls = model.calls
+            t0 = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                results = [validator.validate_report(code, period) for code, period in targets]
+            elapsed = time.perf_counter() - t0
+            statuses = [r['status'] for r in results]
+            rows.append((label, model.calls - calls, elapsed, statuses.count('VERIFIED')))
+
+        rows = []
+        run("首次验证")
+        run("重复验证")
+        validator.TOLERANCE = 0.0001
+        run("调整容差")
+        validator.TOLERANCE = FinancialDataValidator.TOLERANCE
+        with open(Path(tmp_dir) / f"{targets[0][0]}_{targets[0][1][:4]}.txt", 'a', encoding='utf-8') as f:
+            f.write("\n更正公告")
+        run("一份 TXT 变化")
+        removed = validator.cache.invalidate(model=model.model_name)
+        run(f"失效 {removed} 条后")
+        stats = validator.cache.stats()
+        validator.close()
+
+    print(f"📊 LLM 提取缓存基准 ({len(targets)} 份报告, 假模型延迟 {latency * 1000:.0f} ms)")
+    for label, calls, elapsed, verified in rows:
+        print(f"  {label:8s}: {calls:3d} 次 LLM 调用, {elapsed:6.2f}s, VERIFIED {verified}/{len(targets)}")
+    print(f"  本进程命中 {stats['hits']} 次 / 未命中 {stats['misses']} 次")
+
+
+def bench_validate_pool(n_stocks, n_periods, latency, workers, rpm, tpm, error_rate):
+    """并发验证 vs 逐个验证的耗时 (本地假模型，按 rpm 限速，注入 429 / 503 错误；结果一致性见 tests/test_validator.py)"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        from validator import FinancialDataValidator
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path, targets = validation_fixture(tmp_dir, n_stocks, n_periods)
+        rows = []
+        for label, run_workers in (("逐个验证", 0), (f"并发 {workers}", workers)):
+            model = FakeLLM(latency, error_rate)
+            validator = FinancialDataValidator(model=model, db_path=db_path, rpm=rpm, tpm=tpm)
+            validator.CONFIDENCE_THRESHOLD = 1.01   # 所有字段都交给 LLM (不走正则快速路径)
+            validator.retry_backoff = 0.01
+            validator.cache.invalidate()
+            t0 = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                if run_workers:
+                    validator.validate_many(targets, workers=run_workers)
+                else:
+                    for code, period in targets:
+                        validator.validate_report(code, period)
+            elapsed = time.perf_counter() - t0
+            rows.append((label, elapsed, model.calls, model.errors))
+            validator.close()
+
+    print(f"📊 并发验证基准 ({len(targets)} 份报告, 假模型延迟 {latency * 1000:.0f} ms, 错误率 {error_rate:.0%}, 限速 {rpm} rpm / {tpm} tpm)")
+    for label, elapsed, calls, errors in rows:
+        print(f"  {label:8s}: {elapsed:6.2f}s, {calls:3d} 次调用 (重试 {errors} 次), 实际 {calls / elapsed * 60:5.0f} rpm")
+    print(f"  加速: {rows[0][1] / rows[1][1]:.1f}x")
+
+
+def bench_llm_batch(n_stocks, n_periods, latency, latency_per_kchar, batch_size, workers):
+    """多报告期合并请求 vs 每期单独请求 (本地假模型)：请求数、token 与耗时 (结果一致性见 tests/test_validator.py)"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        from validator import FinancialDataValidator
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path, targets = validation_fixture(tmp_dir, n_stocks, n_periods)
+        rows = []
+        for label, size in (("每期单独请求", 1), (f"每 {batch_size} 期合并", batch_size)):
+            model = FakeLLM(latency, latency_per_kchar=latency_per_kchar)
+            validator = FinancialDataValidator(model=model, db_path=db_path, rpm=None, tpm=None)
+            validator.CONFIDENCE_THRESHOLD = 1.01   # 所有字段都交给 LLM (不走正则快速路径)
+            validator.BATCH_MAX_PERIODS = batch_size
+            validator.cache.invalidate()
+            t0 = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                validator.validate_many(targets, workers=workers, batch_size=size)
+            elapsed = time.perf_counter() - t0
+            rows.append((label, elapsed, validator.llm_call_stats(), model.prompt_chars))
+            validator.close()
+
+    print(f"📊 多报告期合并提取基准 ({n_stocks} 只 x {n_periods} 期, 假模型延迟 {latency * 1000:.0f} ms "
+          f"+ {latency_per_kchar * 1000:.0f} ms/千字符, 并发 {workers})")
+    for label, elapsed, stats, prompt_chars in rows:
+        print(f"  {label:10s}: {stats['requests']:3d} 次请求, 输入 {prompt_chars / 1000:7.0f}k 字符 / "
+              f"{stats['prompt_tokens'] / stats['requests'] / 1000:5.1f}k tokens/次, "
+              f"平均 {stats['avg_latency']:.2f}s/次, 总耗时 {elapsed:6.2f}s")
+    print(f"  请求数减少 {rows[0][2]['requests'] / rows[1][2]['requests']:.1f}x, "
+          f"提示词开销 (非原文部分) 减少 {(rows[0][3] - rows[1][3]) / 1000:.0f}k 字符")
+
+
+def bench_tiered(n_stocks, n_periods, hard_rate, latency):
+    """分级提取 vs 全部交给 LLM vs 只用正则 (本地假模型)：LLM 调用、token、升级率、准确率与耗时 (准确率不降的校验见 tests/test_validator.py)"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        from validator import FinancialDataValidator
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path, targets = validation_fixture(tmp_dir, n_stocks, n_periods, hard_rate=hard_rate)
+        rows = []
+        for label, use_llm, threshold in (("只用正则", False, None), ("全部交给 LLM", True, 1.01),
+                                          ("分级提取", True, FinancialDataValidator.CONFIDENCE_THRESHOLD)):
+            model = FakeLLM(latency)
+            validator = FinancialDataValidator(use_llm=use_llm, model=model, db_path=db_path, rpm=None, tpm=None)
+            if threshold is not None:
+                validator.CONFIDENCE_THRESHOLD = threshold
+            validator.cache.invalidate()
+            t0 = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                results = validator.validate_many(targets, workers=4)
+            elapsed = time.perf_counter() - t0
+            passed = sum(d.get('status') == 'PASS' for r in results.values() for d in r.get('details', {}).values())
+            verified = sum(r['status'] == 'VERIFIED' for r in results.values())
+            rows.append((label, elapsed, validator.llm_call_stats(), validator.escalation_stats(), passed, verified))
+            validator.close()
+
+    n_fields = len(targets) * len(FinancialDataValidator.CRITICAL_FIELDS)
+    print(f"📊 分级提取基准 ({len(targets)} 份报告, 未声明单位的占 {hard_rate:.0%}, 假模型延迟 {latency * 1000:.0f} ms)")
+    for label, elapsed, llm, tier, passed, verified in rows:
+        print(f"  {label:10s}: {llm['requests']:3d} 次 LLM 请求, 输入 {llm['prompt_tokens'] / 1000:6.0f}k tokens, "
+              f"升级字段 {tier['field_rate']:4.0%}, 字段正确 {passed}/{n_fields}, VERIFIED {verified}/{len(targets)}, "
+              f"{elapsed:6.2f}s")
+
+
+def bench_tables(n_reports, filler_pages, repeat):
+    """
+    结构化表格 (PyMuPDF 单词坐标) vs 正则：带附注列的报表 PDF 上的命中数、升级率、解析与读取耗时，以及回填数
+    (全部命中与回填的校验见 tests/test_tables.py)
+    """
+    import tables
+    with contextlib.redirect_stdout(io.StringIO()):
+        from validator import FinancialDataValidator
+
+    fields = list(FinancialDataValidator.CRITICAL_FIELDS)
+    threshold = FinancialDataValidator.CONFIDENCE_THRESHOLD
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path, corpus = tables_fixture(tmp_dir, n_reports, filler_pages=filler_pages)
+
+        regex = FinancialDataValidator(use_llm=False, db_path=db_path)
+        regex.USE_TABLES = False
+        structured = FinancialDataValidator(use_llm=False, db_path=db_path, autofill=True)
+        rows = {}
+        for label, validator in (("正则 (章节文本)", regex), ("结构化表格", structured)):
+            hits = escalated = 0
+            for _, _, pdf_path, truth, _ in corpus:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    found = validator._scan_local(pdf_path.with_suffix('.txt'))
+                hits += len(within_tolerance({f: m['value'] for f, m in found.items()}, truth))
+                escalated += sum(f not in found or found[f]['confidence'] < threshold for f in fields)
+            rows[label] = (hits, escalated)
+
+        # 冷启动：解析报表页并写表格文件；热启动：读取缓存
+        for _, _, pdf_path, _, _ in corpus:
+            tables.tables_path(pdf_path).unlink()
+        t0 = time.perf_counter()
+        for _, _, pdf_path, _, _ in corpus:
+            tables.get_tables(pdf_path)
+        cold = (time.perf_counter() - t0) / n_reports
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            for _, _, pdf_path, _, _ in corpus:
+                tables.get_tables(pdf_path)
+        warm = (time.perf_counter() - t0) / (repeat * n_reports)
+        size = sum(tables.tables_path(p).stat().st_size for _, _, p, _, _ in corpus) / n_reports
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            structured.validate_many([(code, period) for code, period, _, _, _ in corpus], workers=4)
+        filled = sum(repository.raw_row(code, period, [missing], db_path=db_path)[missing] is not None
+                     for code, period, _, _, missing in corpus)
+        regex.close()
+
+    n_fields = n_reports * len(fields)
+    print(f"📊 结构化表格基准 ({n_reports} 份带附注列的报表 PDF, 单位 元/万元/未声明 混合)")
+    for label, (hits, escalated) in rows.items():
+        print(f"  {label:10s}: 命中 {hits}/{n_fields}, 需交给 LLM {escalated}/{n_fields} 个字段")
+    print(f"  表格文件: 首次解析 {cold * 1000:.1f} ms/份, 读取缓存 {warm * 1000:.2f} ms/份, {size / 1024:.1f} KB/份")
+    print(f"  回填: {filled}/{n_reports} 个缺失字段 (未声明单位的报表不回填)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Antigravity 性能基准测试")
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    p = sub.add_parser("save_many", help="批量写入 financial_reports_raw")
+    p.add_argument("--stocks", type=int, default=5000)
+    p.add_argument("--legacy-sample", type=int, default=50, help="旧路径太慢，只取前 N 只股票估算吞吐")
+
+    p = sub.add_parser("indicators", help="衍生指标计算：旧版逐行 apply vs 向量化引擎")
+    p.add_argument("--stocks", type=int, default=5000)
+    p.add_argument("--legacy-sample", type=int, default=100, help="旧引擎太慢，只取前 N 只股票计时")
+
+    p = sub.add_parser("calculate_all", help="进程池批量计算 vs 逐只计算")
+    p.add_argument("--stocks", type=int, default=500)
+    p.add_argument("--workers", type=int, default=4)
+
+    p = sub.add_parser("incremental", help="修正数据后的增量指标计算 (只重写依赖的报告期)")
+    p.add_argument("--stocks", type=int, default=200)
+
+    p = sub.add_parser("normalize", help="A 股三大报表清洗：逐期 get_val vs 整表向量化")
+    p.add_argument("--stocks", type=int, default=200)
+
+    p = sub.add_parser("fetch_many", help="并发抓取：限速 + 重试 + 单写入线程 (本地桩接口)")
+    p.add_argument("--stocks", type=int, default=20)
+    p.add_argument("--concurrency", type=int, default=4)
+    p.add_argument("--rate-limit", type=float, default=20.0)
+    p.add_argument("--latency", type=float, default=0.25, help="桩接口每个请求的延迟 (秒)，需 ≥ 并发 / 限速")
+    p.add_argument("--error-rate", type=float, default=0.2, help="桩接口抛出连接错误的比例")
+
+    p = sub.add_parser("hk_pivot", help="港股三表透视 (含内存剖析)")
+    p.add_argument("--stocks", type=int, default=2500)
+    p.add_argument("--pool", type=int, default=10, help="合成的不同股票样本数 (全市场循环复用)")
+    p.add_argument("--trace-sample", type=int, default=50, help="用 tracemalloc 追踪峰值内存的股票数")
+
+    p = sub.add_parser("raw_items", help="全量科目 JSON vs 长表")
+    p.add_argument("--stocks", type=int, default=300)
+    p.add_argument("--pool", type=int, default=10, help="合成的不同股票样本数 (循环复用)")
+
+    p = sub.add_parser("connections", help="并发读写：新建连接 vs 共享连接层")
+    p.add_argument("--stocks", type=int, default=200)
+    p.add_argument("--readers", type=int, default=8)
+    p.add_argument("--writers", type=int, default=4)
+    p.add_argument("--ops", type=int, default=300, help="每个线程的操作次数")
+
+    p = sub.add_parser("repository", help="UI 重跑读库延迟：f-string SQL vs repository")
+    p.add_argument("--stocks", type=int, default=200)
+    p.add_argument("--reruns", type=int, default=20, help="每只样本股票的重跑次数")
+
+    p = sub.add_parser("pdf_download", help="PDF 回填：旧版串行 vs 流水线 (本地桩服务)")
+    p.add_argument("--stocks", type=int, default=20)
+    p.add_argument("--legacy-sample", type=int, default=2, help="旧版太慢，只取前 N 只股票估算")
+    p.add_argument("--latency", type=float, default=0.05, help="桩服务每个请求的延迟 (秒)")
+    p.add_argument("--pdf-kb", type=int, default=512)
+    p.add_argument("--parse-ms", type=int, default=200, help="模拟的单份 PDF 解析 CPU 耗时")
+    p.add_argument("--workers", type=int, default=8)
+    p.add_argument("--rate-limit", type=float, default=20.0)
+
+    p = sub.add_parser("pdf_resume", help="断线下的 PDF 断点续传 (本地桩服务)")
+    p.add_argument("--stocks", type=int, default=10)
+    p.add_argument("--pdf-kb", type=int, default=2048)
+    p.add_argument("--drop-rate", type=float, default=0.3, help="下载中途断线的概率")
+    p.add_argument("--workers", type=int, default=8)
+
+    p = sub.add_parser("pdf_parse", help="PDF 转 TXT：旧版串行 vs parse_many (需要 PyMuPDF)")
+    p.add_argument("--docs", type=int, default=20)
+    p.add_argument("--pages", type=int, default=240, help="年报页数 (季报为其 1/8)")
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+
+    p = sub.add_parser("sections", help="报表章节索引：全文 vs 按索引只读相关页 (需要 PyMuPDF)")
+    p.add_argument("--reports", type=int, default=20)
+    p.add_argument("--filler-pages", type=int, default=120, help="主要会计数据与合并报表之间的页数")
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+
+    p = sub.add_parser("extractors", help="正则提取：旧版 findall vs 预编译单模式 (合成财报 TXT)")
+    p.add_argument("--reports", type=int, default=40)
+    p.add_argument("--filler-pages", type=int, default=120)
+    p.add_argument("--repeat", type=int, default=5)
+
+    p = sub.add_parser("llm_cache", help="LLM 提取缓存：重复验证零调用 (本地假模型)")
+    p.add_argument("--stocks", type=int, default=5)
+    p.add_argument("--periods", type=int, default=4)
+    p.add_argument("--latency", type=float, default=0.5, help="假模型每次调用的延迟 (秒)")
+
+    p = sub.add_parser("validate_pool", help="并发验证：限速 + 重试 + 单写入线程 (本地假模型)")
+    p.add_argument("--stocks", type=int, default=10)
+    p.add_argument("--periods", type=int, default=4)
+    p.add_argument("--latency", type=float, default=0.5, help="假模型每次调用的延迟 (秒)")
+    p.add_argument("--workers", type=int, default=8)
+    p.add_argument("--rpm", type=int, default=600)
+    p.add_argument("--tpm", type=int, default=10_000_000)
+    p.add_argument("--error-rate", type=float, default=0.1, help="假模型返回 429 / 503 的比例")
+
+    p = sub.add_parser("tiered", help="分级提取：正则置信度不足的字段才交给 LLM (本地假模型)")
+    p.add_argument("--stocks", type=int, default=10)
+    p.add_argument("--periods", type=int, default=4)
+    p.add_argument("--hard-rate", type=float, default=0.25, help="表头不声明金额单位的年报比例")
+    p.add_argument("--latency", type=float, default=0.5, help="假模型每次请求的延迟 (秒)")
+
+    p = sub.add_parser("tables", help="结构化表格 (PyMuPDF 单词坐标) vs 正则，含回填")
+    p.add_argument("--reports", type=int, default=20)
+    p.add_argument("--filler-pages", type=int, default=20)
+    p.add_argument("--repeat", type=int, default=20)
+
+    p = sub.add_parser("llm_batch", help="多报告期合并为一次 LLM 请求 (本地假模型)")
+    p.add_argument("--stocks", type=int, default=5)
+    p.add_argument("--periods", type=int, default=8)
+    p.add_argument("--batch-size", type=int, default=4)
+    p.add_argument("--workers", type=int, default=4)
+    p.add_argument("--latency", type=float, default=0.5, help="假模型每次请求的固定延迟 (秒)")
+    p.add_argument("--latency-per-kchar", type=float, default=0.005, help="假模型每千字符输入的额外延迟 (秒)")
+
+    args = parser.parse_args()
+    if args.bench == "save_many":
+        bench_save_many(args.stocks, args.legacy_sample)
+    elif args.bench == "indicators":
+        bench_indicators(args.stocks, args.legacy_sample)
+    elif args.bench == "calculate_all":
+        bench_calculate_all(args.stocks, args.workers)
+    elif args.bench == "incremental":
+        bench_incremental(args.stocks)
+    elif args.bench == "normalize":
+        bench_normalize(args.stocks)
+    elif args.bench == "fetch_many":
+        bench_fetch_many(args.stocks, args.concurrency, args.rate_limit, args.latency, args.error_rate)
+    elif args.bench == "hk_pivot":
+        bench_hk_pivot(args.stocks, args.pool, args.trace_sample)
+    elif args.bench == "raw_items":
+        bench_raw_items(args.stocks, args.pool)
+    elif args.bench == "connections":
+        bench_connections(args.stocks, args.readers, args.writers, args.ops)
+    elif args.bench == "repository":
+        bench_repository(args.stocks, args.reruns)
+    elif args.bench == "pdf_download":
+        bench_pdf_download(args.stocks, args.legacy_sample, args.latency, args.pdf_kb, args.parse_ms, args.workers, args.rate_limit)
+    elif args.bench == "pdf_resume":
+        bench_pdf_resume(args.stocks, args.pdf_kb, args.drop_rate, args.workers)
+    elif args.bench == "pdf_parse":
+        bench_pdf_parse(args.docs, args.pages, args.workers)
+    elif args.bench == "sections":
+        bench_sections(args.reports, args.filler_pages, args.workers)
+    elif args.bench == "extractors":
+        bench_extractors(args.reports, args.filler_pages, args.repeat)
+    elif args.bench == "llm_cache":
+        bench_llm_cache(args.stocks, args.periods, args.latency)
+    elif args.bench == "validate_pool":
+        bench_validate_pool(args.stocks, args.periods, args.latency, args.workers, args.rpm, args.tpm, args.error_rate)
+    elif args.bench == "tiered":
+        bench_tiered(args.stocks, args.periods, args.hard_rate, args.latency)
+    elif args.bench == "tables":
+        bench_tables(args.reports, args.filler_pages, args.repeat)
+    elif args.bench == "llm_batch":
+        bench_llm_batch(args.stocks, args.periods, args.latency, args.latency_per_kchar, args.batch_size, args.workers)
+
+
+if __name__ == "__main__":
+    main()
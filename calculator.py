@@ -1,126 +1,331 @@
+import os
+import numpy as np
 import pandas as pd
-import sqlite3
+from db import get_conn
+from repository import raw_inputs, stale_periods
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 # 数据库路径
 DB_PATH = Path(__file__).parent / "finance.db"
 
+# 写入 financial_indicators_derived 的指标列
+INDICATOR_COLUMNS = [
+    'gross_margin', 'net_margin', 'roe', 'roa',
+    'revenue_yoy', 'net_profit_yoy',
+    'debt_to_asset', 'current_ratio', 'inventory_turnover_days', 'receivables_turnover_days',
+    'fcf', 'cfo_to_net_income',
+    'net_profit_ttm', 'eps_ttm',
+]
+
+# 指标公式版本：公式或口径变化时加 1，已有指标行 (不论原始数据是否变化) 在下次增量计算时全部重算
+# 1: 首个记录版本的公式
+# 2: 同比改为对比上年同一报告期；新增 net_profit_ttm / eps_ttm (上年年报按 report_type 识别，支持非 12 月年结)
+FORMULA_VERSION = 2
+
+# 计算指标用到的原始字段
+RAW_INPUT_COLUMNS = [
+    'revenue', 'cost_of_revenue', 'gross_profit', 'net_income', 'net_income_parent',
+    'total_assets', 'total_liabilities', 'total_equity', 'current_assets', 'current_liabilities',
+    'inventory', 'accounts_receivable', 'cfo_net', 'capex', 'eps_basic',
+]
+
+
+def safe_ratio(numerator, denominator):
+    """
+    列级安全除法：分母为 0 或任一侧为空时结果为 NaN (一次遍历完成屏蔽)
+    """
+    a = np.asarray(numerator, dtype=float)
+    b = np.asarray(denominator, dtype=float)
+    valid = ~np.isnan(a) & ~np.isnan(b) & (b != 0)
+    out = np.full(a.shape, np.nan)
+    np.divide(a, b, out=out, where=valid)
+    return out
+
+
+def prior_year_positions(codes, years, months):
+    """
+    同比对齐：为每一行找到同一只股票上一年同一报告期所在的行号
+    基于 (stock_code, 年, 月) 键一次性批量查找，缺失的报告期返回 -1，不依赖行的顺序与连续性
+    """
+    # 编码为整数键 (股票序号, 年, 月)，比 MultiIndex 查找快得多
+    code_ids = pd.factorize(codes)[0].astype(np.int64) * 1_000_000
+    keys = pd.Index(code_ids + years * 100 + months)
+    first = ~keys.duplicated()
+    positions = np.flatnonzero(first)
+    idx = keys[first].get_indexer(code_ids + (years - 1) * 100 + months)
+    return np.where(idx >= 0, positions[idx], -1)
+
+
+def prior_annual_positions(codes, years, months, is_annual):
+    """
+    TTM 的"上年年报"：本期之前最近一个财年结束日的年报 (report_type == 'A') 所在的行号
+    财年结束月份取该股票年报行的月份 (有年报行的股票)，港股 3 月 / 6 月财年同样适用
+    年报行本身不需要上年年报，与缺失的年报一样返回 -1
+    """
+    if not is_annual.any():
+        return np.full(len(codes), -1)
+    code_ids, uniques = pd.factorize(codes)
+    code_ids = code_ids.astype(np.int64)
+    fiscal_by_code = np.full(len(uniques), 12, dtype=np.int64)
+    # 每只股票年报月份的众数 (个别更改过财年的股票以多数年份为准)
+    counts = pd.DataFrame({'code': code_ids[is_annual], 'month': months[is_annual]}).value_counts()
+    counts = counts.reset_index(name='n').sort_values('n', ascending=False, kind='stable').drop_duplicates('code')
+    fiscal_by_code[counts['code'].to_numpy()] = counts['month'].to_numpy()
+    fiscal_month = fiscal_by_code[code_ids]
+    # 财年结束月之后的报告期属于下一财年，上年年报在同一自然年；否则在上一自然年
+    target_year = np.where(months > fiscal_month, years, years - 1)
+
+    keys = pd.Index((code_ids * 1_000_000 + years * 100 + months)[is_annual])
+    first = ~keys.duplicated()
+    positions = np.flatnonzero(is_annual)[first]
+    idx = keys[first].get_indexer(code_ids * 1_000_000 + target_year * 100 + fiscal_month)
+    return np.where((idx >= 0) & ~is_annual, positions[idx], -1)
+
+
+def annual_flags(df, months):
+    """年报行：按入库的 report_type 判断 (非 12 月财年的港股由抓取时的 FISCAL_YEAR 决定)，没有该列时按 12 月"""
+    if 'report_type' in df.columns:
+        return df['report_type'].to_numpy() == 'A'
+    return months == 12
+
+
+def take(values, positions):
+    """按行号取值，-1 (不存在) 对应 NaN"""
+    out = np.full(len(positions), np.nan)
+    found = positions >= 0
+    out[found] = values[positions[found]]
+    return out
+
+
+def yoy_growth(current, prior):
+    """同比增长率 (%)：(本期 - 上年同期) / |上年同期|，上年同期为 0 或缺失时为空"""
+    return safe_ratio(current - prior, np.abs(prior)) * 100
+
+
+def ttm(current, prior_annual, prior_same, is_annual):
+    """
+    滚动 12 个月 (TTM)：年报即本身；其余报告期 = 本期累计 + 上年年报 - 上年同期累计
+    """
+    return np.where(is_annual, current, current + prior_annual - prior_same)
+
+
+def compute_indicators(df):
+    """
+    基于原始报表计算衍生指标 (列式向量化)
+    df: 以 report_period 为索引的原始数据，可一次包含全市场多只股票 (不要求排序)
+    """
+    # 一次性把用到的列转成 float 数组，空值统一为 NaN
+    col = {name: pd.to_numeric(df[name], errors='coerce').to_numpy(dtype=float) for name in RAW_INPUT_COLUMNS}
+    codes = df['stock_code'].to_numpy()
+    years = df.index.year.to_numpy()
+    months = df.index.month.to_numpy()
+
+    # 利润表/现金流量表是年初至今的累计数，只能与上年同一报告期比较
+    is_annual = annual_flags(df, months)
+    prior_same = prior_year_positions(codes, years, months)
+    prior_annual = prior_annual_positions(codes, years, months, is_annual)
+
+    ind = {
+        'stock_code': codes,
+        'report_period': df.index.strftime('%Y-%m-%d'),  # 转回字符串存库
+    }
+
+    # --- A. 盈利能力 ---
+    ind['gross_margin'] = safe_ratio(col['gross_profit'], col['revenue']) * 100
+    ind['net_margin'] = safe_ratio(col['net_income'], col['revenue']) * 100
+    ind['roe'] = safe_ratio(col['net_income_parent'], col['total_equity']) * 100
+    ind['roa'] = safe_ratio(col['net_income'], col['total_assets']) * 100
+
+    # --- B. 成长能力 (YoY) ---
+    # Q1 对比上年 Q1，S1 对比上年 S1 ... (而不是上一行)
+    ind['revenue_yoy'] = yoy_growth(col['revenue'], take(col['revenue'], prior_same))
+    ind['net_profit_yoy'] = yoy_growth(col['net_income_parent'], take(col['net_income_parent'], prior_same))
+
+    # --- C. 偿债与运营 ---
+    ind['debt_to_asset'] = safe_ratio(col['total_liabilities'], col['total_assets']) * 100
+    # 流动比率 = 流动资产 / 流动负债
+    ind['current_ratio'] = safe_ratio(col['current_assets'], col['current_liabilities'])
+    # 存货周转天数 = 365 * 存货 / 营业成本
+    ind['inventory_turnover_days'] = safe_ratio(365 * col['inventory'], col['cost_of_revenue'])
+    # 应收账款周转天数 = 365 * 应收账款 / 营业收入
+    ind['receivables_turnover_days'] = safe_ratio(365 * col['accounts_receivable'], col['revenue'])
+
+    # --- D. 现金流 ---
+    # 自由现金流 FCF = 经营现金流净额 - 资本开支 (任一为空则结果为空)
+    ind['fcf'] = col['cfo_net'] - col['capex']
+    # 净现比 = 经营现金流净额 / 净利润
+    ind['cfo_to_net_income'] = safe_ratio(col['cfo_net'], col['net_income'])
+
+    # --- E. TTM 数据 (滚动12个月) ---
+    # TTM = 本期累计 + (上年年报 - 上年同期累计)，年报 TTM = 年报本身
+    for target, source in (('net_profit_ttm', 'net_income_parent'), ('eps_ttm', 'eps_basic')):
+        values = col[source]
+        ind[target] = ttm(values, take(values, prior_annual), take(values, prior_same), is_annual)
+
+    # 记录所依据的原始行版本与公式版本，供增量计算判断是否过期
+    ind['source_updated_at'] = df['updated_at'].to_numpy() if 'updated_at' in df.columns else None
+    ind['formula_version'] = FORMULA_VERSION
+
+    return pd.DataFrame(ind, index=df.index)
+
+
+def affected_mask(df, changed):
+    """
+    变更传播：除了变更的报告期本身，依赖它的下游报告期也需要重算
+    - 下一年的同一报告期 (YoY 与 TTM 的"上年同期")
+    - 如果变更的是年报，下一财年的所有非年报报告期 (TTM 的"上年年报")
+    df: 含 stock_code / report_period (/ report_type) 列；changed: 与 df 对齐的布尔数组
+    """
+    changed = np.asarray(changed, dtype=bool)
+    codes = df['stock_code'].to_numpy()
+    periods = pd.to_datetime(df['report_period'])
+    years = periods.dt.year.to_numpy()
+    months = periods.dt.month.to_numpy()
+
+    prior_same = prior_year_positions(codes, years, months)
+    prior_annual = prior_annual_positions(codes, years, months, annual_flags(df, months))
+    depends_on_same = (prior_same >= 0) & changed[prior_same]
+    depends_on_annual = (prior_annual >= 0) & changed[prior_annual]
+    return changed | depends_on_same | depends_on_annual
+
+
+def _compute_chunk(df):
+    """进程池任务：计算一批股票的指标"""
+    return compute_indicators(_prepare_raw(df))
+
+
+def _prepare_raw(df):
+    """设置 report_period 为 datetime 索引，方便 shift 操作"""
+    df = df.copy()
+    df['report_period'] = pd.to_datetime(df['report_period'])
+    return df.set_index('report_period')
+
+
+def _split_groups(df, n_chunks):
+    """按股票切分为 n_chunks 份 (同一只股票不会被拆开)"""
+    codes = df['stock_code'].unique()
+    if len(codes) == 0:
+        return []
+    chunks = []
+    for code_chunk in np.array_split(codes, min(n_chunks, len(codes))):
+        chunks.append(df[df['stock_code'].isin(code_chunk)])
+    return chunks
+
+
 class FinancialCalculator:
     def __init__(self):
         self.db_path = DB_PATH
-        
+
+    def _load_raw(self, stock_codes=None):
+        """读取计算所需的原始字段 (按股票、报告期正序)，stock_codes 为 None 时读取全市场"""
+        return raw_inputs(RAW_INPUT_COLUMNS, stock_codes, db_path=self.db_path)
+
     def calculate_indicators(self, stock_code):
         """
         计算指定股票的衍生指标
         """
         print(f"🧮 开始计算 {stock_code} 的衍生指标...")
-        
-        conn = sqlite3.connect(self.db_path)
-        
+
+        conn = get_conn(self.db_path)
+
         # 1. 读取原始数据 (按时间正序排列)
-        df = pd.read_sql(f"SELECT * FROM financial_reports_raw WHERE stock_code='{stock_code}' ORDER BY report_period ASC", conn)
-        
+        df = self._load_raw([stock_code])
+
         if df.empty:
             print("⚠️ 没有找到原始数据，无法计算。")
-            conn.close()
             return False
-            
-        # 设置 report_period 为索引，方便 shift 操作
-        df['report_period'] = pd.to_datetime(df['report_period'])
-        df.set_index('report_period', inplace=True)
-        
+
         # 2. 计算指标
-        indicators = pd.DataFrame(index=df.index)
-        indicators['stock_code'] = stock_code
-        indicators['report_period'] = df.index.strftime('%Y-%m-%d') # 转回字符串存库
-        
-        # --- A. 盈利能力 ---
-        # 辅助函数：安全除法
-        def safe_div(a, b):
-            if pd.isna(a) or pd.isna(b) or b == 0:
-                return None
-            return a / b
-
-        # 2. 计算衍生指标
-        # 盈利能力
-        indicators['gross_margin'] = df.apply(lambda x: safe_div(x['gross_profit'], x['revenue']) * 100 if safe_div(x['gross_profit'], x['revenue']) is not None else None, axis=1)
-        indicators['net_margin'] = df.apply(lambda x: safe_div(x['net_income'], x['revenue']) * 100 if safe_div(x['net_income'], x['revenue']) is not None else None, axis=1)
-        indicators['roe'] = df.apply(lambda x: safe_div(x['net_income_parent'], x['total_equity']) * 100 if safe_div(x['net_income_parent'], x['total_equity']) is not None else None, axis=1)
-        indicators['roa'] = df.apply(lambda x: safe_div(x['net_income'], x['total_assets']) * 100 if safe_div(x['net_income'], x['total_assets']) is not None else None, axis=1)
-        
-        # 成长能力 (YoY)
-        # 成长能力 (YoY)
-        # 数据是正序排列的 (2022, 2023, ...)，所以比较上一行 (去年)
-        # 假设主要是年度数据，所以 periods=1
-        indicators['revenue_yoy'] = df['revenue'].pct_change(periods=1) * 100
-        indicators['net_profit_yoy'] = df['net_income_parent'].pct_change(periods=1) * 100
-        
-        # 偿债能力
-        indicators['debt_to_asset'] = df.apply(lambda x: safe_div(x['total_liabilities'], x['total_assets']) * 100 if safe_div(x['total_liabilities'], x['total_assets']) is not None else None, axis=1)
-        # 流动比率 = 流动资产 / 流动负债
-        indicators['current_ratio'] = df.apply(lambda x: safe_div(x['current_assets'], x['current_liabilities']) if safe_div(x['current_assets'], x['current_liabilities']) is not None else None, axis=1)
-        
-        # 运营能力
-        # 存货周转天数 = 365 * 存货 / 营业成本
-        indicators['inventory_turnover_days'] = df.apply(lambda x: safe_div(365 * x['inventory'], x['cost_of_revenue']) if pd.notna(x['inventory']) else None, axis=1)
-        # 应收账款周转天数 = 365 * 应收账款 / 营业收入
-        indicators['receivables_turnover_days'] = df.apply(lambda x: safe_div(365 * x['accounts_receivable'], x['revenue']) if pd.notna(x['accounts_receivable']) else None, axis=1)
-        
-        # 现金流
-        # 自由现金流 FCF = 经营现金流净额 - 资本开支
-        # 注意：如果 capex 是 None，结果也是 None，这是 pandas 的特性，不会报错
-        indicators['fcf'] = df['cfo_net'] - df['capex']
-        
-        # 净现比 = 经营现金流净额 / 净利润
-        indicators['cfo_to_net_income'] = df.apply(lambda x: safe_div(x['cfo_net'], x['net_income']) if safe_div(x['cfo_net'], x['net_income']) is not None else None, axis=1)
-        
-        # --- D. 成长能力 (YoY) ---
-        # 已在上方通过 pct_change 计算，此处移除重复且易报错的 merge 逻辑
-
-        
-        # --- E. TTM 数据 (滚动12个月) ---
-        # 仅针对季报/半年报计算。年报 TTM = 年报本身。
-        # TTM = 本期累计 + (上年年报 - 上年同期累计)
-        # 这是一个比较复杂的逻辑，为了 MVP 快速上线，我们暂时先用“年报数据”作为 TTM 的近似值（如果是非年报，则不计算或沿用上年数据）。
-        # 后续我们会完善这个 TTM 算法。
-        indicators['net_profit_ttm'] = df['net_income_parent'] # 临时占位
-        
-        # 3. 存入数据库
-        cursor = conn.cursor()
-        
-        # 逐行插入
-        for idx, row in indicators.iterrows():
-            # 处理 NaN 为 None
-            row = row.where(pd.notnull(row), None)
-            
-            data = {
-                'stock_code': stock_code,
-                'report_period': row['report_period'],
-                'gross_margin': row['gross_margin'],
-                'net_margin': row['net_margin'],
-                'roe': row['roe'],
-                'roa': row['roa'],
-                'revenue_yoy': row['revenue_yoy'],
-                'net_profit_yoy': row['net_profit_yoy'],
-                'debt_to_asset': row['debt_to_asset'],
-                'inventory_turnover_days': row['inventory_turnover_days'],
-                'fcf': row['fcf'],
-                'cfo_to_net_income': row['cfo_to_net_income']
-            }
-            
-            columns = ', '.join(data.keys())
-            placeholders = ', '.join(['?'] * len(data))
-            
-            sql = f'''
-            INSERT OR REPLACE INTO financial_indicators_derived ({columns})
-            VALUES ({placeholders})
-            '''
-            cursor.execute(sql, list(data.values()))
-            
-        conn.commit()
-        conn.close()
+        indicators = compute_indicators(_prepare_raw(df))
+
+        # 3. 存入数据库 (一次 executemany)
+        self._save_indicators(conn, indicators)
+
         print(f"✅ {stock_code} 指标计算完成！")
+        return True
+
+    def calculate_all(self, stock_codes=None, workers=None):
+        """
+        全市场 (或指定股票列表) 批量计算衍生指标：
+        一次读取原始表 → 按股票分组分发到进程池 → 汇总后由单一写入方批量入库
+        """
+        workers = workers or os.cpu_count() or 1
+        conn = get_conn(self.db_path)
+
+        df = self._load_raw(stock_codes)
+        if df.empty:
+            print("⚠️ 没有找到原始数据，无法计算。")
+            return 0
+
+        n_stocks = df['stock_code'].nunique()
+        print(f"🧮 开始批量计算 {n_stocks} 只股票的衍生指标 (workers={workers})...")
+
+        if workers <= 1:
+            indicators = _compute_chunk(df)
+        else:
+            # 每个进程分到若干批，兼顾负载均衡与序列化开销
+            chunks = _split_groups(df, workers * 4)
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                indicators = pd.concat(pool.map(_compute_chunk, chunks))
+
+        saved = self._save_indicators(conn, indicators)
+        print(f"✅ 批量计算完成：{n_stocks} 只股票，{saved} 条指标")
+        return saved
+
+    def calculate_changed(self, stock_code=None):
+        """
+        增量计算：只重算自上次计算以来原始数据有变化的报告期及其下游依赖
+        (抓取、回填、手动修正都会更新 financial_reports_raw.updated_at)，
+        以及按旧版公式 (FORMULA_VERSION) 算出的指标
+        stock_code 为 None 时检查全市场
+        """
+        conn = get_conn(self.db_path)
+
+        # 1. 找出过期的报告期：没有指标、指标所依据的原始行版本已变化，或公式版本不是当前版本
+        changed = stale_periods(FORMULA_VERSION, stock_code, db_path=self.db_path)
+
+        if changed.empty:
+            print("✅ 指标已是最新，无需重算")
+            return 0
+
+        # 2. 读取受影响股票的完整历史 (作为 YoY/TTM 的上下文)，只写回受影响的行
+        df = self._load_raw(changed['stock_code'].unique())
+        keys = pd.MultiIndex.from_frame(changed[['stock_code', 'report_period']])
+        is_changed = pd.MultiIndex.from_frame(df[['stock_code', 'report_period']]).isin(keys)
+        mask = affected_mask(df, is_changed)
+
+        indicators = compute_indicators(_prepare_raw(df))[mask]
+        saved = self._save_indicators(conn, indicators)
+        print(f"✅ 增量计算完成：{len(changed)} 个报告期有变更，重算 {saved} 条指标")
+        return saved
+
+    def _save_indicators(self, conn, indicators):
+        """批量写入衍生指标 (单事务)"""
+        columns = ['stock_code', 'report_period'] + INDICATOR_COLUMNS + ['source_updated_at', 'formula_version']
+        # 处理 NaN 为 None
+        frame = indicators[columns].astype(object)
+        rows = frame.where(pd.notnull(frame), None).values.tolist()
+
+        sql = f'''
+        INSERT OR REPLACE INTO financial_indicators_derived ({', '.join(columns)})
+        VALUES ({', '.join(['?'] * len(columns))})
+        '''
+        with conn:
+            conn.executemany(sql, rows)
+        return len(rows)
 
 if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="计算衍生财务指标")
+    parser.add_argument("stock_code", nargs="?", default="688005")
+    parser.add_argument("--all", action="store_true", help="全市场批量重算")
+    parser.add_argument("--workers", type=int, default=None, help="进程数 (默认 CPU 核数)")
+    args = parser.parse_args()
+
     calc = FinancialCalculator()
-    calc.calculate_indicators("688005")
+    if args.all:
+        calc.calculate_all(workers=args.workers)
+    else:
+        calc.calculate_indicators(args.stock_code)
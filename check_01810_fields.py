@@ -1,17 +1,16 @@
 import sqlite3
-import pandas as pd
-import json
 from pathlib import Path
+from report_items import load_items
 
 DB_PATH = Path(__file__).parent / "finance.db"
 
 def check_fields():
     conn = sqlite3.connect(DB_PATH)
     try:
-        # 获取最新的 raw_data
-        df = pd.read_sql("SELECT raw_data FROM financial_reports_raw WHERE stock_code='01810' ORDER BY report_period DESC LIMIT 1", conn)
-        if not df.empty and df.iloc[0]['raw_data']:
-            data = json.loads(df.iloc[0]['raw_data'])
+        # 获取最新一期的全量科目
+        df = load_items(conn, '01810')
+        if not df.empty:
+            data = df.iloc[0].dropna().to_dict()
             print("🔍 小米 (01810) 字段列表:")
             
             # 打印所有字段
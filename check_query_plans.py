@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+"""
+热点查询的执行计划回归检查 (EXPLAIN QUERY PLAN)
+任一查询出现全表扫描 (SCAN)、为排序建临时 B 树，或没有用上为它建的覆盖索引时退出码为 1
+
+用法:
+    python check_query_plans.py              # 在临时库上按最新 schema 检查
+    python check_query_plans.py --db finance.db   # 只读检查现有数据库
+"""
+import argparse
+import contextlib
+import io
+import sqlite3
+import sys
+import tempfile
+from pathlib import Path
+
+import repository
+from database import SCHEMA_VERSION, init_db
+from fetchers.base_fetcher import STORED_STATE_SQL
+from llm_cache import GET_SQL
+from report_items import LOAD_ITEMS_SQL, LOAD_PERIODS_SQL
+
+# (名称, SQL, 参数[, 必须出现的计划])：SQL 直接取自执行它的模块，与实际运行的语句不会脱节
+# 必须出现的计划与某一行完全相同时，该行不按 BAD_PLAN_PREFIXES 判为回归 (用于有意的覆盖索引遍历)
+HOT_QUERIES = [
+    ("repository.latest_indicators (app 最新指标)", repository.LATEST_INDICATORS_SQL, ('600519',)),
+    ("repository.history 原始数据", repository.RAW_HISTORY_SQL, ('600519',)),
+    ("repository.history 衍生指标", repository.DERIVED_HISTORY_SQL, ('600519',)),
+    ("repository.periods (app 报告期列表)", repository.PERIODS_SQL, ('600519',)),
+    ("repository.has_data (app 是否已有数据)", repository.HAS_DATA_SQL, ('600519',)),
+    ("repository.report_statuses (batch_validate 验证状态)", repository.REPORT_STATUSES_SQL,
+     ('600519',), "COVERING INDEX idx_raw_quality"),
+    ("repository.raw_row (validator._get_akshare_data)",
+     repository.RAW_ROW_SQL.format(fields='revenue, net_income_parent, total_assets, total_equity'),
+     ('600519', '2023-12-31')),
+    ("repository.files_for (pdf_downloader)", repository.FILES_FOR_SQL, ('600519', '2023-12-31')),
+    ("repository.txt_path (validator._get_txt_path)", repository.TXT_PATH_SQL,
+     ('600519', '2023-12-31'), "COVERING INDEX idx_files_txt"),
+    # 列出全部股票本来就要遍历，只要求只读覆盖索引、不回表、不临时排序
+    ("repository.stocks_with_txt (batch_validate --all)", repository.STOCKS_WITH_TXT_SQL,
+     (), "SCAN financial_reports_files USING COVERING INDEX idx_files_txt"),
+    ("repository.stale_periods (calculator.calculate_changed)",
+     repository.STALE_PERIODS_SQL.format(code_filter=" AND r.stock_code = ?"), (1, '600519')),
+    ("base_fetcher.save_many 锁定检查", STORED_STATE_SQL, ('600519',)),
+    ("report_items.load_items (报告期条数)", LOAD_PERIODS_SQL.format(period_filter=''), ('01810',)),
+    ("report_items.load_items (科目行)", LOAD_ITEMS_SQL.format(period_filter=''), ('01810',)),
+    ("llm_cache.get", GET_SQL, ('0' * 64, '1', 'gemini-2.5-flash')),
+]
+
+# 计划中出现即视为回归
+BAD_PLAN_PREFIXES = ("SCAN", "USE TEMP B-TREE")
+
+
+def check_plans(conn):
+    """返回 [(名称, 计划明细列表, 是否通过)]"""
+    results = []
+    for name, sql, params, *expected in HOT_QUERIES:
+        details = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+        ok = not any(d.startswith(BAD_PLAN_PREFIXES) and d not in expected for d in details)
+        if expected:
+            ok = ok and any(expected[0] in d for d in details)
+        results.append((name, details, ok))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="热点查询执行计划检查")
+    parser.add_argument("--db", help="要检查的数据库 (只读打开)，默认在临时库上检查最新 schema")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if args.db:
+            conn = sqlite3.connect(f"file:{Path(args.db).resolve()}?mode=ro", uri=True)
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version < SCHEMA_VERSION:
+                print(f"⚠️ 数据库版本 v{version} 低于 v{SCHEMA_VERSION}，请先运行 python database.py 升级")
+                conn.close()
+                sys.exit(1)
+        else:
+            db_path = Path(tmp_dir) / "plans.db"
+            with contextlib.redirect_stdout(io.StringIO()):
+                init_db(db_path)
+            conn = sqlite3.connect(db_path)
+
+        results = check_plans(conn)
+        conn.close()
+
+    failed = 0
+    for name, details, ok in results:
+        print(f"{'✅' if ok else '❌'} {name}")
+        for detail in details:
+            print(f"     {detail}")
+        failed += not ok
+
+    if failed:
+        print(f"\n❌ {failed}/{len(results)} 个热点查询退化为全表扫描、临时排序或未用上覆盖索引")
+        sys.exit(1)
+    print(f"\n✅ {len(results)} 个热点查询全部走索引")
+
+
+if __name__ == "__main__":
+    main()
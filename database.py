@@ -1,16 +1,17 @@
 import sqlite3
+from functools import lru_cache
 from pathlib import Path
 import pandas as pd
 from datetime import datetime
+from db import get_conn
+from report_items import create_tables as create_report_item_tables, migrate_raw_json
+from llm_cache import create_tables as create_llm_cache_tables
 
 # 数据库文件路径
 DB_PATH = Path(__file__).parent / "finance.db"
 
-def init_db():
-    """初始化数据库：创建表结构"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
+def _create_base_tables(cursor):
+    """v1: 基础表结构 (之后新增的列见 ADDED_COLUMNS，新库与旧库都经由对应版本的迁移加上)"""
     # --- 1. 原始财务数据表 (financial_reports_raw) ---
     # 包含 A/港/美 三地市场的核心字段
     cursor.execute('''
@@ -21,7 +22,10 @@ def init_db():
         report_type TEXT NOT NULL,      -- 报告类型 (Q1/S1/Q3/A)
         publish_date TEXT,              -- 财报发布日期
         currency TEXT,                  -- 货币单位 (CNY/USD/HKD)
+        market TEXT DEFAULT 'CN',       -- 市场 (CN/HK/US)
         data_quality TEXT DEFAULT 'UNVERIFIED',  -- 数据质量标记 (VERIFIED/UNVERIFIED/CONFLICT)
+        validation_details TEXT,        -- 验证详情 (JSON)
+        is_locked INTEGER DEFAULT 0,    -- 手动修正后锁定
         
         -- A. 利润表
         revenue REAL,                   -- 营业收入
@@ -37,15 +41,26 @@ def init_db():
         net_income REAL,                -- 净利润
         net_income_parent REAL,         -- 归母净利润
         net_income_deducted REAL,       -- 扣非净利润 (A股)
+        income_tax_expenses REAL,       -- 所得税费用
+        eps_basic REAL,                 -- 基本每股收益
         
         -- B. 资产负债表
         total_assets REAL,              -- 总资产
         total_liabilities REAL,         -- 总负债
         total_equity REAL,              -- 股东权益
+        current_assets REAL,            -- 流动资产合计
+        non_current_assets REAL,        -- 非流动资产合计
+        current_liabilities REAL,       -- 流动负债合计
+        non_current_liabilities REAL,   -- 非流动负债合计
+        share_capital REAL,             -- 股本
+        retained_earnings REAL,         -- 未分配利润
+        bps REAL,                       -- 每股净资产
+        debt_to_asset REAL,             -- 资产负债率
         cash_equivalents REAL,          -- 货币资金
         accounts_receivable REAL,       -- 应收账款
         inventory REAL,                 -- 存货
         fixed_assets REAL,              -- 固定资产
+        intangible_assets REAL,         -- 无形资产
         goodwill REAL,                  -- 商誉
         short_term_debt REAL,           -- 短期借款
         long_term_debt REAL,            -- 长期借款
@@ -56,9 +71,12 @@ def init_db():
         cfo_net REAL,                   -- 经营活动现金流净额
         cfi_net REAL,                   -- 投资活动现金流净额
         cff_net REAL,                   -- 筹资活动现金流净额
+        net_cash_flow REAL,             -- 现金及现金等价物净增加额
         capex REAL,                     -- 资本开支
         cash_paid_for_dividends REAL,   -- 分红支付的现金
         
+        raw_data TEXT,                  -- 旧版全量数据 (JSON)，已迁移到 financial_report_items
+        
         -- 唯一索引：同一只股票同一个报告期只能有一条记录
         UNIQUE(stock_code, report_period)
     )
@@ -103,7 +121,7 @@ def init_db():
     )
     ''')
     
-    # --- 4. 财报文件记录表 (financial_reports_files) ---
+    # --- 3. 财报文件记录表 (financial_reports_files) ---
     # 记录所有下载的 PDF/HTML 原始文件
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS financial_reports_files (
@@ -122,7 +140,7 @@ def init_db():
     )
     ''')
     
-    # --- 5. 指标字典表 (metric_definitions) ---
+    # --- 4. 指标字典表 (metric_definitions) ---
     # 存储指标的中文解释
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS metric_definitions (
@@ -132,6 +150,181 @@ def init_db():
         good_standard TEXT
     )
     ''')
+
+
+# v1 之后新增的列：{版本号: {表名: [列定义, ...]}}
+# 新增列只能追加到新版本，不要改 v1 建表语句 (否则新库与旧库会经由不同版本得到这些列)
+ADDED_COLUMNS = {
+    2: {
+        # 增量计算与增量抓取 (取代 migrate_db_v4 ~ v6)
+        'financial_reports_raw': [
+            'updated_at TEXT',              # 最后修改时间 (抓取/回填/手动修正时更新)
+            'row_hash TEXT',                # 抓取内容哈希 (增量抓取时用于跳过未变化的报告期)
+        ],
+        'financial_indicators_derived': [
+            'source_updated_at TEXT',       # 计算时所依据的原始行 updated_at
+            'net_profit_ttm REAL',          # 滚动归母净利润 (TTM)
+        ],
+    },
+    5: {
+        'financial_reports_files': [
+            'sha256 TEXT',                  # 文件内容哈希 (下载完成校验后写入)
+            'etag TEXT',                    # 服务器 ETag (断点续传 If-Range 用)
+        ],
+    },
+    7: {
+        'financial_indicators_derived': [
+            'formula_version INTEGER',      # 计算时的指标公式版本 (calculator.FORMULA_VERSION)
+        ],
+    },
+}
+
+
+@lru_cache(maxsize=1)
+def _reference_schema():
+    """v1 基础表结构 {表名: [(列名, 类型, 默认值), ...]}，由 v1 建表语句在内存库中生成"""
+    reference = sqlite3.connect(":memory:")
+    _create_base_tables(reference.cursor())
+    tables = reference.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'").fetchall()
+    schema = {
+        table: [(name, col_type, default) for _, name, col_type, _, default, _ in reference.execute(f"PRAGMA table_info({table})")]
+        for (table,) in tables
+    }
+    reference.close()
+    return schema
+
+
+def schema_columns(table):
+    """某张基础表的全部列名 (v1 建表语句 + 各版本新增的列，用作动态列名的白名单)"""
+    names = {name for name, _, _ in _reference_schema()[table]}
+    for tables in ADDED_COLUMNS.values():
+        names.update(column.split()[0] for column in tables.get(table, []))
+    return frozenset(names)
+
+
+def _add_columns(cursor, version):
+    """添加 ADDED_COLUMNS 中某个版本的列 (已有的跳过，兼容旧版迁移脚本已加过的库)"""
+    for table, columns in ADDED_COLUMNS[version].items():
+        existing = {row[1] for row in cursor.execute(f"PRAGMA table_info({table})")}
+        for column in columns:
+            if column.split()[0] in existing:
+                continue
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column}")
+            print(f"  ✅ {table} 添加 {column.split()[0]} 字段")
+
+
+def _add_missing_columns(cursor):
+    """
+    v2: 补齐旧库缺少的列 (取代 migrate_db_v2 ~ v6 的 ALTER 脚本)
+    先按 v1 建表语句逐表比对后 ADD COLUMN，再加上 v2 新增的列
+    """
+    for table, columns in _reference_schema().items():
+        existing = {row[1] for row in cursor.execute(f"PRAGMA table_info({table})")}
+        for name, col_type, default in columns:
+            if name in existing:
+                continue
+            ddl = f"ALTER TABLE {table} ADD COLUMN {name} {col_type}"
+            if default is not None:
+                ddl += f" DEFAULT {default}"
+            cursor.execute(ddl)
+            print(f"  ✅ {table} 添加 {name} 字段")
+    _add_columns(cursor, 2)
+
+
+def _add_file_hash_columns(cursor):
+    """v5: 文件哈希与 ETag 列 (断点续传与完整性校验)"""
+    _add_columns(cursor, 5)
+
+
+def _create_report_items(cursor):
+    """v3: 全量科目长表，旧版 raw_data JSON 拆分入表 (取代 migrate_db_v7)"""
+    # 接口返回的全部科目，按 (股票, 报告期, 科目) 一行存储，科目名在字典表中只存一份
+    create_report_item_tables(cursor)
+    migrated, failed = migrate_raw_json(cursor)
+    if migrated:
+        print(f"  ✅ 已迁移 {migrated} 行全量数据")
+    if failed:
+        print(f"  ⚠️ {failed} 行 JSON 无法解析，已清空")
+
+
+# 热点查询的覆盖索引 (check_query_plans.py 负责回归检查)
+HOT_INDEXES_SQL = [
+    # batch_validate: 按股票列出各报告期的验证状态 (只读索引，不回表)
+    "CREATE INDEX IF NOT EXISTS idx_raw_quality ON financial_reports_raw (stock_code, report_period, report_type, data_quality)",
+    # validator._get_txt_path: 按 (股票, 报告期) 取 TXT 路径
+    "CREATE INDEX IF NOT EXISTS idx_files_txt ON financial_reports_files (stock_code, report_period, txt_path)",
+]
+
+
+def _create_hot_indexes(cursor):
+    """v4: 热点读路径的覆盖索引"""
+    for sql in HOT_INDEXES_SQL:
+        cursor.execute(sql)
+
+
+def _create_llm_cache(cursor):
+    """v6: LLM 提取结果缓存表 (见 llm_cache.py)"""
+    create_llm_cache_tables(cursor)
+
+
+def _add_formula_version_column(cursor):
+    """v7: 指标公式版本列；已有指标行为 NULL，下次增量计算时全部重算一次"""
+    _add_columns(cursor, 7)
+
+
+# 版本化迁移：(版本号, 说明, 迁移函数)，只能在末尾追加，已发布的版本不要修改
+MIGRATIONS = [
+    (1, "基础表结构", _create_base_tables),
+    (2, "补齐旧库缺少的列", _add_missing_columns),
+    (3, "全量科目长表", _create_report_items),
+    (4, "热点查询覆盖索引", _create_hot_indexes),
+    (5, "文件哈希与 ETag 列", _add_file_hash_columns),
+    (6, "LLM 提取结果缓存", _create_llm_cache),
+    (7, "指标公式版本列", _add_formula_version_column),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def migrate(conn):
+    """
+    把数据库升级到最新版本 (版本号记录在 PRAGMA user_version)
+    每个版本一个事务：失败时整版回滚，下次从该版本重试
+    """
+    current = conn.execute("PRAGMA user_version").fetchone()[0]
+    if current > SCHEMA_VERSION:
+        raise RuntimeError(f"数据库版本 v{current} 高于程序支持的 v{SCHEMA_VERSION}，请更新代码")
+
+    for version, description, step in MIGRATIONS:
+        if version <= current:
+            continue
+        # IMMEDIATE: 先拿写锁再确认版本，避免多个进程重复迁移
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("PRAGMA user_version").fetchone()[0] >= version:
+                conn.rollback()
+                continue
+            print(f"🔧 数据库迁移 v{version}: {description}")
+            step(conn.cursor())
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    # 大批数据迁移后空闲页过多时回收空间
+    if current < SCHEMA_VERSION:
+        page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+        freelist = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if freelist > page_count // 4:
+            print("  🧹 正在压缩数据库 (VACUUM)...")
+            conn.execute("VACUUM")
+    return SCHEMA_VERSION
+
+
+def init_db(db_path=DB_PATH):
+    """初始化数据库：创建表结构并执行未应用的迁移 (可重复运行)"""
+    conn = get_conn(db_path)
+    migrate(conn)
     
     # 预填充一些字典数据
     definitions = [
@@ -140,11 +333,9 @@ def init_db():
         ('debt_to_asset', '资产负债率', '衡量公司的杠杆风险。', '一般 <60% 比较安全，金融业除外'),
         ('cfo_net', '经营现金流净额', '公司通过卖货真正收回来的现金。', '长期应大于净利润')
     ]
-    cursor.executemany('INSERT OR IGNORE INTO metric_definitions VALUES (?,?,?,?)', definitions)
-    
-    conn.commit()
-    conn.close()
-    print(f"数据库已初始化: {DB_PATH}")
+    with conn:
+        conn.executemany('INSERT OR IGNORE INTO metric_definitions VALUES (?,?,?,?)', definitions)
+    print(f"数据库已初始化: {db_path} (schema v{SCHEMA_VERSION})")
 
 if __name__ == "__main__":
     init_db()
@@ -0,0 +1,106 @@
+"""
+共享的 SQLite 访问层
+- get_conn: 按 (线程, 数据库) 复用连接，统一设置 WAL / synchronous=NORMAL / mmap / cache / busy_timeout
+- get_writer: 每个数据库一个单写入线程，写操作排队串行执行 (submit 返回 Future)
+
+用法:
+    from db import get_conn, get_writer
+    conn = get_conn()                       # 复用连接，不要 close
+    with conn:                              # 单事务
+        conn.execute(...)
+    get_writer().submit(func, *args)        # 在写线程中执行 func(*args)
+"""
+import os
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future
+from pathlib import Path
+
+DB_PATH = Path(__file__).parent / "finance.db"
+
+# 连接参数
+BUSY_TIMEOUT = 30               # 秒：其他进程持有写锁时等待，而不是立刻报 "database is locked"
+CACHED_STATEMENTS = 512         # 每个连接缓存的预编译语句数 (默认 128)
+PRAGMAS = {
+    'journal_mode': 'WAL',      # 读写互不阻塞，多进程并发读 + 单写
+    'synchronous': 'NORMAL',    # WAL 下 NORMAL 足够安全，提交不再每次 fsync
+    'mmap_size': 256 * 1024 ** 2,
+    'cache_size': -64 * 1024,   # 负数单位为 KB，即 64MB 页缓存
+    'temp_store': 'MEMORY',
+    'busy_timeout': BUSY_TIMEOUT * 1000,
+}
+
+_local = threading.local()
+
+
+def _connect(db_path):
+    conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT, cached_statements=CACHED_STATEMENTS)
+    for name, value in PRAGMAS.items():
+        conn.execute(f"PRAGMA {name}={value}")
+    return conn
+
+
+def get_conn(db_path=DB_PATH):
+    """
+    返回当前线程复用的连接 (同一线程同一数据库只打开一次)
+    调用方不要 close；fork 出的子进程会自动重新连接
+    """
+    pool = getattr(_local, 'pool', None)
+    if pool is None or _local.pid != os.getpid():
+        pool = _local.pool = {}
+        _local.pid = os.getpid()
+    key = str(db_path)
+    conn = pool.get(key)
+    if conn is None:
+        conn = pool[key] = _connect(db_path)
+    return conn
+
+
+def close_conn(db_path=DB_PATH):
+    """关闭当前线程在该数据库上的连接 (下次 get_conn 时重新打开)"""
+    pool = getattr(_local, 'pool', None)
+    if pool and _local.pid == os.getpid():
+        conn = pool.pop(str(db_path), None)
+        if conn is not None:
+            conn.close()
+
+
+class DBWriter:
+    """单写入线程：同一进程内的写操作排队串行执行，避免写锁竞争"""
+
+    def __init__(self, db_path=DB_PATH):
+        self.db_path = db_path
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=f"db-writer:{Path(db_path).name}", daemon=True)
+        self._thread.start()
+
+    def submit(self, func, *args, **kwargs):
+        """在写线程中执行 func(*args, **kwargs)，返回 Future"""
+        future = Future()
+        self._queue.put((future, func, args, kwargs))
+        return future
+
+    def _run(self):
+        while True:
+            future, func, args, kwargs = self._queue.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(func(*args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def get_writer(db_path=DB_PATH):
+    """获取该数据库在本进程内的单写入线程"""
+    key = (os.getpid(), str(db_path))
+    with _writers_lock:
+        writer = _writers.get(key)
+        if writer is None:
+            writer = _writers[key] = DBWriter(db_path)
+        return writer
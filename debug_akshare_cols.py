@@ -1,6 +1,10 @@
-import akshare as ak
+import akshare
+from ak_cache import CachedAPI
 import pandas as pd
 
+# 走磁盘缓存，重复运行不再访问网络 (AK_CACHE_BYPASS=1 强制刷新)
+ak = CachedAPI(akshare)
+
 stock_code = "600519"
 print(f"正在获取 {stock_code} 的原始数据列名...")
 
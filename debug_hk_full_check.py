@@ -1,7 +1,11 @@
-import akshare as ak
+import akshare
+from ak_cache import CachedAPI
 import pandas as pd
 import time
 
+# 走磁盘缓存，重复运行不再访问网络 (AK_CACHE_BYPASS=1 强制刷新)
+ak = CachedAPI(akshare)
+
 def test_full_report(stock_code, stock_name):
     print(f"\n{'='*20} 测试 {stock_name} ({stock_code}) {'='*20}")
     
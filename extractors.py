@@ -0,0 +1,196 @@
+"""
+财报文本的字段提取引擎
+- 所有字段的全部关键词编译成一个交替模式，单次扫描得到每个字段的候选值
+- 金额单位取自表头 "单位：元/万元/亿元" 或科目后的 "(万元)"，都没有时才按数量级推断
+- 模式以关键词首字符集合开头，sre 按集合快速跳过无关字符，不在每个位置尝试全部分支
+- 全文退路 (scan_file) 不做单次扫描，而是逐关键词 search 到第一次命中即停 (sre 对字面量前缀走快速查找)，
+  只查调用方仍缺的字段；结果与 scan 相同 (被更早开始的其他关键词匹配覆盖的命中跳过)
+- 每个结果带置信度 (0~1) 与扣分项 (见 PENALTIES)，供调用方决定是否交给 LLM 复核
+
+用法:
+    from extractors import FieldExtractor
+    extractor = FieldExtractor({'revenue': (['营业收入', '营业总收入'], 1e8)})
+    extractor.extract(text)           # {'revenue': 123456789.0}
+    extractor.scan(text)['revenue']   # {'value', 'raw', 'keyword', 'priority', 'unit', 'offset', 'flags', 'confidence'}
+    extractor.extract_file(txt_path)  # mmap 整个文件，逐关键词检索
+    extractor.scan_file(txt_path, fields=['revenue'])   # 只查缺失字段
+"""
+import mmap
+import re
+
+# 金额单位 → 换算成元的倍数
+UNITS = {'元': 1, '千元': 1e3, '万元': 1e4, '百万元': 1e6, '亿元': 1e8}
+
+_REGEX_META = set('.^$*+?{}[]\\|()')
+
+# 置信度扣分项 (满分 1.0)
+PENALTIES = {
+    'guessed_unit': 0.4,        # 没有表头/科目单位，按数量级推断
+    'fallback_keyword': 0.1,    # 命中的不是首选关键词
+    'small_value': 0.6,         # 小整数，疑似年份或附注编号
+    'full_text': 0.2,           # 报表章节内没找到，取自全文
+    'inconsistent': 0.5,        # 与其他字段的数值关系矛盾 (由调用方判断)
+}
+
+
+def flag(match, *flags):
+    """给 scan 的单个结果追加扣分项并重算置信度 (原地修改并返回)"""
+    match['flags'] = list(dict.fromkeys(match.get('flags', []) + list(flags)))
+    match['confidence'] = round(max(0.0, 1.0 - sum(PENALTIES[f] for f in match['flags'])), 2)
+    return match
+
+
+def guess_scale(value):
+    """没有单位信息时按数量级推断 (旧版逻辑)：大于 10 亿视为元，大于 10 万视为万元，否则视为亿元"""
+    if value > 1e9:
+        return 1
+    if value > 1e5:
+        return 1e4
+    return 1e8
+
+
+class FieldExtractor:
+    """
+    fields: {字段: (关键词正则列表, 默认单位)}，与 FinancialDataValidator.CRITICAL_FIELDS 格式一致
+    同一字段按关键词列表顺序取优先级，同一关键词取文中第一次出现的值
+    """
+
+    def __init__(self, fields):
+        self.fields = fields
+        self._groups = []           # (分组名, 字段, 优先级, 关键词)
+        for field, (keywords, _) in fields.items():
+            for priority, keyword in enumerate(keywords):
+                self._groups.append((f"k{len(self._groups)}", field, priority, keyword))
+        units = '|'.join(sorted(UNITS, key=len, reverse=True))
+        header = rf'单位\s*[：:]\s*(?:人民币)?\s*(?P<header_unit>{units})'
+        tail = rf'\s*(?:[（(](?P<inline_unit>{units})[）)])?\s*(?P<value>-?\d[\d,]*(?:\.\d+)?)'
+
+        # 用空分组标记命中的是哪个关键词
+        firsts = {'单'} | {keyword[0] for _, _, _, keyword in self._groups}
+        if firsts & _REGEX_META:
+            branches = [f"(?P<{name}>){keyword}" for name, _, _, keyword in self._groups]
+            pattern = f"{header}|(?:{'|'.join(branches)}){tail}"
+        else:
+            # 模式以首字符集合开头时 sre 会用集合快速跳过无关字符；各分支再用后顾确认首字符
+            branches = [f"(?<={keyword[0]})(?P<{name}>){keyword[1:]}" for name, _, _, keyword in self._groups]
+            pattern = f"[{''.join(sorted(firsts))}](?:(?<=单){header[1:]}|(?:{'|'.join(branches)}){tail})"
+        self.pattern = re.compile(pattern)
+        # 全文逐关键词检索用：字段 → [(分组名, 优先级, 关键词, 单关键词模式)]
+        self._header = re.compile(header)
+        self._searches = {}
+        for name, field, priority, keyword in self._groups:
+            self._searches.setdefault(field, []).append((name, priority, keyword, re.compile(keyword + tail)))
+
+    def scan(self, data):
+        """
+        单次扫描，返回 {字段: {'value': 元, 'raw': 原文数值, 'keyword': 关键词, 'priority': 关键词序号,
+                               'unit': 单位或 None, 'offset': 字符位置, 'flags': 扣分项, 'confidence': 置信度}}
+        data 可以是 str 或 UTF-8 的 bytes / mmap
+        """
+        if not isinstance(data, str):
+            data = str(data, 'utf-8', 'ignore')
+        found = {}
+        best = {}                   # 字段 → 已取到的最高优先级 (0 最高)
+        header_unit = None          # 最近一个表头声明的单位
+        for m in self.pattern.finditer(data):
+            if m.group('header_unit') is not None:
+                header_unit = m.group('header_unit')
+                continue
+            name, field, priority, keyword = next(g for g in self._groups if m.start(g[0]) >= 0)
+            if best.get(field, len(self.fields[field][0])) <= priority:
+                continue
+            match = self._match(m, keyword, priority, header_unit)
+            if match is None:
+                continue
+            found[field] = match
+            best[field] = priority
+            if len(best) == len(self.fields) and not any(best.values()):
+                break
+        return found
+
+    @staticmethod
+    def _match(m, keyword, priority, header_unit):
+        """关键词 + 金额的匹配 → scan 的单个结果；金额无法解析时返回 None"""
+        try:
+            value = float(m.group('value').replace(',', ''))
+        except ValueError:
+            return None
+        unit = m.group('inline_unit') or header_unit
+        return flag({
+            'value': value * (UNITS[unit] if unit else guess_scale(value)),
+            'raw': value,
+            'keyword': keyword,
+            'priority': priority,
+            'unit': unit,
+            'offset': m.start(),
+        }, *(['guessed_unit'] if unit is None else []),
+           *(['fallback_keyword'] if priority else []),
+           *(['small_value'] if value.is_integer() and abs(value) < 1e4 else []))
+
+    def search(self, data, fields=None):
+        """
+        逐字段、按优先级逐关键词 search，取第一个有效命中，结果与 scan 相同；fields 限定只查哪些字段
+        大文件中单模式要在每个首字符处尝试分支，逐关键词的字面量查找更快，且命中后即停
+        """
+        if not isinstance(data, str):
+            data = str(data, 'utf-8', 'ignore')
+        found = {}
+        for field in (self.fields if fields is None else fields):
+            for name, priority, keyword, regex in self._searches.get(field, []):
+                pos = 0
+                while True:
+                    m = regex.search(data, pos)
+                    if m is None:
+                        break
+                    pos = m.start() + 1
+                    if self._shadowed(data, m.start(), name):
+                        continue
+                    match = self._match(m, keyword, priority, self._header_before(data, m.start()))
+                    if match is not None:
+                        found[field] = match
+                        break
+                if field in found:
+                    break
+        return found
+
+    def _shadowed(self, data, start, name):
+        """
+        单次扫描时该位置是否会被其他匹配占去 (如 "股东权益合计" 落在 "归属于母公司股东权益合计" 里)
+        关键词不跨行 (金额前的空白可以)，所以从行首重扫到命中处即可 (不截断 endpos，否则更长的分支会误判为不匹配)
+        """
+        line_start = data.rfind('\n', 0, start) + 1
+        for m in self.pattern.finditer(data, line_start):
+            if m.start() > start:
+                return False
+            if m.start() == start:
+                return m.start(name) < 0
+            if m.end() > start:
+                return True
+        return False
+
+    def _header_before(self, data, pos):
+        """pos 之前最近一个表头声明的单位"""
+        while True:
+            pos = data.rfind('单位', 0, pos)
+            if pos < 0:
+                return None
+            m = self._header.match(data, pos)
+            if m:
+                return m.group('header_unit')
+
+    def extract(self, data):
+        """{字段: 数值 (元)}"""
+        return {field: match['value'] for field, match in self.scan(data).items()}
+
+    def scan_file(self, path, fields=None):
+        """mmap 整个文件后逐关键词检索 (见 search)，fields 限定字段；空文件返回 {}"""
+        with open(path, 'rb') as f:
+            try:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    return self.search(data, fields)
+            except ValueError:
+                return {}
+
+    def extract_file(self, path):
+        """mmap 整个文件后提取"""
+        return {field: match['value'] for field, match in self.scan_file(path).items()}
@@ -1,15 +1,48 @@
-import sqlite3
+import hashlib
+import json
 import pandas as pd
+import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
 from pathlib import Path
 from abc import ABC, abstractmethod
 
+from db import get_conn, get_writer
+from report_items import save_items
+from throttle import get_bucket, retry_call
+
+# 写入前一次读出该股票已有报告期的锁定状态与内容哈希 (check_query_plans.py 检查执行计划)
+STORED_STATE_SQL = "SELECT report_period, is_locked, row_hash FROM financial_reports_raw WHERE stock_code = ?"
+
+def _is_transient(exc):
+    """网络错误、超时与 429 / 5xx 可重试；股票代码错误、接口返回结构变化等直接失败"""
+    if isinstance(exc, requests.HTTPError):
+        status = exc.response.status_code if exc.response is not None else None
+        return status is None or status == 429 or 500 <= status < 600
+    return isinstance(exc, (requests.ConnectionError, requests.Timeout,
+                            requests.exceptions.ChunkedEncodingError, ConnectionError, TimeoutError))
+
+
 class BaseFetcher(ABC):
-    def __init__(self, db_path=None):
+    # 子类覆盖：数据源主机 (用于按主机限流)、市场与币种
+    HOST = None
+    MARKET = 'CN'
+    CURRENCY = 'CNY'
+
+    def __init__(self, db_path=None, api=None, incremental=True):
         if db_path:
             self.db_path = db_path
         else:
             # 默认数据库路径
             self.db_path = Path(__file__).parent.parent / "finance.db"
+        # 数据接口 (默认 akshare 模块，可替换为本地桩对象)
+        self.api = api
+        # 限流器：单只抓取时不限流，fetch_many 时按主机共享
+        self.limiter = None
+        self.retries = 3
+        self.retry_backoff = 1.0
+        # 增量模式：内容未变化的报告期不再重写 (保留其验证状态，也不会触发指标重算)
+        self.incremental = incremental
 
     @abstractmethod
     def fetch_financial_data(self, stock_code: str):
@@ -18,48 +51,161 @@ class BaseFetcher(ABC):
         """
         pass
 
-    def save_to_db(self, stock_code: str, report_period: str, report_type: str, data: dict, market: str = 'CN', currency: str = 'CNY', raw_data: str = None):
+    @abstractmethod
+    def _download(self, stock_code: str):
+        """
+        只负责网络请求，返回原始报表 (tuple)，供 fetch_many 在线程池中调用。
+        """
+        pass
+
+    @abstractmethod
+    def _build_records(self, stock_code: str, *frames):
+        """
+        把 _download 的结果清洗为 save_many 所需的 records，失败返回 None。
+        """
+        pass
+
+    def _call_api(self, func_name: str, **kwargs):
+        """调用数据接口：先取限流令牌，网络类错误指数退避重试 (其余错误直接抛出)"""
+        def call():
+            if self.limiter is not None:
+                self.limiter.acquire()
+            return getattr(self.api, func_name)(**kwargs)
+        return retry_call(call, retries=self.retries, backoff=self.retry_backoff, should_retry=_is_transient)
+
+    def fetch_many(self, stock_codes, max_concurrency: int = 4, rate_limit: float = 2.0):
         """
-        通用的数据保存方法。
+        并发抓取多只股票：
+        - 线程池并发下载 (最多 max_concurrency 只股票同时进行)
+        - 同一主机共享令牌桶，平均每秒不超过 rate_limit 次请求
+        - 网络类失败指数退避重试 (股票代码错误等直接记为失败)
+        - 单一写库线程串行调用 save_many，避免 SQLite 写锁冲突
+        返回 {stock_code: 是否成功}
         """
-        conn = sqlite3.connect(self.db_path)
+        stock_codes = list(stock_codes)
+        print(f"🚀 并发抓取 {len(stock_codes)} 只股票 (并发 {max_concurrency}, 限速 {rate_limit} 次/秒)...")
+        self.limiter = get_bucket(self.HOST, rate_limit)
+
+        results = {}
+        saves = {}
+        writer = get_writer(self.db_path)
+
+        def work(code):
+            frames = self._download(code)
+            return self._build_records(code, *frames)
+
+        try:
+            with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+                futures = {pool.submit(work, code): code for code in stock_codes}
+                for future in as_completed(futures):
+                    code = futures[future]
+                    try:
+                        records = future.result()
+                    except Exception as e:
+                        print(f"  ❌ {code} 抓取失败: {e}")
+                        records = None
+                    if records is None:
+                        results[code] = False
+                    else:
+                        # 交给共享的单写入线程，下载线程不等待写库
+                        saves[code] = writer.submit(self.save_many, code, records, market=self.MARKET,
+                                                    currency=self.CURRENCY, raise_errors=True)
+            for code, future in saves.items():
+                try:
+                    future.result()
+                    results[code] = True
+                except Exception as e:
+                    print(f"  ❌ {code} 保存失败: {e}")
+                    results[code] = False
+        finally:
+            self.limiter = None
+
+        ok = sum(1 for v in results.values() if v)
+        print(f"✅ 并发抓取完成：成功 {ok}/{len(stock_codes)}")
+        return results
+
+    def save_to_db(self, stock_code: str, report_period: str, report_type: str, data: dict, market: str = 'CN', currency: str = 'CNY', raw_data: dict = None):
+        """
+        通用的数据保存方法（单个报告期）。
+        """
+        return self.save_many(stock_code, [(report_period, report_type, data, raw_data)], market=market, currency=currency)
+
+    def save_many(self, stock_code: str, records: list, market: str = 'CN', currency: str = 'CNY', raise_errors: bool = False):
+        """
+        批量保存多个报告期的数据：复用线程连接、一次锁定检查、一个事务。
+        records: [(report_period, report_type, data, raw_data), ...]
+        raw_data 为接口全量科目 {科目名: 数值}，可省略，写入 financial_report_items 长表
+        返回实际写入的行数；写库失败时返回 0，raise_errors=True 时抛出 (fetch_many 据此统计失败)。
+        """
+        if not records:
+            return 0
+
+        conn = get_conn(self.db_path)
         cursor = conn.cursor()
 
-        # 1. 检查是否被锁定
-        cursor.execute(
-            "SELECT is_locked FROM financial_reports_raw WHERE stock_code=? AND report_period=?",
-            (stock_code, report_period)
-        )
-        row = cursor.fetchone()
-        if row and row[0] == 1:
-            print(f"  🔒 {report_period} 数据已锁定，跳过更新")
-            conn.close()
-            return
-
-        # 2. 准备数据
-        # 确保 data 里的 None 值被正确处理
-        for k, v in data.items():
-            if pd.isna(v):
-                data[k] = None
-                
-        # 准备插入字段
-        fields = ['stock_code', 'report_period', 'report_type', 'market', 'currency'] + list(data.keys())
-        values = [stock_code, report_period, report_type, market, currency] + list(data.values())
-        
-        if raw_data:
-            fields.append('raw_data')
-            values.append(raw_data)
-            
-        placeholders = ', '.join(['?'] * len(fields))
-        columns = ', '.join(fields)
-        
-        sql = f"INSERT OR REPLACE INTO financial_reports_raw ({columns}) VALUES ({placeholders})"
-        
+        # 1. 一次查询出该股票已有报告期的锁定状态和内容哈希
+        cursor.execute(STORED_STATE_SQL, (stock_code,))
+        stored = {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+
+        # 2. 准备数据，按字段组合分组（同一组共用一条 SQL）
+        # updated_at 用于增量计算指标：只有被重写的报告期才需要重算
+        updated_at = datetime.now().isoformat()
+        batches = {}
+        items_by_period = {}
+        skipped = 0
+        unchanged = 0
+        for record in records:
+            report_period, report_type, data = record[:3]
+            raw_data = record[3] if len(record) > 3 else None
+
+            is_locked, old_hash = stored.get(report_period, (0, None))
+            if is_locked == 1:
+                print(f"  🔒 {report_period} 数据已锁定，跳过更新")
+                skipped += 1
+                continue
+
+            data = {k: (None if pd.isna(v) else v) for k, v in data.items()}
+            row_hash = self._row_hash(report_type, market, currency, data, raw_data)
+            if self.incremental and row_hash == old_hash:
+                unchanged += 1
+                continue
+
+            fields = ['stock_code', 'report_period', 'report_type', 'market', 'currency', 'updated_at', 'row_hash'] + list(data.keys())
+            values = [stock_code, report_period, report_type, market, currency, updated_at, row_hash] + list(data.values())
+
+            batches.setdefault(tuple(fields), []).append(values)
+            if raw_data:
+                items_by_period[report_period] = raw_data
+
+        # 3. 单事务批量写入
+        saved = 0
         try:
-            cursor.execute(sql, values)
-            conn.commit()
-            print(f"  ✅ 保存成功 {report_period}")
+            with conn:
+                for fields, rows in batches.items():
+                    placeholders = ', '.join(['?'] * len(fields))
+                    columns = ', '.join(fields)
+                    sql = f"INSERT OR REPLACE INTO financial_reports_raw ({columns}) VALUES ({placeholders})"
+                    cursor.executemany(sql, rows)
+                    saved += len(rows)
+                save_items(cursor, stock_code, items_by_period)
+            notes = []
+            if unchanged:
+                notes.append(f"{unchanged} 个未变化")
+            if skipped:
+                notes.append(f"{skipped} 个已锁定")
+            print(f"  ✅ 保存成功 {saved} 个报告期" + (f"（{'，'.join(notes)}）" if notes else ""))
         except Exception as e:
-            print(f"  ❌ 保存失败 {report_period}: {e}")
-        finally:
-            conn.close()
+            if raise_errors:
+                raise
+            saved = 0
+            print(f"  ❌ 保存失败 {stock_code}: {e}")
+        return saved
+
+    @staticmethod
+    def _row_hash(report_type, market, currency, data, raw_data=None):
+        """规范化后的行内容哈希，用于判断报告期是否有变化 (含更正/重述)"""
+        payload = json.dumps(
+            [report_type, market, currency, sorted(data.items()), raw_data],
+            ensure_ascii=False, default=str
+        )
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
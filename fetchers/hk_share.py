@@ -1,38 +1,45 @@
 import akshare as ak
+import numpy as np
 import pandas as pd
-from datetime import datetime
+from ak_cache import CachedAPI
+from field_mapping import fields_to_dicts, get_plan, to_numbers
 from .base_fetcher import BaseFetcher
 
+# 透视只需要的长表列
+LONG_COLUMNS = ['REPORT_DATE', 'STD_ITEM_NAME', 'AMOUNT']
+# 下载后保留的列 (FISCAL_YEAR 用于判断财年结束月份)
+KEEP_COLUMNS = LONG_COLUMNS + ['FISCAL_YEAR']
+
+# 报告期距财年结束的月数 -> 报告类型
+REPORT_TYPE_BY_OFFSET = {0: 'A', 3: 'Q1', 6: 'S1', 9: 'Q3'}
+
 class HKShareFetcher(BaseFetcher):
+    HOST = 'eastmoney'
+    MARKET = 'HK'
+    CURRENCY = 'HKD'
+
+    def __init__(self, db_path=None, api=None, refresh=False):
+        # 默认走磁盘缓存；refresh=True 时强制请求网络并刷新缓存
+        super().__init__(db_path, api=api or CachedAPI(ak, bypass=refresh))
+
     def fetch_financial_data(self, stock_code: str):
         """
         抓取港股财务数据 (使用 AkShare stock_financial_hk_report_em 接口)
-        获取完整的三大报表数据
+        获取完整的三大报表数据 (年报、中报、季报)
         """
         print(f"🚀 [港股] 开始抓取 {stock_code} 的完整财务数据...")
         
         try:
             # 1. 分别获取三张表
-            df_income = self._fetch_report(stock_code, "利润表")
-            df_balance = self._fetch_report(stock_code, "资产负债表")
-            df_cash = self._fetch_report(stock_code, "现金流量表")
+            df_income, df_balance, df_cash = self._download(stock_code)
             
             if df_income.empty and df_balance.empty:
                 print(f"❌ 未获取到 {stock_code} 的任何报表数据")
                 return False
 
-            # 2. 数据透视 (Long -> Wide)
-            # 索引是 REPORT_DATE, 列是 STD_ITEM_NAME, 值是 AMOUNT
-            pivot_income = self._pivot_data(df_income)
-            pivot_balance = self._pivot_data(df_balance)
-            pivot_cash = self._pivot_data(df_cash)
-            
-            # 3. 合并数据 (按日期)
-            # 使用 outer join 保证数据不丢失
-            df_merged = pivot_income.join(pivot_balance, how='outer', rsuffix='_bal').join(pivot_cash, how='outer', rsuffix='_cash')
-            
-            # 4. 处理每一行并保存
-            self._process_and_save(stock_code, df_merged)
+            # 2. 透视、合并、处理每一行并保存
+            fiscal_month = self._fiscal_year_end(df_income, df_balance, df_cash)
+            self._process_and_save(stock_code, self._merge_reports(df_income, df_balance, df_cash), fiscal_month)
             
             print(f"✅ {stock_code} 数据抓取完成！")
             return True
@@ -43,104 +50,90 @@ class HKShareFetcher(BaseFetcher):
             traceback.print_exc()
             return False
 
+    def _download(self, stock_code):
+        """下载三大报表 (只做网络请求)"""
+        df_income = self._fetch_report(stock_code, "利润表")
+        df_balance = self._fetch_report(stock_code, "资产负债表")
+        df_cash = self._fetch_report(stock_code, "现金流量表")
+        return df_income, df_balance, df_cash
+
+    def _merge_reports(self, df_income, df_balance, df_cash):
+        """三张长表拼接后一次透视 (Long -> Wide)：索引是 REPORT_DATE, 列是 STD_ITEM_NAME, 值是 AMOUNT"""
+        frames = [df[LONG_COLUMNS] for df in (df_income, df_balance, df_cash) if not df.empty]
+        if not frames:
+            return pd.DataFrame()
+        long_df = pd.concat(frames, ignore_index=True)
+        
+        # 确保日期格式统一
+        long_df['REPORT_DATE'] = pd.to_datetime(long_df['REPORT_DATE'])
+        # 科目名转为分类类型，透视时按编码分组，内存只占一份字典
+        long_df['STD_ITEM_NAME'] = long_df['STD_ITEM_NAME'].astype('category')
+        
+        # 同一报告期同一科目重复出现 (如多张表都有的合计项) 时取第一个非空值
+        wide = long_df.pivot_table(
+            index='REPORT_DATE', columns='STD_ITEM_NAME', values='AMOUNT',
+            aggfunc='first', observed=True
+        )
+        wide.columns = wide.columns.astype(str)
+        wide.columns.name = None
+        return wide
+
+    def _fiscal_year_end(self, *dfs):
+        """财年结束月份 (东方财富 FISCAL_YEAR 形如 '12-31')，缺失时按自然年处理"""
+        for df in dfs:
+            if not df.empty and 'FISCAL_YEAR' in df.columns:
+                month = pd.to_numeric(df['FISCAL_YEAR'].astype(str).str[:2], errors='coerce').dropna()
+                if not month.empty:
+                    return int(month.mode().iloc[0])
+        return 12
+
+    def _build_records(self, stock_code, df_income, df_balance, df_cash):
+        """供 fetch_many 使用：透视合并后返回 records，没有数据时返回 None"""
+        if df_income.empty and df_balance.empty:
+            print(f"❌ 未获取到 {stock_code} 的任何报表数据")
+            return None
+        fiscal_month = self._fiscal_year_end(df_income, df_balance, df_cash)
+        return self._merged_to_records(self._merge_reports(df_income, df_balance, df_cash), fiscal_month)
+
     def _fetch_report(self, stock_code, symbol):
-        """抓取单个报表并处理异常"""
+        """
+        抓取单个报表；重试后仍失败时抛出，整只股票记为失败 (下次重新抓取)，而不是缺一张报表入库
+        """
         try:
             # 使用正确的参数名: stock, symbol, indicator
-            df = ak.stock_financial_hk_report_em(stock=stock_code, symbol=symbol, indicator="年度")
-            return df
+            # indicator="报告期" 返回全部定期报告 (年报、中报、季报)，"年度" 只有年报
+            df = self._call_api('stock_financial_hk_report_em', stock=stock_code, symbol=symbol, indicator="报告期")
         except Exception as e:
             print(f"   ⚠️ 获取 {symbol} 失败: {e}")
-            return pd.DataFrame()
+            raise
+        # 立即裁掉 SECUCODE / ORG_CODE 等重复字符串列，批量抓取时每只股票只占很少内存
+        return df[[c for c in df.columns if c in KEEP_COLUMNS]]
 
-    def _pivot_data(self, df):
-        """将长格式数据透视为宽格式"""
-        if df.empty: return pd.DataFrame()
-        
-        # 确保日期格式统一
-        df['REPORT_DATE'] = pd.to_datetime(df['REPORT_DATE'])
+    def _process_and_save(self, stock_code, df, fiscal_month=12):
+        """清洗并保存数据"""
+        records = self._merged_to_records(df, fiscal_month)
+
+        # 批量保存（单事务）
+        self.save_many(stock_code, records, market=self.MARKET, currency=self.CURRENCY)
+
+    def _merged_to_records(self, df, fiscal_month=12):
+        """把合并后的宽表转换为 [(report_period, report_type, data, raw_items), ...]"""
+        # 字段映射 (中文科目 -> 数据库字段) 见 field_mapping.HK_FIELDS，按列集合编译一次
+        plan = get_plan(self.MARKET, df.columns)
+        fields = plan.apply(to_numbers(df.iloc[:, plan.source_columns].to_numpy(dtype=object)))
         
-        # 去重 (防止同一天有重复项目)
-        df = df.drop_duplicates(subset=['REPORT_DATE', 'STD_ITEM_NAME'])
+        # 特殊处理：如果没有 net_income，用 net_income_parent 代替
+        fields['net_income'] = np.where(np.isnan(fields['net_income']), fields['net_income_parent'], fields['net_income'])
         
-        # 透视
-        pivot_df = df.pivot(index='REPORT_DATE', columns='STD_ITEM_NAME', values='AMOUNT')
-        return pivot_df
+        # 报告类型：按距财年结束的月数判断 (自然年财年即 3->Q1, 6->S1, 9->Q3, 12->A)
+        offsets = (df.index.month - fiscal_month) % 12
+        report_types = [REPORT_TYPE_BY_OFFSET.get(m, 'Other') for m in offsets]
 
-    def _process_and_save(self, stock_code, df):
-        """清洗并保存数据"""
-        # 字段映射字典 (中文科目 -> 数据库字段)
-        # 注意：港股科目名称可能不统一，这里列出常见的
-        field_map = {
-            # --- 利润表 ---
-            'revenue': ['营业额', '营业收入', '营业总收入', '收入'],
-            'gross_profit': ['毛利'],
-            'net_income_parent': ['本公司拥有人应占溢利', '归属于母公司股东的净利润', '归母净利润'],
-            'net_income': ['年度溢利', '净利润'],
-            'eps_basic': ['基本每股盈利', '基本每股收益'],
-            'rd_expenses': ['研究及开发成本', '研发费用'],
-            'admin_expenses': ['行政开支', '管理费用'],
-            'selling_expenses': ['销售及分销成本', '销售费用'],
-            
-            # --- 资产负债表 ---
-            'total_assets': ['资产总值', '资产合计', '总资产'],
-            'total_liabilities': ['负债总额', '负债合计', '总负债'],
-            'total_equity': ['本公司拥有人应占权益', '权益合计', '股东权益合计'],
-            'current_assets': ['流动资产', '流动资产合计'],
-            'current_liabilities': ['流动负债', '流动负债合计'],
-            'non_current_assets': ['非流动资产', '非流动资产合计'],
-            'non_current_liabilities': ['非流动负债', '非流动负债合计'],
-            'cash_equivalents': ['现金及现金等价物', '货币资金'],
-            'inventory': ['存货'],
-            'accounts_receivable': ['应收账款'],
-            
-            # --- 现金流量表 ---
-            'cfo_net': ['经营业务现金净额', '经营活动产生的现金流量净额'],
-            'cfi_net': ['投资业务现金净额', '投资活动产生的现金流量净额'],
-            'cff_net': ['融资业务现金净额', '筹资活动产生的现金流量净额'],
-            'capex': ['购建固定资产', '购买物业、厂房及设备'], # 需要确认符号，通常是负数
-            'cash_paid_for_dividends': ['已付股息', '分配股利、利润或偿付利息支付的现金']
-        }
-
-        for date, row in df.iterrows():
-            report_period_str = date.strftime("%Y-%m-%d")
-            
-            # 简单判断报告类型 (目前接口只返回年度)
-            report_type = 'A' 
-            
-            data = {}
-            
-            # 辅助函数：查找映射值
-            def find_val(target_field):
-                candidates = field_map.get(target_field, [])
-                for cand in candidates:
-                    if cand in row:
-                        val = row[cand]
-                        if pd.notna(val) and val != '':
-                            return float(val)
-                return None
-
-            # 填充数据
-            for db_field in field_map.keys():
-                data[db_field] = find_val(db_field)
-            
-            # 特殊处理：如果没有 net_income，用 net_income_parent 代替
-            if data.get('net_income') is None:
-                data['net_income'] = data.get('net_income_parent')
-
-            # --- 生成全量数据 JSON ---
-            # 将 Series 转换为字典
-            raw_dict = row.to_dict()
-            # 处理 datetime 对象 (转为字符串)，否则 json.dumps 会报错
-            for k, v in raw_dict.items():
-                if isinstance(v, (pd.Timestamp, datetime)):
-                    raw_dict[k] = v.strftime('%Y-%m-%d')
-                # 处理 NaN
-                if pd.isna(v):
-                    raw_dict[k] = None
-            
-            import json
-            raw_json = json.dumps(raw_dict, ensure_ascii=False)
+        # 全量科目 {科目名: 数值} (整表一次转换，空值不保留)，写入 financial_report_items 长表
+        raw_values = df.to_numpy(dtype=object)
+        present = ~pd.isna(raw_values)
+        columns = df.columns.to_numpy()
+        raw_rows = [dict(zip(columns[mask].tolist(), row[mask].tolist())) for row, mask in zip(raw_values, present)]
+        report_periods = df.index.strftime("%Y-%m-%d").tolist()
 
-            # 保存
-            self.save_to_db(stock_code, report_period_str, report_type, data, market='HK', currency='HKD', raw_data=raw_json)
+        return list(zip(report_periods, report_types, fields_to_dicts(fields), raw_rows))
@@ -0,0 +1,276 @@
+"""
+财务科目映射注册表 (Fetcher 与 UI 共用，导入时加载一次)
+- MARKET_FIELDS: 各市场 数据库字段 -> (报表, [候选科目...])，候选科目按顺序回退
+- get_plan: 按源表的列集合编译出列下标计划 (按列集合缓存)，整表一次完成映射
+- FIELD_LABELS / LABEL_TO_FIELD / RAW_TO_FIELD: UI 显示名与反向查找
+
+用法:
+    plan = get_plan('CN', df.columns, statement='income')
+    fields = plan.apply(to_numbers(df.iloc[:, plan.source_columns].to_numpy(dtype=object)))
+"""
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+STATEMENT_NAMES = {
+    'income': '利润表',
+    'balance': '资产负债表',
+    'cash': '现金流量表',
+}
+
+# --- A股 (新浪财经 stock_financial_report_sina) ---
+A_SHARE_FIELDS = {
+    # 利润表
+    'revenue': ('income', ['营业总收入', '营业收入']),
+    'cost_of_revenue': ('income', ['营业成本']),
+    'selling_expenses': ('income', ['销售费用']),
+    'admin_expenses': ('income', ['管理费用']),
+    'rd_expenses': ('income', ['研发费用']),
+    'financial_expenses': ('income', ['财务费用']),
+    'income_tax_expenses': ('income', ['所得税费用']),
+    'investment_income': ('income', ['投资收益']),
+    'operating_income': ('income', ['营业利润']),
+    'total_profit': ('income', ['利润总额']),
+    'net_income': ('income', ['净利润']),
+    'net_income_parent': ('income', ['归属于母公司所有者的净利润']),
+    'net_income_deducted': ('income', ['扣除非经常性损益后的净利润']),
+    'eps_basic': ('income', ['基本每股收益']),
+
+    # 资产负债表
+    'total_assets': ('balance', ['资产总计']),
+    'current_assets': ('balance', ['流动资产合计']),
+    'non_current_assets': ('balance', ['非流动资产合计']),
+    'total_liabilities': ('balance', ['负债合计']),
+    'current_liabilities': ('balance', ['流动负债合计']),
+    'non_current_liabilities': ('balance', ['非流动负债合计']),
+    'total_equity': ('balance', ['所有者权益(或股东权益)合计']),
+    'share_capital': ('balance', ['实收资本(或股本)']),
+    'retained_earnings': ('balance', ['未分配利润']),
+    'cash_equivalents': ('balance', ['货币资金']),
+    'accounts_receivable': ('balance', ['应收账款']),
+    'inventory': ('balance', ['存货']),
+    'fixed_assets': ('balance', ['固定资产净额', '固定资产']),
+    'intangible_assets': ('balance', ['无形资产']),
+    'goodwill': ('balance', ['商誉']),
+    'short_term_debt': ('balance', ['短期借款']),
+    'long_term_debt': ('balance', ['长期借款']),
+    'accounts_payable': ('balance', ['应付账款']),
+    'contract_liabilities': ('balance', ['合同负债', '预收款项']),
+
+    # 现金流量表
+    'cfo_net': ('cash', ['经营活动产生的现金流量净额']),
+    'cfi_net': ('cash', ['投资活动产生的现金流量净额']),
+    'cff_net': ('cash', ['筹资活动产生的现金流量净额']),
+    'net_cash_flow': ('cash', ['现金及现金等价物净增加额']),
+    'capex': ('cash', ['购建固定资产、无形资产和其他长期资产所支付的现金']),
+    'cash_paid_for_dividends': ('cash', ['分配股利、利润或偿付利息所支付的现金']),
+}
+
+# --- 港股 (东方财富 stock_financial_hk_report_em) ---
+# 注意：港股科目名称可能不统一，这里列出常见的
+HK_FIELDS = {
+    # 利润表
+    'revenue': ('income', ['营业额', '营业收入', '营业总收入', '收入']),
+    'gross_profit': ('income', ['毛利']),
+    'net_income_parent': ('income', ['本公司拥有人应占溢利', '归属于母公司股东的净利润', '归母净利润', '股东应占溢利']),
+    'net_income': ('income', ['年度溢利', '净利润', '除税后溢利']),
+    'eps_basic': ('income', ['基本每股盈利', '基本每股收益']),
+    'rd_expenses': ('income', ['研究及开发成本', '研发费用']),
+    'admin_expenses': ('income', ['行政开支', '管理费用']),
+    'selling_expenses': ('income', ['销售及分销成本', '销售费用']),
+
+    # 资产负债表
+    'total_assets': ('balance', ['资产总值', '资产合计', '总资产']),
+    'total_liabilities': ('balance', ['负债总额', '负债合计', '总负债']),
+    'total_equity': ('balance', ['本公司拥有人应占权益', '权益合计', '股东权益合计', '股东权益']),
+    'current_assets': ('balance', ['流动资产', '流动资产合计']),
+    'current_liabilities': ('balance', ['流动负债', '流动负债合计']),
+    'non_current_assets': ('balance', ['非流动资产', '非流动资产合计']),
+    'non_current_liabilities': ('balance', ['非流动负债', '非流动负债合计']),
+    'cash_equivalents': ('balance', ['现金及现金等价物', '货币资金', '银行结余及现金']),
+    'inventory': ('balance', ['存货']),
+    'accounts_receivable': ('balance', ['应收账款']),
+
+    # 现金流量表
+    'cfo_net': ('cash', ['经营业务现金净额', '经营活动产生的现金流量净额']),
+    'cfi_net': ('cash', ['投资业务现金净额', '投资活动产生的现金流量净额']),
+    'cff_net': ('cash', ['融资业务现金净额', '筹资活动产生的现金流量净额']),
+    'capex': ('cash', ['购建固定资产', '购买物业、厂房及设备']),  # 需要确认符号，通常是负数
+    'cash_paid_for_dividends': ('cash', ['已付股息', '分配股利、利润或偿付利息支付的现金']),
+}
+
+MARKET_FIELDS = {
+    'CN': A_SHARE_FIELDS,
+    'HK': HK_FIELDS,
+}
+
+# --- UI 显示名 (数据库字段 -> 中文显示名) ---
+FIELD_LABELS = {
+    # 衍生指标
+    'gross_margin': '毛利率 (Gross Margin) [%]',
+    'net_margin': '净利率 (Net Margin) [%]',
+    'roe': '净资产收益率 (ROE) [%]',
+    'roa': '总资产收益率 (ROA) [%]',
+    'revenue_yoy': '营收增长率 (YoY) [%]',
+    'net_profit_yoy': '净利增长率 (YoY) [%]',
+    'debt_to_asset': '资产负债率 [%]',
+    'current_ratio': '流动比率',
+    'inventory_turnover_days': '存货周转天数 [天]',
+    'receivables_turnover_days': '应收账款周转天数 [天]',
+    'fcf': '自由现金流 (FCF) [亿]',
+    'cfo_to_net_income': '净现比 (CFO/NetIncome)',
+    'dividend_payout_ratio': '分红率 (Payout Ratio) [%]',
+    'dividend_per_share': '每股分红 (DPS) [元]',
+    'dividend_total': '分红总额 [亿]',
+    'eps_basic': '基本每股收益 (EPS) [元]',
+    'eps_ttm': '滚动每股收益 (EPS-TTM) [元]',
+    'net_profit_ttm': '滚动归母净利润 (TTM) [亿]',
+    'bps': '每股净资产 (BPS) [元]',
+
+    # 原始报表 - 利润表
+    'revenue': '营业收入 [亿]',
+    'cost_of_revenue': '营业成本 [亿]',
+    'gross_profit': '毛利 [亿]',
+    'selling_expenses': '销售费用 [亿]',
+    'admin_expenses': '管理费用 [亿]',
+    'rd_expenses': '研发费用 [亿]',
+    'financial_expenses': '财务费用 [亿]',
+    'income_tax_expenses': '所得税费用 [亿]',
+    'investment_income': '投资收益 [亿]',
+    'operating_income': '营业利润 [亿]',
+    'total_profit': '利润总额 [亿]',
+    'net_income': '净利润 [亿]',
+    'net_income_parent': '归母净利润 [亿]',
+    'net_income_deducted': '扣非净利润 [亿]',
+
+    # 资产负债表
+    'total_assets': '总资产 [亿]',
+    'current_assets': '流动资产 [亿]',
+    'non_current_assets': '非流动资产 [亿]',
+    'total_liabilities': '总负债 [亿]',
+    'current_liabilities': '流动负债 [亿]',
+    'non_current_liabilities': '非流动负债 [亿]',
+    'total_equity': '股东权益 [亿]',
+    'share_capital': '股本 [亿]',
+    'retained_earnings': '未分配利润 [亿]',
+    'cash_equivalents': '货币资金 [亿]',
+    'accounts_receivable': '应收账款 [亿]',
+    'inventory': '存货 [亿]',
+    'fixed_assets': '固定资产 [亿]',
+    'intangible_assets': '无形资产 [亿]',
+    'goodwill': '商誉 [亿]',
+    'short_term_debt': '短期借款 [亿]',
+    'long_term_debt': '长期借款 [亿]',
+    'accounts_payable': '应付账款 [亿]',
+    'contract_liabilities': '合同负债 [亿]',
+
+    # 现金流量表
+    'cfo_net': '经营现金流净额 [亿]',
+    'cfi_net': '投资现金流净额 [亿]',
+    'cff_net': '筹资现金流净额 [亿]',
+    'net_cash_flow': '现金净增加额 [亿]',
+    'capex': '资本开支 [亿]',
+    'cash_paid_for_dividends': '分红支付现金 [亿]',
+}
+
+# --- 反向查找表 (导入时构建一次，替代逐项线性扫描) ---
+# 显示名 -> 数据库字段
+LABEL_TO_FIELD = {label: field for field, label in FIELD_LABELS.items()}
+
+# 原始科目名 -> 数据库字段 (按市场；同一科目出现在多个字段时以先声明的为准)
+RAW_TO_FIELD = {}
+for _market, _fields in MARKET_FIELDS.items():
+    RAW_TO_FIELD[_market] = {}
+    for _field, (_, _candidates) in _fields.items():
+        for _raw in _candidates:
+            RAW_TO_FIELD[_market].setdefault(_raw, _field)
+
+# 数据库字段 -> 所属报表
+FIELD_STATEMENTS = {}
+for _fields in MARKET_FIELDS.values():
+    for _field, (_statement, _) in _fields.items():
+        FIELD_STATEMENTS.setdefault(_field, _statement)
+
+
+class MappingPlan:
+    """
+    针对某一源表列集合编译好的映射计划
+    - source_columns: 需要读取的源列下标 (去重)
+    - candidates: (字段数, 最大候选数) 的下标矩阵，指向 source_columns 中的位置，-1 表示无
+    """
+
+    def __init__(self, fields, source_columns, candidates):
+        self.fields = fields
+        self.source_columns = source_columns
+        self.candidates = candidates
+
+    def apply(self, values):
+        """
+        values: (行数, len(source_columns)) 的 float 矩阵
+        返回 {字段: float 数组}，候选列按顺序回退 (前一列为 NaN 时取后一列)
+        """
+        out = np.full((values.shape[0], len(self.fields)), np.nan)
+        for rank in range(self.candidates.shape[1]):
+            idx = self.candidates[:, rank]
+            has = idx >= 0
+            if not has.any():
+                continue
+            current = out[:, has]
+            out[:, has] = np.where(np.isnan(current), values[:, idx[has]], current)
+        return dict(zip(self.fields, out.T))
+
+
+@lru_cache(maxsize=256)
+def _compile(market, columns, statement):
+    position = {}
+    for i, col in enumerate(columns):
+        position.setdefault(col, i)
+
+    fields = []
+    source_columns = []
+    slot = {}
+    plans = []
+    for field, (field_statement, candidates) in MARKET_FIELDS[market].items():
+        if statement is not None and field_statement != statement:
+            continue
+        ranks = []
+        for cand in candidates:
+            if cand not in position:
+                continue
+            if cand not in slot:
+                slot[cand] = len(source_columns)
+                source_columns.append(position[cand])
+            ranks.append(slot[cand])
+        fields.append(field)
+        plans.append(ranks)
+
+    width = max((len(r) for r in plans), default=0)
+    candidates = np.full((len(fields), width), -1, dtype=np.intp)
+    for i, ranks in enumerate(plans):
+        candidates[i, :len(ranks)] = ranks
+    return MappingPlan(tuple(fields), np.array(source_columns, dtype=np.intp), candidates)
+
+
+def get_plan(market, columns, statement=None):
+    """
+    获取 (市场, 源表列集合, 报表) 对应的映射计划，同一列集合只编译一次
+    statement=None 时包含该市场的全部字段 (用于三表合并后的宽表)
+    """
+    return _compile(market, tuple(str(c) for c in columns), statement)
+
+
+def to_numbers(block):
+    """整块 (object 矩阵) 转数值 float 矩阵：去掉千分位逗号，'' / '--' 等无法解析的值转为 NaN"""
+    flat = pd.Series(np.asarray(block, dtype=object).ravel()).astype(str).str.replace(',', '', regex=False)
+    return pd.to_numeric(flat, errors='coerce').to_numpy(dtype=float).reshape(np.shape(block))
+
+
+def fields_to_dicts(fields):
+    """{字段: 数组} -> 每行一个 {字段: 值} 字典 (NaN 转为 None，便于直接写库)"""
+    names = list(fields)
+    if not names:
+        return []
+    matrix = np.column_stack([fields[n] for n in names]).astype(object)
+    matrix[pd.isna(matrix)] = None
+    return [dict(zip(names, row)) for row in matrix.tolist()]
@@ -0,0 +1,183 @@
+"""
+重构前的旧版实现 (逐行 apply、逐期取值、串行下载等)，保留原样
+只作为 benchmark.py 的计时对照与 tests/ 的一致性参照，业务代码不应调用
+"""
+import json
+import sqlite3
+import time
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+
+def legacy_indicators(df):
+    """旧版逐行 df.apply 计算引擎，仅作为一致性校验的参照"""
+    def safe_div(a, b):
+        if pd.isna(a) or pd.isna(b) or b == 0:
+            return None
+        return a / b
+
+    ind = pd.DataFrame(index=df.index)
+    ind['gross_margin'] = df.apply(lambda x: safe_div(x['gross_profit'], x['revenue']) * 100 if safe_div(x['gross_profit'], x['revenue']) is not None else None, axis=1)
+    ind['net_margin'] = df.apply(lambda x: safe_div(x['net_income'], x['revenue']) * 100 if safe_div(x['net_income'], x['revenue']) is not None else None, axis=1)
+    ind['roe'] = df.apply(lambda x: safe_div(x['net_income_parent'], x['total_equity']) * 100 if safe_div(x['net_income_parent'], x['total_equity']) is not None else None, axis=1)
+    ind['roa'] = df.apply(lambda x: safe_div(x['net_income'], x['total_assets']) * 100 if safe_div(x['net_income'], x['total_assets']) is not None else None, axis=1)
+    ind['revenue_yoy'] = df['revenue'].pct_change(periods=1) * 100
+    ind['net_profit_yoy'] = df['net_income_parent'].pct_change(periods=1) * 100
+    ind['debt_to_asset'] = df.apply(lambda x: safe_div(x['total_liabilities'], x['total_assets']) * 100 if safe_div(x['total_liabilities'], x['total_assets']) is not None else None, axis=1)
+    ind['current_ratio'] = df.apply(lambda x: safe_div(x['current_assets'], x['current_liabilities']) if safe_div(x['current_assets'], x['current_liabilities']) is not None else None, axis=1)
+    ind['inventory_turnover_days'] = df.apply(lambda x: safe_div(365 * x['inventory'], x['cost_of_revenue']) if pd.notna(x['inventory']) else None, axis=1)
+    ind['receivables_turnover_days'] = df.apply(lambda x: safe_div(365 * x['accounts_receivable'], x['revenue']) if pd.notna(x['accounts_receivable']) else None, axis=1)
+    ind['fcf'] = df['cfo_net'] - df['capex']
+    ind['cfo_to_net_income'] = df.apply(lambda x: safe_div(x['cfo_net'], x['net_income']) if safe_div(x['cfo_net'], x['net_income']) is not None else None, axis=1)
+    return ind
+
+
+def legacy_normalize(field_map, df_income, df_balance, df_cash):
+    """旧版逐期 get_val 清洗逻辑，仅作为一致性校验的参照"""
+    statements = {
+        'income': df_income.set_index('报告日'),
+        'balance': df_balance.set_index('报告日'),
+        'cash': df_cash.set_index('报告日'),
+    }
+    periods = sorted(set(statements['income'].index) & set(statements['balance'].index) & set(statements['cash'].index))
+
+    records = []
+    for period in periods:
+        report_date = datetime.strptime(period, "%Y%m%d")
+        if report_date.year < 2010:
+            continue
+        report_type = {3: 'Q1', 6: 'S1', 9: 'Q3', 12: 'A'}.get(report_date.month, 'Other')
+
+        def get_val(df, col_name):
+            if col_name in df.columns:
+                val = df.loc[period, col_name]
+                if pd.isna(val) or val == '' or val == '--':
+                    return None
+                try:
+                    if isinstance(val, str):
+                        val = val.replace(',', '')
+                    return float(val)
+                except ValueError:
+                    return None
+            return None
+
+        data = {}
+        for field, (statement, candidates) in field_map.items():
+            value = None
+            for col in candidates:
+                value = value or get_val(statements[statement], col)
+            data[field] = value
+        data['gross_profit'] = None
+        if data['revenue'] and data['cost_of_revenue']:
+            data['gross_profit'] = data['revenue'] - data['cost_of_revenue']
+        data['publish_date'] = datetime.strptime(str(statements['income'].loc[period, '公告日期'])[:8], "%Y%m%d").strftime("%Y-%m-%d")
+        records.append((report_date.strftime("%Y-%m-%d"), report_type, data))
+    return records
+
+
+def legacy_hk_merge(df_income, df_balance, df_cash):
+    """旧版：三张表分别透视后 join (rsuffix)，仅作为一致性与内存对比的参照"""
+    def pivot(df):
+        if df.empty:
+            return pd.DataFrame()
+        df = df.copy()
+        df['REPORT_DATE'] = pd.to_datetime(df['REPORT_DATE'])
+        df = df.drop_duplicates(subset=['REPORT_DATE', 'STD_ITEM_NAME'])
+        return df.pivot(index='REPORT_DATE', columns='STD_ITEM_NAME', values='AMOUNT')
+    return pivot(df_income).join(pivot(df_balance), how='outer', rsuffix='_bal').join(pivot(df_cash), how='outer', rsuffix='_cash')
+
+
+def legacy_read_items(conn, code):
+    """旧版 app 读取全量科目：逐行 json.loads 整行 raw_data 重建宽表"""
+    df_raw = pd.read_sql("SELECT * FROM financial_reports_raw WHERE stock_code=? ORDER BY report_period DESC", conn, params=(code,))
+    all_rows = []
+    for _, row in df_raw.iterrows():
+        row_dict = json.loads(row['raw_data'])
+        row_dict['report_period'] = row['report_period']
+        all_rows.append(row_dict)
+    return pd.DataFrame(all_rows).set_index('report_period')
+
+
+def legacy_ui_rerun(db_path, code):
+    """旧版 app 一次页面重跑的读库：新建连接 + f-string SQL"""
+    conn = sqlite3.connect(db_path)
+    latest = pd.read_sql(f"SELECT * FROM financial_indicators_derived WHERE stock_code='{code}' ORDER BY report_period DESC LIMIT 1", conn)
+    periods = pd.read_sql(f"SELECT report_period FROM financial_reports_raw WHERE stock_code='{code}' ORDER BY report_period DESC", conn)['report_period'].tolist()
+    exists = not pd.read_sql(f"SELECT id FROM financial_reports_raw WHERE stock_code='{code}' LIMIT 1", conn).empty
+    df_raw = pd.read_sql(f"SELECT * FROM financial_reports_raw WHERE stock_code='{code}' ORDER BY report_period DESC", conn)
+    df_derived = pd.read_sql(f"SELECT * FROM financial_indicators_derived WHERE stock_code='{code}' ORDER BY report_period DESC", conn)
+    conn.close()
+    return latest, periods, exists, df_raw, df_derived
+
+
+def legacy_pdf_download(stub_url, stock_code, save_dir, parser, sleep):
+    """旧版 _download_cninfo：裸 requests (每次新连接)、逐个下载 + 固定 sleep、下载后立即解析"""
+    import requests
+
+    res = requests.post(f"{stub_url}/new/information/topSearch/query", data={"keyWord": stock_code})
+    org_id = res.json()[0]['orgId']
+    params = {"pageNum": 1, "pageSize": 30, "stock": f"{stock_code},{org_id}"}
+    files = 0
+    while True:
+        data = requests.post(f"{stub_url}/new/hisAnnouncement/query", data=params).json()
+        announcements = data.get('announcements')
+        if not announcements:
+            break
+        for ann in announcements:
+            title = ann['announcementTitle'].replace("<em>", "").replace("</em>", "")
+            if "摘要" in title or "取消" in title:
+                continue
+            file_path = save_dir / f"{title}.pdf"
+            if not file_path.exists():
+                r = requests.get(f"{stub_url}/{ann['adjunctUrl']}", stream=True)
+                with open(file_path, 'wb') as f:
+                    for chunk in r.iter_content(8192):
+                        f.write(chunk)
+                time.sleep(sleep)
+            parser.parse_pdf(file_path)
+            files += 1
+        if not data.get('hasMore'):
+            break
+        params['pageNum'] += 1
+    return files
+
+
+def legacy_parse_pdf(pdf_path):
+    """旧版 parse_pdf：单进程逐页 get_text，整本拼成一个字符串后写出"""
+    import fitz
+
+    text_content = []
+    with fitz.open(pdf_path) as doc:
+        for page in doc:
+            text_content.append(page.get_text())
+    txt_path = Path(pdf_path).with_suffix('.txt')
+    with open(txt_path, 'w', encoding='utf-8') as f:
+        f.write("\n".join(text_content))
+    return txt_path
+
+
+def legacy_extract_with_regex(fields, txt_path):
+    """旧版 _extract_with_regex：整份读入字符串，逐字段逐关键词 findall，按数量级猜单位"""
+    import re
+
+    with open(txt_path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    extracted = {}
+    for field, (keywords, unit) in fields.items():
+        for keyword in keywords:
+            matches = re.findall(rf'{keyword}\s*\n?\s*([\d,]+\.?\d*)', text)
+            if matches:
+                try:
+                    value = float(matches[0].replace(',', ''))
+                except ValueError:
+                    continue
+                if value > 1e9:
+                    extracted[field] = value
+                elif value > 1e5:
+                    extracted[field] = value * 1e4
+                else:
+                    extracted[field] = value * 1e8
+                break
+    return extracted
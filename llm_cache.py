@@ -0,0 +1,136 @@
+"""
+LLM 提取结果的持久化缓存 (表 llm_extraction_cache，schema 迁移 v6 创建)
+- 键: (发送给模型的财报文本的 sha256, 提示词模板版本, 模型名)
+- 值: 解析后的 JSON；只缓存成功解析的结果
+- 进程内 hits / misses 计数，表内记录每条的命中次数；invalidate 按条件删除
+- 设置 writer (db.get_writer) 后，写入与命中计数交给单写入线程，调用方不等待
+
+用法:
+    from llm_cache import LLMCache
+    cache = LLMCache()
+    result = cache.get(text, prompt_version, model_name)   # 未命中返回 None
+    cache.put(text, prompt_version, model_name, result)
+
+    python llm_cache.py              # 统计
+    python llm_cache.py --clear [--model gemini-2.5-flash] [--prompt-version 1]
+"""
+import argparse
+import hashlib
+import json
+import threading
+from datetime import datetime
+from pathlib import Path
+
+from db import get_conn
+
+DB_PATH = Path(__file__).parent / "finance.db"
+
+CREATE_TABLES_SQL = [
+    '''
+    CREATE TABLE IF NOT EXISTS llm_extraction_cache (
+        content_hash TEXT NOT NULL,     -- 发送给模型的财报文本 sha256
+        prompt_version TEXT NOT NULL,   -- 提示词模板版本 (模板改动时递增)
+        model TEXT NOT NULL,            -- 模型名 (如 gemini-2.5-flash)
+        result_json TEXT NOT NULL,      -- 解析后的提取结果 (JSON)
+        created_at TEXT,
+        hits INTEGER DEFAULT 0,         -- 累计命中次数
+        last_hit_at TEXT,
+        PRIMARY KEY (content_hash, prompt_version, model)
+    ) WITHOUT ROWID
+    ''',
+]
+
+# 按主键取缓存结果 (check_query_plans.py 检查执行计划)
+GET_SQL = "SELECT result_json FROM llm_extraction_cache WHERE content_hash = ? AND prompt_version = ? AND model = ?"
+
+
+def create_tables(cursor):
+    for sql in CREATE_TABLES_SQL:
+        cursor.execute(sql)
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class LLMCache:
+    """LLM 提取结果缓存 (线程安全：每个线程使用自己的连接)"""
+
+    def __init__(self, db_path=DB_PATH, writer=None):
+        self.db_path = db_path
+        self.writer = writer
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, text, prompt_version, model):
+        """命中时返回缓存的提取结果 (dict)，否则返回 None"""
+        key = (content_hash(text), str(prompt_version), model)
+        conn = get_conn(self.db_path)
+        row = conn.execute(GET_SQL, key).fetchone()
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        self._write(
+            "UPDATE llm_extraction_cache SET hits = hits + 1, last_hit_at = ? "
+            "WHERE content_hash = ? AND prompt_version = ? AND model = ?",
+            (datetime.now().isoformat(), *key)
+        )
+        return json.loads(row[0])
+
+    def put(self, text, prompt_version, model, result):
+        """写入 (或覆盖) 一条提取结果"""
+        self._write(
+            "INSERT OR REPLACE INTO llm_extraction_cache "
+            "(content_hash, prompt_version, model, result_json, created_at, hits) VALUES (?, ?, ?, ?, ?, 0)",
+            (content_hash(text), str(prompt_version), model,
+             json.dumps(result, ensure_ascii=False), datetime.now().isoformat())
+        )
+
+    def invalidate(self, model=None, prompt_version=None, text=None):
+        """删除匹配条件的缓存 (条件都为空时清空)，返回删除条数"""
+        conditions, params = [], []
+        for column, value in (('model', model), ('prompt_version', prompt_version),
+                              ('content_hash', content_hash(text) if text is not None else None)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(str(value))
+        sql = "DELETE FROM llm_extraction_cache"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        return self._execute(sql, params)
+
+    def _execute(self, sql, params):
+        conn = get_conn(self.db_path)
+        with conn:
+            return conn.execute(sql, params).rowcount
+
+    def _write(self, sql, params):
+        if self.writer is not None:
+            self.writer.submit(self._execute, sql, params)
+        else:
+            self._execute(sql, params)
+
+    def stats(self):
+        """{'entries', 'stored_hits', 'hits', 'misses'}：表内条数与累计命中，及本进程的命中/未命中"""
+        entries, stored_hits = get_conn(self.db_path).execute(
+            "SELECT COUNT(*), COALESCE(SUM(hits), 0) FROM llm_extraction_cache"
+        ).fetchone()
+        return {'entries': entries, 'stored_hits': stored_hits, 'hits': self.hits, 'misses': self.misses}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="LLM 提取结果缓存")
+    parser.add_argument("--clear", action="store_true", help="删除缓存 (可用 --model / --prompt-version 限定范围)")
+    parser.add_argument("--model")
+    parser.add_argument("--prompt-version")
+    args = parser.parse_args()
+
+    cache = LLMCache()
+    if args.clear:
+        removed = cache.invalidate(model=args.model, prompt_version=args.prompt_version)
+        print(f"🧹 已删除 {removed} 条缓存")
+    stats = cache.stats()
+    print(f"📦 LLM 缓存: {stats['entries']} 条, 累计命中 {stats['stored_hits']} 次")
@@ -1,12 +1,18 @@
 import requests
+import hashlib
+import json
 import os
-import time
-import random
-import sqlite3
+import re
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
 from pathlib import Path
 from datetime import datetime, timedelta
+from urllib.parse import urlparse
 
+from requests.adapters import HTTPAdapter
+
+import repository
 from pdf_parser import PDFParser
+from throttle import get_bucket, retry_call
 
 # 尝试导入美股下载库 (如果没安装则跳过)
 try:
@@ -17,98 +23,119 @@ except ImportError:
 
 DB_PATH = Path(__file__).parent / "finance.db"
 
+# 巨潮资讯接口 (可在构造时替换为本地桩服务)
+CNINFO_BASE_URL = "http://www.cninfo.com.cn"
+CNINFO_STATIC_URL = "http://static.cninfo.com.cn"
+
+
+class HTTPStatusError(Exception):
+    """可重试的 HTTP 状态码 (429 / 5xx)"""
+
+
+class IncompleteDownload(Exception):
+    """下载的字节数与服务器声明的不一致 (连接中断等)，可断点续传重试"""
+
+
+def _relative(path):
+    """项目目录下的文件记录相对路径，其他位置 (如自定义下载目录) 记录绝对路径"""
+    path = Path(path)
+    try:
+        return str(path.relative_to(Path(__file__).parent))
+    except ValueError:
+        return str(path)
+
+
+def _should_retry(exc):
+    return isinstance(exc, (HTTPStatusError, IncompleteDownload, requests.ConnectionError, requests.Timeout,
+                            requests.exceptions.ChunkedEncodingError))
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _looks_complete(path):
+    """PDF 完整性的廉价检查：文件头为 %PDF-，结尾 2KB 内有 %%EOF (截断的文件没有)"""
+    try:
+        with open(path, 'rb') as f:
+            if f.read(5) != b'%PDF-':
+                return False
+            f.seek(max(0, path.stat().st_size - 2048))
+            return b'%%EOF' in f.read()
+    except OSError:
+        return False
+
+
 class PDFDownloader:
-    def __init__(self, download_dir="downloads"):
+    """
+    财报 PDF 下载器 (流水线)：
+    - 公告列表分页查询 → 线程池并发下载 PDF → 进程池解析 TXT → 主线程记录入库
+    - 共享 requests.Session (连接池复用 TCP 连接)，按主机令牌桶限流，429/5xx/网络错误指数退避重试
+    """
+
+    def __init__(self, download_dir="downloads", max_workers=4, rate_limit=3.0, parse_workers=None,
+                 base_url=CNINFO_BASE_URL, static_url=CNINFO_STATIC_URL, parser=None, timeout=30, db_path=DB_PATH):
         self.base_dir = Path(__file__).parent / download_dir
+        self.db_path = db_path
         self.base_dir.mkdir(exist_ok=True)
-        self.parser = PDFParser()
-        self.conn = sqlite3.connect(DB_PATH)  # 数据库连接
-        
+        self.parser = parser or PDFParser()
+        self.base_url = base_url.rstrip('/')
+        self.static_url = static_url.rstrip('/')
+        self.max_workers = max_workers
+        self.rate_limit = rate_limit
+        # 解析进程数：0 表示在主线程内解析 (调试用)
+        self.parse_workers = (os.cpu_count() or 1) if parse_workers is None else parse_workers
+        self.timeout = timeout
+        self.retries = 3
+
         self.headers = {
             "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
             "Content-Type": "application/x-www-form-urlencoded; charset=UTF-8",
             "Origin": "http://www.cninfo.com.cn",
             "Referer": "http://www.cninfo.com.cn/new/commonUrl/pageOfSearch?url=disclosure/list/search&lastPage=index"
         }
-    
-    def _record_file(self, stock_code, report_period, report_type, file_path, txt_path):
+        # 连接池大小与下载线程数一致，线程间复用 keep-alive 连接
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(4, max_workers))
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _send(self, method, url, **kwargs):
+        """限流后发出单次请求 (同一主机共享令牌桶)，429/5xx 抛出可重试异常"""
+        get_bucket(urlparse(url).netloc, self.rate_limit).acquire()
+        res = self.session.request(method, url, timeout=self.timeout, **kwargs)
+        if res.status_code == 429 or res.status_code >= 500:
+            res.close()
+            raise HTTPStatusError(f"HTTP {res.status_code}: {url}")
+        res.raise_for_status()
+        return res
+
+    def _request(self, method, url, **kwargs):
+        """限流 + 重试的 HTTP 请求"""
+        return retry_call(self._send, method, url, retries=self.retries, should_retry=_should_retry, **kwargs)
+
+    def _record_file(self, stock_code, report_period, report_type, file_path, txt_path, sha256=None, etag=None):
         """将文件信息记录到数据库"""
         try:
             file_size = file_path.stat().st_size if file_path.exists() else 0
-            relative_path = str(file_path.relative_to(Path(__file__).parent))
-            relative_txt = str(txt_path.relative_to(Path(__file__).parent)) if txt_path else None
-            
-            cursor = self.conn.cursor()
-            cursor.execute('''
-                INSERT OR REPLACE INTO financial_reports_files
-                (stock_code, report_period, report_type, file_type, file_path, txt_path, download_date, file_size, parse_status)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                stock_code,
-                report_period,
-                report_type,
-                'PDF',
-                relative_path,
-                relative_txt,
-                datetime.now().isoformat(),
-                file_size,
-                'SUCCESS' if txt_path and txt_path.exists() else 'PENDING'
-            ))
-            self.conn.commit()
+            parse_status = 'SUCCESS' if txt_path and txt_path.exists() else 'PENDING'
+            repository.record_file(
+                stock_code, report_period, report_type, _relative(file_path), _relative(txt_path) if txt_path else None,
+                file_size, parse_status, sha256=sha256, etag=etag, db_path=self.db_path
+            )
         except Exception as e:
             print(f"  ⚠️ 记录文件信息失败: {e}")
-    
-    def __del__(self):
-        """析构时关闭数据库连接"""
-        if hasattr(self, 'conn'):
-            self.conn.close()
-
-
-    def _download_cninfo(self, stock_code, stock_type, save_dir, lookback_days):
-        # ... (前面的代码不变) ...
-        
-        # 3. 分页下载
-        while True:
-            try:
-                # ... (请求代码不变) ...
-                
-                for ann in announcements:
-                    # ... (文件名处理不变) ...
-                    
-                    # 下载
-                    pdf_url = "http://static.cninfo.com.cn/" + ann['adjunctUrl']
-                    
-                    # 如果文件不存在才下载
-                    if not file_path.exists():
-                        print(f"  ⬇️ 下载: {title}")
-                        r = requests.get(pdf_url, stream=True)
-                        with open(file_path, 'wb') as f:
-                            for chunk in r.iter_content(8192):
-                                f.write(chunk)
-                        time.sleep(0.5)
-                    else:
-                        print(f"  跳过: {title}")
-
-                    # --- 集成解析逻辑 ---
-                    # 无论是否新下载，都检查一下有没有 TXT，没有就解析
-                    self.parser.parse_pdf(file_path)
-                
-                if not data.get('hasMore'):
-                    break
-                params['pageNum'] += 1
-                
-            except Exception as e:
-                print(f"下载出错: {e}")
-                break
-        
-        print(f"✅ {stock_code} 下载与解析完成！")
 
     def _download_sec(self, ticker, save_dir, lookback_days):
         # ... (美股下载逻辑不变，美股本身就是 HTML，暂时不需要 PDF 解析) ...
         # 但如果未来需要把 HTML 转 TXT，也可以在这里加逻辑
         pass
 
-
     def _get_stock_type(self, code):
         if code.isdigit():
             if len(code) == 6: return 'A'
@@ -119,14 +146,12 @@ class PDFDownloader:
 
     def _get_cninfo_org_id(self, stock_code):
         """获取巨潮资讯 orgId"""
-        url = "http://www.cninfo.com.cn/new/information/topSearch/query"
+        url = f"{self.base_url}/new/information/topSearch/query"
         try:
-            res = requests.post(url, data={"keyWord": stock_code}, headers=self.headers)
-            if res.status_code == 200:
-                data = res.json()
-                for item in data:
-                    if item['code'] == stock_code:
-                        return item['orgId']
+            res = self._request("POST", url, data={"keyWord": stock_code})
+            for item in res.json():
+                if item['code'] == stock_code:
+                    return item['orgId']
         except Exception as e:
             print(f"获取 orgId 失败: {e}")
         return None
@@ -136,14 +161,14 @@ class PDFDownloader:
         通用下载入口
         """
         stock_type = self._get_stock_type(stock_code)
+
+        if stock_type in ['A', 'HK']:
+            return self.download_many([stock_code], lookback_days)
+
         save_dir = self.base_dir / stock_code
         save_dir.mkdir(exist_ok=True)
-        
         print(f"📥 开始下载 {stock_code} ({stock_type}) 的财报...")
-        
-        if stock_type in ['A', 'HK']:
-            self._download_cninfo(stock_code, stock_type, save_dir, lookback_days)
-        elif stock_type == 'US':
+        if stock_type == 'US':
             if HAS_SEC:
                 self._download_sec(stock_code, save_dir, lookback_days)
             else:
@@ -151,17 +176,83 @@ class PDFDownloader:
         else:
             print(f"❌ 未知股票类型: {stock_code}")
 
-    def _download_cninfo(self, stock_code, stock_type, save_dir, lookback_days):
-        url = "http://www.cninfo.com.cn/new/hisAnnouncement/query"
-        
+    def download_many(self, stock_codes, lookback_days=365*3):
+        """
+        批量下载 A 股/港股财报 (流水线)：
+        1. 线程池：查询公告列表 (每只股票分页)、下载 PDF
+        2. 进程池：PDF → TXT 解析 (CPU 密集，不占下载线程)
+        3. 主线程：解析完成后记录入库
+        返回统计 {listed, downloaded, skipped, parsed, failed}
+        """
+        stock_codes = [c for c in stock_codes if self._get_stock_type(c) in ('A', 'HK')]
+        stats = dict.fromkeys(['listed', 'downloaded', 'skipped', 'parsed', 'failed'], 0)
+        print(f"📥 开始下载 {len(stock_codes)} 只股票的财报 (下载线程 {self.max_workers}, 解析进程 {self.parse_workers}, 限速 {self.rate_limit} 次/秒/主机)...")
+
+        io_pool = ThreadPoolExecutor(max_workers=self.max_workers)
+        parse_pool = ProcessPoolExecutor(max_workers=self.parse_workers) if self.parse_workers > 0 else None
+        # future -> (阶段, 上下文)
+        pending = {}
+        try:
+            for code in stock_codes:
+                pending[io_pool.submit(self._list_reports, code, lookback_days)] = ('list', code)
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage, ctx = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        stats['failed'] += 1
+                        print(f"  ❌ {stage} 失败 {ctx if stage == 'list' else ctx['title']}: {e}")
+                        continue
+
+                    if stage == 'list':
+                        stats['listed'] += len(result)
+                        for report in result:
+                            pending[io_pool.submit(self._fetch_pdf, report)] = ('fetch', report)
+                    elif stage == 'fetch':
+                        stats['downloaded' if result else 'skipped'] += 1
+                        if parse_pool is None:
+                            self._on_parsed(ctx, self.parser.parse_pdf(ctx['file_path']), stats)
+                        else:
+                            pending[parse_pool.submit(self.parser.parse_pdf, ctx['file_path'])] = ('parse', ctx)
+                    else:
+                        self._on_parsed(ctx, result, stats)
+        finally:
+            io_pool.shutdown(wait=True, cancel_futures=True)
+            if parse_pool is not None:
+                parse_pool.shutdown(wait=True, cancel_futures=True)
+
+        print(f"✅ 下载与解析完成：公告 {stats['listed']}，新下载 {stats['downloaded']}，已存在 {stats['skipped']}，"
+              f"解析 {stats['parsed']}，失败 {stats['failed']}")
+        return stats
+
+    def _on_parsed(self, report, txt_path, stats):
+        if txt_path:
+            stats['parsed'] += 1
+        # 记录文件信息到数据库
+        if report['report_period'] and report['report_type']:
+            self._record_file(
+                report['stock_code'], report['report_period'], report['report_type'], report['file_path'], txt_path,
+                sha256=report.get('sha256'), etag=report.get('etag')
+            )
+
+    def _list_reports(self, stock_code, lookback_days):
+        """分页查询某只股票的定期报告公告，返回待下载列表"""
+        stock_type = self._get_stock_type(stock_code)
+        save_dir = self.base_dir / stock_code
+        save_dir.mkdir(exist_ok=True)
+        url = f"{self.base_url}/new/hisAnnouncement/query"
+
         # 1. 获取 orgId
         org_id = self._get_cninfo_org_id(stock_code)
         stock_param = f"{stock_code},{org_id}" if org_id else stock_code
-        
+
         # 2. 构造参数
         end_date = datetime.now()
         start_date = end_date - timedelta(days=lookback_days)
-        
+
         params = {
             "pageNum": 1,
             "pageSize": 30,
@@ -170,7 +261,7 @@ class PDFDownloader:
             "seDate": f"{start_date.strftime('%Y-%m-%d')}~{end_date.strftime('%Y-%m-%d')}",
             "isHLtitle": "true"
         }
-        
+
         if stock_type == 'A':
             params['column'] = 'sse' if stock_code.startswith('6') else 'szse'
             params['category'] = "category_ndbg_szsh;category_bndbg_szsh;category_yjdbg_szsh;category_sjdbg_szsh"
@@ -178,71 +269,145 @@ class PDFDownloader:
             params['column'] = 'hke'
             params['category'] = "category_ndbg_hkhk;category_bndbg_hkhk"
 
-        # 3. 分页下载
+        # 3. 分页查询
+        reports = []
         while True:
-            try:
-                res = requests.post(url, data=params, headers=self.headers)
-                data = res.json()
-                announcements = data.get('announcements')
-                
-                if not announcements:
-                    break
-                    
-                for ann in announcements:
-                    title = ann['announcementTitle'].replace("<em>", "").replace("</em>", "")
-                    
-                    # 过滤摘要
-                    if "摘要" in title or "取消" in title: 
-                        continue
-                    
-                    # 构造文件名
-                    file_name = f"{title}.pdf"
-                    file_path = save_dir / file_name.replace("/", "_")
-                    
-                    # 下载 PDF
-                    if not file_path.exists():
-                        pdf_url = "http://static.cninfo.com.cn/" + ann['adjunctUrl']
-                        print(f"  ⬇️ 下载: {title}")
-                        
-                        r = requests.get(pdf_url, stream=True)
-                        with open(file_path, 'wb') as f:
-                            for chunk in r.iter_content(8192):
-                                f.write(chunk)
-                        time.sleep(0.5)
-                    else:
-                        print(f"  跳过: {title}")
-                    
-                    # 解析 PDF 为 TXT
-                    txt_path = self.parser.parse_pdf(file_path)
-                    
-                    # 从标题中提取 report_period (简单处理)
-                    # 标题格式: "2023年年度报告" -> report_period: "2023-12-31"
-                    report_period = self._extract_period_from_title(title)
-                    report_type = self._extract_type_from_title(title)
-                    
-                    # 记录文件信息到数据库
-                    if report_period and report_type:
-                        self._record_file(stock_code, report_period, report_type, file_path, txt_path)
-                
-                if not data.get('hasMore'):
-                    break
-                params['pageNum'] += 1
-                
-            except Exception as e:
-                print(f"下载出错: {e}")
+            data = self._request("POST", url, data=params).json()
+            announcements = data.get('announcements')
+            if not announcements:
+                break
+
+            for ann in announcements:
+                title = ann['announcementTitle'].replace("<em>", "").replace("</em>", "")
+
+                # 过滤摘要
+                if "摘要" in title or "取消" in title:
+                    continue
+
+                # 从标题中提取 report_period / report_type
+                # 标题格式: "2023年年度报告" -> report_period: "2023-12-31"
+                reports.append({
+                    'stock_code': stock_code,
+                    'title': title,
+                    'url': f"{self.static_url}/{ann['adjunctUrl'].lstrip('/')}",
+                    'file_path': save_dir / f"{title}.pdf".replace("/", "_"),
+                    'report_period': self._extract_period_from_title(title),
+                    'report_type': self._extract_type_from_title(title),
+                })
+
+            if not data.get('hasMore'):
                 break
-        
-        print(f"✅ {stock_code} 下载与解析完成！")
-    
+            params['pageNum'] += 1
+        return reports
+
+    def _fetch_pdf(self, report):
+        """
+        下载单个 PDF，返回是否新下载：
+        - 本地文件与库中记录的大小、哈希一致 → 只看元数据直接跳过
+        - 本地文件完整但没有记录 (旧版下载) → 补算哈希后跳过；截断的文件删除重下
+        """
+        file_path = report['file_path']
+        if file_path.exists():
+            size = file_path.stat().st_size
+            known = self._known_file(report)
+            if known and known['sha256'] and known['file_size'] == size:
+                report['sha256'], report['etag'] = known['sha256'], known['etag']
+                print(f"  跳过: {report['title']}")
+                return False
+            if _looks_complete(file_path):
+                report['sha256'] = _sha256(file_path)
+                print(f"  跳过: {report['title']}")
+                return False
+            print(f"  ⚠️ 文件不完整，重新下载: {report['title']}")
+            file_path.unlink()
+
+        print(f"  ⬇️ 下载: {report['title']}")
+        report['sha256'], report['etag'] = self._download_file(report['url'], file_path)
+        return True
+
+    def _known_file(self, report):
+        """库中该报告期同名文件的记录"""
+        relative_path = _relative(report['file_path'])
+        for record in repository.files_for(report['stock_code'], report['report_period'], db_path=self.db_path):
+            if record['file_path'] == relative_path:
+                return record
+        return None
+
+    def _download_file(self, url, file_path):
+        """
+        断点续传下载：先写 <文件>.part，中断后带 Range/If-Range 续传
+        字节数与服务器声明一致且文件头为 %PDF- 才原子重命名为正式文件
+        返回 (sha256, etag)
+        """
+        part = file_path.with_name(file_path.name + '.part')
+        # 首次响应的 ETag/Last-Modified/总大小，续传时用于 If-Range 校验服务器文件没变
+        meta_path = file_path.with_name(file_path.name + '.part.json')
+
+        def discard():
+            part.unlink(missing_ok=True)
+            meta_path.unlink(missing_ok=True)
+
+        def attempt():
+            meta = json.loads(meta_path.read_text()) if meta_path.exists() else {}
+            offset = part.stat().st_size if part.exists() else 0
+            if offset and meta.get('size') is not None and offset >= meta['size']:
+                # 续传起点已达到/超过记录的总大小：临时文件无法再续传校验，丢弃后从头下载
+                discard()
+                meta, offset = {}, 0
+            validator = meta.get('etag') or meta.get('last_modified')
+            headers = {'Range': f"bytes={offset}-", 'If-Range': validator} if offset and validator else {}
+
+            try:
+                response = self._send("GET", url, stream=True, headers=headers)
+            except requests.HTTPError as e:
+                if not headers or e.response is None or e.response.status_code != 416:
+                    raise
+                # 416：服务器文件比本地临时文件短 (已被替换)，丢弃后从头下载
+                e.response.close()
+                discard()
+                meta = {}
+                response = self._send("GET", url, stream=True)
+
+            with response as r:
+                if r.status_code == 206:
+                    mode = 'ab'
+                else:
+                    # 服务器不支持续传或文件已变化：从头下载
+                    mode = 'wb'
+                    length = r.headers.get('Content-Length')
+                    meta = {
+                        'etag': r.headers.get('ETag'),
+                        'last_modified': r.headers.get('Last-Modified'),
+                        'size': int(length) if length else None,
+                    }
+                    meta_path.write_text(json.dumps(meta))
+                with open(part, mode) as f:
+                    for chunk in r.iter_content(65536):
+                        f.write(chunk)
+
+            size = part.stat().st_size
+            if meta.get('size') is not None and size != meta['size']:
+                raise IncompleteDownload(f"已下载 {size}/{meta['size']} 字节")
+            return meta
+
+        meta = retry_call(attempt, retries=self.retries, should_retry=_should_retry)
+        with open(part, 'rb') as f:
+            if f.read(5) != b'%PDF-':
+                discard()
+                raise ValueError("下载内容不是 PDF")
+        sha256 = _sha256(part)
+        os.replace(part, file_path)
+        meta_path.unlink(missing_ok=True)
+        return sha256, meta.get('etag')
+
     def _extract_period_from_title(self, title):
         """从标题提取报告期"""
-        import re
         # 匹配年份
         year_match = re.search(r'(\d{4})年', title)
         if not year_match:
             return None
         year = year_match.group(1)
-        
+
         # 判断报告类型（优先判断季度/半年，避免被"年度"误判）
         if '第三季度' in title or '三季报' in title:
             return f"{year}-09-30"
@@ -253,7 +418,7 @@ class PDFDownloader:
         elif '年度报告' in title or '年报' in title:
             return f"{year}-12-31"
         return None
-    
+
     def _extract_type_from_title(self, title):
         """从标题提取报告类型"""
         if '第三季度' in title or '三季报' in title:
@@ -269,11 +434,11 @@ class PDFDownloader:
 
     def _download_sec(self, ticker, save_dir, lookback_days):
         # 需要配置 email
-        email = "your_email@example.com" 
+        email = "your_email@example.com"
         dl = SecDownloader("Antigravity", email, str(save_dir))
-        
+
         after_date = (datetime.now() - timedelta(days=lookback_days)).strftime('%Y-%m-%d')
-        
+
         print(f"  正在从 SEC 下载 10-K/10-Q (after {after_date})...")
         try:
             dl.get("10-K", ticker, after=after_date)
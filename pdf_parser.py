@@ -1,10 +1,85 @@
 import fitz  # PyMuPDF
 import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 
+from sections import find_headings, index_path, write_index
+
+# 超过 LARGE_DOC_PAGES 页的文档按 PAGE_CHUNK 页一段拆给多个进程
+LARGE_DOC_PAGES = 120
+PAGE_CHUNK = 60
+
+
+def _is_parsed(pdf_path, txt_path):
+    """TXT 已经存在且比 PDF 新 (并且已有章节索引)"""
+    return (txt_path.exists() and txt_path.stat().st_mtime > pdf_path.stat().st_mtime
+            and index_path(txt_path).exists())
+
+
+def _extract_pages(pdf_path, start, stop, out_path):
+    """
+    把 [start, stop) 页的文本逐页写入 out_path (页间以换行分隔，与整本拼接的结果一致)
+    在子进程中运行，返回每页的 [段内字节起点, 终点, 章节标题列表]
+    """
+    pages = []
+    offset = 0
+    with fitz.open(pdf_path) as doc, open(out_path, 'wb') as f:
+        for i in range(start, min(stop, doc.page_count)):
+            if i > 0:
+                offset += f.write(b"\n")
+            text = doc[i].get_text()
+            size = f.write(text.encode('utf-8'))
+            pages.append([offset, offset + size, find_headings(text)])
+            offset += size
+    return pages
+
+
+def _page_ranges(page_count):
+    if page_count <= LARGE_DOC_PAGES:
+        return [(0, page_count)]
+    return [(start, min(start + PAGE_CHUNK, page_count)) for start in range(0, page_count, PAGE_CHUNK)]
+
+
+def _join_parts(parts, part_pages, txt_path):
+    """
+    按页序拼接各段，写完后原子替换，避免中断留下的半截 TXT 被 mtime 判断为已解析
+    再把各段的页偏移换算成整本 TXT 的偏移，写出章节索引
+    """
+    if len(parts) == 1:
+        os.replace(parts[0], txt_path)
+    else:
+        tmp_path = txt_path.with_name(txt_path.name + '.part')
+        with open(tmp_path, 'wb') as out:
+            for part in parts:
+                with open(part, 'rb') as f:
+                    shutil.copyfileobj(f, out)
+        os.replace(tmp_path, txt_path)
+
+    offsets, headings = [], []
+    base = 0
+    for pages in part_pages:
+        for start, end, names in pages:
+            offsets.append([base + start, base + end])
+            headings.append(names)
+        if pages:
+            base += pages[-1][1]
+    write_index(txt_path, offsets, headings)
+
+
+def _remove(paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
 class PDFParser:
-    def __init__(self):
-        pass
+    def __init__(self, workers=None):
+        # parse_many 的默认进程数
+        self.workers = workers
 
     def parse_pdf(self, pdf_path):
         """
@@ -14,44 +89,136 @@ class PDFParser:
         if not pdf_path.exists():
             print(f"❌ 文件不存在: {pdf_path}")
             return None
-            
+
         txt_path = pdf_path.with_suffix('.txt')
-        
+
         # 如果 TXT 已经存在且比 PDF 新，跳过
-        if txt_path.exists() and txt_path.stat().st_mtime > pdf_path.stat().st_mtime:
+        if _is_parsed(pdf_path, txt_path):
             print(f"  跳过已解析: {txt_path.name}")
             return txt_path
 
         print(f"📄 正在解析: {pdf_path.name} ...")
-        
+
+        tmp_path = txt_path.with_name(txt_path.name + '.0.part')
         try:
-            text_content = []
-            with fitz.open(pdf_path) as doc:
-                for page in doc:
-                    text_content.append(page.get_text())
-            
-            full_text = "\n".join(text_content)
-            
-            with open(txt_path, 'w', encoding='utf-8') as f:
-                f.write(full_text)
-                
+            # 逐页写入临时文件，不在内存中拼接整本文本
+            pages = _extract_pages(pdf_path, 0, float('inf'), tmp_path)
+            _join_parts([tmp_path], [pages], txt_path)
+
             print(f"✅ 解析完成，已保存为 TXT")
             return txt_path
-            
+
         except Exception as e:
+            _remove([tmp_path])
             print(f"❌ 解析失败: {e}")
             return None
 
-    def parse_directory(self, dir_path):
+    def parse_many(self, paths, workers=None):
+        """
+        多进程批量解析：文档分给进程池，超大文档再按页段拆分，各段写入临时文件后按页序拼接
+        同时在 TXT 旁写出页/章节索引 (见 sections.py)
+        跳过规则与 parse_pdf 相同 (TXT 比 PDF 新则跳过)
+        workers: 进程数，默认 self.workers 或 CPU 核数；<= 1 时在当前进程内顺序解析
+        返回 {pdf_path: txt_path}，解析失败或文件不存在的为 None
+        """
+        workers = workers or self.workers or os.cpu_count() or 1
+        results = {}
+        jobs = []       # (pdf_path, txt_path, 页段列表)
+        skipped = 0
+        for pdf_path in map(Path, paths):
+            txt_path = pdf_path.with_suffix('.txt')
+            if not pdf_path.exists():
+                print(f"❌ 文件不存在: {pdf_path}")
+                results[pdf_path] = None
+            elif _is_parsed(pdf_path, txt_path):
+                results[pdf_path] = txt_path
+                skipped += 1
+            elif workers <= 1:
+                # 单进程时不拆分，整本一段
+                jobs.append((pdf_path, txt_path, [(0, float('inf'))]))
+            else:
+                try:
+                    with fitz.open(pdf_path) as doc:
+                        page_count = doc.page_count
+                except Exception as e:
+                    print(f"❌ 解析失败: {pdf_path.name}: {e}")
+                    results[pdf_path] = None
+                    continue
+                jobs.append((pdf_path, txt_path, _page_ranges(page_count)))
+
+        if workers > 1:
+            # 大文档先提交，减少末尾只剩一个进程在跑的时间
+            jobs.sort(key=lambda job: job[2][-1][1], reverse=True)
+        tasks = []      # (文档序号, 段序号, start, stop, 段文件)
+        parts = []      # 每个文档按页序排列的段文件
+        for doc_id, (pdf_path, txt_path, ranges) in enumerate(jobs):
+            parts.append([txt_path.with_name(f"{txt_path.name}.{part_id}.part") for part_id in range(len(ranges))])
+            for part_id, (start, stop) in enumerate(ranges):
+                tasks.append((doc_id, part_id, start, stop, parts[doc_id][part_id]))
+
+        pending = [len(ranges) for _, _, ranges in jobs]
+        part_pages = [[None] * len(ranges) for _, _, ranges in jobs]
+        failed = set()
+        pages = 0
+        t0 = time.perf_counter()
+
+        def finish(doc_id, part_id, doc_pages=(), error=None):
+            nonlocal pages
+            pdf_path, txt_path, ranges = jobs[doc_id]
+            if error is not None and doc_id not in failed:
+                failed.add(doc_id)
+                print(f"❌ 解析失败: {pdf_path.name} (第 {ranges[part_id][0] + 1} 页起): {error}")
+            pages += len(doc_pages)
+            part_pages[doc_id][part_id] = doc_pages
+            pending[doc_id] -= 1
+            if pending[doc_id]:
+                return
+            results[pdf_path] = None
+            try:
+                if doc_id not in failed:
+                    _join_parts(parts[doc_id], part_pages[doc_id], txt_path)
+                    results[pdf_path] = txt_path
+            except OSError as e:
+                failed.add(doc_id)
+                print(f"❌ 写入失败: {txt_path.name}: {e}")
+            finally:
+                _remove(parts[doc_id])
+
+        if workers <= 1:
+            for doc_id, part_id, start, stop, part_path in tasks:
+                try:
+                    doc_pages, error = _extract_pages(jobs[doc_id][0], start, stop, part_path), None
+                except Exception as e:
+                    doc_pages, error = (), e
+                finish(doc_id, part_id, doc_pages, error)
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = {
+                    pool.submit(_extract_pages, jobs[doc_id][0], start, stop, part_path): (doc_id, part_id)
+                    for doc_id, part_id, start, stop, part_path in tasks
+                }
+                for future in as_completed(futures):
+                    try:
+                        doc_pages, error = future.result(), None
+                    except Exception as e:
+                        doc_pages, error = (), e
+                    finish(*futures[future], doc_pages, error)
+
+        elapsed = time.perf_counter() - t0
+        rate = pages / elapsed if elapsed > 0 else 0
+        print(f"📊 解析 {len(jobs) - len(failed)} 份 / {pages} 页，{rate:.0f} 页/秒 "
+              f"(进程 {workers}，跳过已解析 {skipped} 份，失败 {list(results.values()).count(None)} 份)")
+        return results
+
+    def parse_directory(self, dir_path, workers=None):
         """
         批量解析目录下的所有 PDF
         """
         dir_path = Path(dir_path)
         pdfs = list(dir_path.glob("*.pdf"))
         print(f"📂 在 {dir_path} 发现 {len(pdfs)} 个 PDF 文件")
-        
-        for pdf in pdfs:
-            self.parse_pdf(pdf)
+
+        return self.parse_many(pdfs, workers=workers)
 
 if __name__ == "__main__":
     parser = PDFParser()
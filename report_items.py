@@ -0,0 +1,159 @@
+"""
+接口全量科目的长表存储 (替代 financial_reports_raw.raw_data 中的整行 JSON)
+- report_items: 科目字典，科目名只存一份 (item_name -> item_id)
+- financial_report_items: (stock_code, report_period, item_id) -> value，WITHOUT ROWID 聚簇主键即覆盖索引
+- load_items: 一个读事务取回某只股票的宽表 (行: 报告期, 列: 科目名)
+- migrate_raw_json: 把旧版 raw_data JSON 拆到长表 (schema 迁移 v3 使用)
+"""
+import json
+
+import numpy as np
+import pandas as pd
+
+CREATE_TABLES_SQL = [
+    '''
+    CREATE TABLE IF NOT EXISTS report_items (
+        item_id INTEGER PRIMARY KEY,
+        item_name TEXT NOT NULL UNIQUE   -- 接口原始科目名 (如 营业额)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS financial_report_items (
+        stock_code TEXT NOT NULL,
+        report_period TEXT NOT NULL,
+        item_id INTEGER NOT NULL,
+        value REAL,
+        PRIMARY KEY (stock_code, report_period, item_id)
+    ) WITHOUT ROWID
+    ''',
+]
+
+
+def create_tables(cursor):
+    for sql in CREATE_TABLES_SQL:
+        cursor.execute(sql)
+
+
+def intern_items(cursor, names):
+    """返回 {科目名: item_id}，新科目写入字典表"""
+    names = list(dict.fromkeys(names))
+    if not names:
+        return {}
+    cursor.executemany("INSERT OR IGNORE INTO report_items (item_name) VALUES (?)", [(n,) for n in names])
+    ids = {}
+    # SQLite 单条语句的参数个数有上限，分批查询
+    for i in range(0, len(names), 500):
+        batch = names[i:i + 500]
+        placeholders = ', '.join(['?'] * len(batch))
+        cursor.execute(f"SELECT item_name, item_id FROM report_items WHERE item_name IN ({placeholders})", batch)
+        ids.update(cursor.fetchall())
+    return ids
+
+
+def save_items(cursor, stock_code, items_by_period):
+    """
+    覆盖写入若干报告期的全量科目 (调用方负责事务)
+    items_by_period: {report_period: {科目名: 数值}}，空值不落库
+    """
+    if not items_by_period:
+        return
+    names = [name for items in items_by_period.values() for name, value in items.items() if value is not None]
+    ids = intern_items(cursor, names)
+
+    cursor.executemany(
+        "DELETE FROM financial_report_items WHERE stock_code=? AND report_period=?",
+        [(stock_code, period) for period in items_by_period]
+    )
+    cursor.executemany(
+        "INSERT INTO financial_report_items (stock_code, report_period, item_id, value) VALUES (?, ?, ?, ?)",
+        [
+            (stock_code, period, ids[name], value)
+            for period, items in items_by_period.items()
+            for name, value in items.items() if value is not None
+        ]
+    )
+
+
+def migrate_raw_json(cursor, batch_size=500):
+    """
+    把 financial_reports_raw.raw_data 中的整行 JSON 拆成长表，迁移完的行清空 raw_data (调用方负责事务)
+    返回 (迁移行数, 无法解析的行数)
+    """
+    migrated = 0
+    failed = 0
+    while True:
+        rows = cursor.execute(
+            "SELECT id, stock_code, report_period, raw_data FROM financial_reports_raw "
+            "WHERE raw_data IS NOT NULL LIMIT ?", (batch_size,)
+        ).fetchall()
+        if not rows:
+            break
+        for row_id, stock_code, report_period, raw_json in rows:
+            try:
+                items = json.loads(raw_json)
+            except (TypeError, ValueError):
+                failed += 1
+                items = {}
+            save_items(cursor, stock_code, {report_period: items})
+        cursor.executemany("UPDATE financial_reports_raw SET raw_data = NULL WHERE id = ?", [(r[0],) for r in rows])
+        migrated += len(rows)
+    return migrated, failed
+
+
+# 读宽表的两条查询都只走聚簇主键 (stock_code, report_period, item_id)，不回表、不临时排序
+# {period_filter}: 不限报告期时为空 (check_query_plans.py 检查执行计划)
+LOAD_PERIODS_SQL = '''
+    SELECT report_period, count(*) FROM financial_report_items
+    WHERE stock_code = ?{period_filter} GROUP BY report_period ORDER BY report_period
+'''
+LOAD_ITEMS_SQL = '''
+    SELECT item_id, value FROM financial_report_items
+    WHERE stock_code = ?{period_filter} ORDER BY report_period, item_id
+'''
+
+
+def load_items(conn, stock_code, periods=None):
+    """
+    一个读事务取回某只股票的全量科目宽表
+    报告期与条数单独查询 (每期一行)，科目行只取 (item_id, value)，不为每个单元格重复创建报告期字符串；
+    科目名从字典表一次读出
+    返回 DataFrame: 索引为 report_period (倒序)，列为科目名 (按首次入库顺序)
+    """
+    params = [stock_code]
+    period_filter = ''
+    if periods is not None:
+        periods = list(periods)
+        if not periods:
+            return pd.DataFrame()
+        period_filter = f" AND report_period IN ({', '.join(['?'] * len(periods))})"
+        params += periods
+
+    # 两次查询放在同一个读事务里，避免中途有写入导致条数与科目行对不上
+    own_transaction = not conn.in_transaction
+    if own_transaction:
+        conn.execute("BEGIN")
+    try:
+        counts = conn.execute(LOAD_PERIODS_SQL.format(period_filter=period_filter), params).fetchall()
+        rows = conn.execute(LOAD_ITEMS_SQL.format(period_filter=period_filter), params).fetchall()
+    finally:
+        if own_transaction:
+            conn.commit()
+    if not rows:
+        return pd.DataFrame()
+    names = dict(conn.execute("SELECT item_id, item_name FROM report_items"))
+
+    # 按 (报告期, 科目) 编码后一次性填充矩阵；报告期正序读出，倒序填入
+    row_codes = np.repeat(np.arange(len(counts))[::-1], [n for _, n in counts])
+    item_ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+    col_labels, col_codes = np.unique(item_ids, return_inverse=True)
+    try:
+        values = np.fromiter((r[1] for r in rows), dtype=float, count=len(rows))
+        matrix = np.full((len(counts), len(col_labels)), np.nan)
+    except (TypeError, ValueError):
+        # 旧 JSON 迁移来的非数值 (如日期字符串) 保持原样
+        values = np.array([r[1] for r in rows], dtype=object)
+        matrix = np.full((len(counts), len(col_labels)), None, dtype=object)
+    matrix[row_codes, col_codes] = values
+
+    index = pd.Index([period for period, _ in reversed(counts)], name='report_period')
+    return pd.DataFrame(matrix, index=index, columns=[names[i] for i in col_labels])
@@ -0,0 +1,212 @@
+"""
+参数化查询层：UI / 计算 / 验证共用的读写函数
+- 所有取值都用绑定参数，SQL 文本固定，命中连接的预编译语句缓存 (db.CACHED_STATEMENTS)
+- 动态列名 (如手动修正的字段) 只接受 schema 白名单中的列
+- 连接来自 db.get_conn (线程复用)，调用方不需要管理连接
+- 热点查询的 SQL 是模块常量 (*_SQL)，check_query_plans.py 直接导入检查执行计划
+"""
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, Optional
+
+import pandas as pd
+
+from database import schema_columns
+from db import get_conn
+from report_items import load_items
+
+DB_PATH = Path(__file__).parent / "finance.db"
+
+RAW_TABLE = 'financial_reports_raw'
+# 允许按名称读写的原始数据列 (不含主键与审计列)
+RAW_FIELDS = schema_columns(RAW_TABLE) - {'id', 'stock_code', 'report_period', 'updated_at', 'row_hash'}
+
+
+# --- 热点查询 (check_query_plans.py 导入检查，改动这里即改动被检查的语句) ---
+LATEST_INDICATORS_SQL = (
+    "SELECT * FROM financial_indicators_derived WHERE stock_code = ? ORDER BY report_period DESC LIMIT 1"
+)
+RAW_HISTORY_SQL = "SELECT * FROM financial_reports_raw WHERE stock_code = ? ORDER BY report_period DESC"
+DERIVED_HISTORY_SQL = "SELECT * FROM financial_indicators_derived WHERE stock_code = ? ORDER BY report_period DESC"
+PERIODS_SQL = "SELECT report_period FROM financial_reports_raw WHERE stock_code = ? ORDER BY report_period DESC"
+HAS_DATA_SQL = "SELECT 1 FROM financial_reports_raw WHERE stock_code = ? LIMIT 1"
+REPORT_STATUSES_SQL = (
+    "SELECT report_period, report_type, data_quality FROM financial_reports_raw "
+    "WHERE stock_code = ? ORDER BY report_period DESC"
+)
+# {fields}: 经 _check_fields 校验的列名
+RAW_ROW_SQL = "SELECT {fields} FROM financial_reports_raw WHERE stock_code = ? AND report_period = ?"
+FILES_FOR_SQL = "SELECT * FROM financial_reports_files WHERE stock_code = ? AND report_period = ?"
+TXT_PATH_SQL = (
+    "SELECT txt_path FROM financial_reports_files "
+    "WHERE stock_code = ? AND report_period = ? AND txt_path IS NOT NULL LIMIT 1"
+)
+STOCKS_WITH_TXT_SQL = (
+    "SELECT DISTINCT stock_code FROM financial_reports_files WHERE txt_path IS NOT NULL ORDER BY stock_code"
+)
+# 参数为当前指标公式版本；{code_filter}: 全市场时为空，单只股票时为 " AND r.stock_code = ?"
+STALE_PERIODS_SQL = '''
+    SELECT r.stock_code, r.report_period
+    FROM financial_reports_raw r
+    LEFT JOIN financial_indicators_derived d
+      ON d.stock_code = r.stock_code AND d.report_period = r.report_period
+    WHERE (d.id IS NULL OR r.updated_at IS NOT d.source_updated_at OR d.formula_version IS NOT ?){code_filter}
+'''
+
+
+def _frame(cursor) -> pd.DataFrame:
+    """游标结果 → DataFrame (比 pd.read_sql 少一层封装，列类型一致)"""
+    columns = [d[0] for d in cursor.description]
+    return pd.DataFrame.from_records(cursor.fetchall(), columns=columns, coerce_float=True)
+
+
+def _check_fields(fields: Iterable[str]) -> list:
+    fields = list(fields)
+    unknown = [f for f in fields if f not in RAW_FIELDS]
+    if unknown:
+        raise ValueError(f"未知的原始数据字段: {unknown}")
+    return fields
+
+
+# --- 1. 读：UI ---
+
+def latest_indicators(code: str, db_path=DB_PATH) -> pd.DataFrame:
+    """最新一期衍生指标 (0 或 1 行)"""
+    return _frame(get_conn(db_path).execute(LATEST_INDICATORS_SQL, (code,)))
+
+
+def history(code: str, db_path=DB_PATH) -> tuple:
+    """全部报告期的 (原始数据, 衍生指标)，报告期倒序"""
+    conn = get_conn(db_path)
+    df_raw = _frame(conn.execute(RAW_HISTORY_SQL, (code,)))
+    df_derived = _frame(conn.execute(DERIVED_HISTORY_SQL, (code,)))
+    return df_raw, df_derived
+
+
+def periods(code: str, db_path=DB_PATH) -> list:
+    """已入库的报告期 (倒序)"""
+    rows = get_conn(db_path).execute(PERIODS_SQL, (code,)).fetchall()
+    return [r[0] for r in rows]
+
+
+def has_data(code: str, db_path=DB_PATH) -> bool:
+    """本地是否已有该股票的原始数据"""
+    row = get_conn(db_path).execute(HAS_DATA_SQL, (code,)).fetchone()
+    return row is not None
+
+
+def report_statuses(code: str, db_path=DB_PATH) -> list:
+    """[(report_period, report_type, data_quality)]，报告期倒序 (走覆盖索引 idx_raw_quality)"""
+    return get_conn(db_path).execute(REPORT_STATUSES_SQL, (code,)).fetchall()
+
+
+def raw_row(code: str, period: str, fields: Iterable[str], db_path=DB_PATH) -> Optional[dict]:
+    """某个报告期的指定字段 {字段: 值}，报告期不存在时返回 None"""
+    fields = _check_fields(fields)
+    row = get_conn(db_path).execute(RAW_ROW_SQL.format(fields=', '.join(fields)), (code, period)).fetchone()
+    return dict(zip(fields, row)) if row else None
+
+
+def files_for(code: str, period: str, db_path=DB_PATH) -> list:
+    """某个报告期已下载的文件记录 (dict 列表)"""
+    cursor = get_conn(db_path).execute(FILES_FOR_SQL, (code, period))
+    columns = [d[0] for d in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def txt_path(code: str, period: str, db_path=DB_PATH) -> Optional[str]:
+    """某个报告期已解析出的 TXT 路径 (记录中的原样路径)，没有时返回 None (走覆盖索引 idx_files_txt)"""
+    row = get_conn(db_path).execute(TXT_PATH_SQL, (code, period)).fetchone()
+    return row[0] if row else None
+
+
+def stocks_with_txt(db_path=DB_PATH) -> list:
+    """已解析出 TXT 的股票代码列表 (走覆盖索引 idx_files_txt)"""
+    return [row[0] for row in get_conn(db_path).execute(STOCKS_WITH_TXT_SQL)]
+
+
+def full_items(code: str, periods: Optional[Iterable[str]] = None, db_path=DB_PATH) -> pd.DataFrame:
+    """全量科目宽表 (行: 报告期倒序, 列: 接口原始科目)，见 report_items.load_items"""
+    return load_items(get_conn(db_path), code, periods=periods)
+
+
+# --- 2. 读：指标计算 ---
+
+def raw_inputs(columns: Iterable[str], stock_codes=None, db_path=DB_PATH) -> pd.DataFrame:
+    """
+    指标计算所需的原始字段 (按股票、报告期正序)，另带 report_type (年报判断) 与 updated_at
+    stock_codes 为 None 时读取全市场
+    """
+    columns = ', '.join(['stock_code', 'report_period', 'report_type', 'updated_at'] + _check_fields(columns))
+    sql = f"SELECT {columns} FROM financial_reports_raw"
+    conn = get_conn(db_path)
+    if stock_codes is None:
+        return _frame(conn.execute(f"{sql} ORDER BY stock_code, report_period ASC"))
+
+    # 分批绑定参数，避免超过 SQLite 的变量个数上限；批大小固定，只产生两种 SQL 文本
+    frames = []
+    stock_codes = list(stock_codes)
+    for i in range(0, len(stock_codes), 500):
+        batch = stock_codes[i:i + 500]
+        placeholders = ', '.join(['?'] * len(batch))
+        frames.append(_frame(conn.execute(f"{sql} WHERE stock_code IN ({placeholders})", batch)))
+    df = pd.concat(frames, ignore_index=True)
+    return df.sort_values(['stock_code', 'report_period'], kind='stable', ignore_index=True)
+
+
+def stale_periods(formula_version: int, code: Optional[str] = None, db_path=DB_PATH) -> pd.DataFrame:
+    """
+    指标过期的报告期 [stock_code, report_period]：没有指标，指标所依据的原始行版本已变化，
+    或指标是按旧版公式 (formula_version 不同，含升级前留下的 NULL) 算的
+    code 为 None 时检查全市场
+    """
+    conn = get_conn(db_path)
+    if code is None:
+        return _frame(conn.execute(STALE_PERIODS_SQL.format(code_filter=''), (formula_version,)))
+    return _frame(conn.execute(STALE_PERIODS_SQL.format(code_filter=" AND r.stock_code = ?"), (formula_version, code)))
+
+
+# --- 3. 写 ---
+
+def update_raw(code: str, period: str, values: dict, lock: bool = False, db_path=DB_PATH) -> int:
+    """
+    更新某个报告期的若干字段 (同时更新 updated_at，触发增量指标计算)
+    lock=True 时标记为手动修正并锁定，之后的抓取不会覆盖
+    返回受影响的行数
+    """
+    fields = _check_fields(values)
+    set_clauses = [f"{f} = ?" for f in fields] + ["updated_at = ?"]
+    params = [values[f] for f in fields] + [datetime.now().isoformat()]
+    if lock:
+        set_clauses += ["is_locked = 1", "data_quality = 'MANUAL'"]
+    conn = get_conn(db_path)
+    with conn:
+        cursor = conn.execute(
+            f"UPDATE financial_reports_raw SET {', '.join(set_clauses)} WHERE stock_code = ? AND report_period = ?",
+            params + [code, period]
+        )
+    return cursor.rowcount
+
+
+def set_quality(code: str, period: str, status: str, details_json: Optional[str] = None, db_path=DB_PATH):
+    """更新数据质量标记和验证详情"""
+    conn = get_conn(db_path)
+    with conn:
+        conn.execute(
+            "UPDATE financial_reports_raw SET data_quality = ?, validation_details = ? "
+            "WHERE stock_code = ? AND report_period = ?",
+            (status, details_json, code, period)
+        )
+
+
+def record_file(code: str, period: str, report_type: str, file_path: str, txt_path: Optional[str],
+                file_size: int, parse_status: str, file_type: str = 'PDF',
+                sha256: Optional[str] = None, etag: Optional[str] = None, db_path=DB_PATH):
+    """记录 (或覆盖) 一个已下载的财报文件"""
+    conn = get_conn(db_path)
+    with conn:
+        conn.execute('''
+            INSERT OR REPLACE INTO financial_reports_files
+            (stock_code, report_period, report_type, file_type, file_path, txt_path, download_date, file_size, parse_status, sha256, etag)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (code, period, report_type, file_type, file_path, txt_path, datetime.now().isoformat(), file_size, parse_status, sha256, etag))
@@ -0,0 +1,130 @@
+"""
+财报 TXT 的页/章节索引 (与 TXT 同名的 .idx.json 旁路文件)
+- pages: 每页在 TXT 中的字节区间 [start, end)
+- sections: 按标题定位的章节页码区间 [首页, 末页] (0 起)，见 SECTIONS
+- read_sections: 按字节偏移只读取相关页，供 LLM / 正则提取使用
+
+用法:
+    from sections import read_sections
+    text = read_sections(txt_path, ['合并资产负债表', '合并利润表'])   # 没有索引时返回 None
+"""
+import json
+import os
+import re
+from pathlib import Path
+
+INDEX_VERSION = 1
+
+# 章节标题 (允许 "一、" / "（一）" / "1." 等序号前缀和 "（续）" 后缀，整行匹配)
+_PREFIX = r'[ \t]*(?:[一二三四五六七八九十]+、|[（(][一二三四五六七八九十\d]+[）)]|\d+[、.．])?[ \t]*'
+_SUFFIX = r'[ \t]*(?:[（(]续[）)])?[ \t]*'
+SECTIONS = {
+    '主要会计数据': r'主要会计数据(?:和财务指标)?',
+    '合并资产负债表': r'合并资产负债表',
+    '合并利润表': r'合并利润表',
+    '合并现金流量表': r'合并现金流量表',
+}
+# 报表之间的分界 (母公司报表等)：章节在下一个分界标题所在页结束
+BOUNDARIES = {
+    '母公司资产负债表': r'(?:母公司)?资产负债表',
+    '母公司利润表': r'(?:母公司)?利润表',
+    '母公司现金流量表': r'(?:母公司)?现金流量表',
+    '所有者权益变动表': r'(?:合并|母公司)?(?:所有者|股东)权益变动表',
+}
+# 单个章节最多跨越的页数
+MAX_SECTION_PAGES = {'主要会计数据': 3}
+DEFAULT_SECTION_PAGES = 6
+
+_HEADING_NAMES = list(SECTIONS) + list(BOUNDARIES)
+_HEADING = re.compile(
+    _PREFIX
+    + '(?:' + '|'.join(f'(?P<h{i}>{p})' for i, p in enumerate(list(SECTIONS.values()) + list(BOUNDARIES.values()))) + ')'
+    + _SUFFIX
+)
+# 标题中必然出现的词：先用字面量定位，再只对所在行做整行匹配，不用多行锚定扫描整页
+_STEMS = re.compile('资产负债表|利润表|现金流量表|权益变动表|主要会计数据')
+# 目录页：标题后跟引导点或页码
+_TOC_LINE = re.compile(r'(?:\.{4,}|…{2,}|·{4,})\s*\d*\s*$|^\s*目\s*录\s*$', re.MULTILINE)
+
+
+def find_headings(text):
+    """返回一页文本中出现的章节/分界标题名 (目录页返回空列表)"""
+    names = []
+    for m in _STEMS.finditer(text):
+        start = text.rfind('\n', 0, m.start()) + 1
+        end = text.find('\n', m.end())
+        heading = _HEADING.fullmatch(text, start, end if end >= 0 else len(text))
+        if heading:
+            names.append(_HEADING_NAMES[int(heading.lastgroup[1:])])
+    if names and _TOC_LINE.search(text):
+        return []
+    return list(dict.fromkeys(names))
+
+
+def build_sections(page_headings):
+    """
+    page_headings: 每页的标题名列表 (find_headings 的结果)
+    返回 {章节名: [首页, 末页]}，章节取第一次出现的标题页，到下一个标题所在页为止
+    """
+    starts = [(page, name) for page, names in enumerate(page_headings) for name in names]
+    sections = {}
+    for i, (page, name) in enumerate(starts):
+        if name not in SECTIONS or name in sections:
+            continue
+        limit = page + MAX_SECTION_PAGES.get(name, DEFAULT_SECTION_PAGES) - 1
+        following = [p for p, n in starts[i + 1:] if n != name and p >= page]
+        end = following[0] if following else limit
+        sections[name] = [page, min(end, limit, len(page_headings) - 1)]
+    return sections
+
+
+def index_path(txt_path):
+    txt_path = Path(txt_path)
+    return txt_path.with_name(txt_path.stem + '.idx.json')
+
+
+def write_index(txt_path, pages, page_headings):
+    """写入索引 (原子替换)，pages 为每页的字节区间"""
+    path = index_path(txt_path)
+    tmp_path = path.with_name(path.name + '.part')
+    index = {'version': INDEX_VERSION, 'pages': pages, 'sections': build_sections(page_headings)}
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    return index
+
+
+def load_index(txt_path):
+    """读取索引；不存在、版本不符或比 TXT 旧时返回 None"""
+    path = index_path(txt_path)
+    try:
+        if path.stat().st_mtime < Path(txt_path).stat().st_mtime:
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return index if index.get('version') == INDEX_VERSION else None
+
+
+def read_sections(txt_path, names=None, index=None):
+    """
+    按字节偏移只读取指定章节所在的页 (按页序拼接，重叠页只读一次)
+    names 为 None 时读取全部已定位的章节
+    没有索引或一个章节都没定位到时返回 None，调用方应退回全文
+    """
+    index = index or load_index(txt_path)
+    if not index:
+        return None
+    sections = index['sections']
+    names = list(sections) if names is None else [n for n in names if n in sections]
+    if not names:
+        return None
+    pages = sorted({p for n in names for p in range(sections[n][0], sections[n][1] + 1)})
+    chunks = []
+    with open(txt_path, 'rb') as f:
+        for p in pages:
+            start, end = index['pages'][p]
+            f.seek(start)
+            chunks.append(f.read(end - start))
+    return b"\n".join(chunks).decode('utf-8', errors='ignore')
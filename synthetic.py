@@ -0,0 +1,640 @@
+"""
+合成数据与本地桩服务 (不访问网络，不修改 finance.db)
+benchmark.py 的计时与 tests/ 的正确性校验共用同一套数据工厂：
+- 合成股票代码、报告期、原始报表记录，建临时库
+- 新浪 / 东方财富接口格式的报表、akshare 桩接口、巨潮资讯桩服务
+- 合成年报 (逐页文本、PDF、TXT + 章节索引)、本地假模型
+"""
+import ast
+import contextlib
+import hashlib
+import io
+import json
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs
+
+import pandas as pd
+
+import repository
+from database import init_db
+from db import get_conn
+from field_mapping import HK_FIELDS
+from fetchers.base_fetcher import BaseFetcher
+
+# 合成数据使用的字段 (与 AShareFetcher 写入的字段一致)
+SYNTHETIC_FIELDS = [
+    'revenue', 'cost_of_revenue', 'gross_profit', 'selling_expenses', 'admin_expenses',
+    'rd_expenses', 'financial_expenses', 'income_tax_expenses', 'investment_income',
+    'operating_income', 'total_profit', 'net_income', 'net_income_parent', 'net_income_deducted',
+    'total_assets', 'current_assets', 'non_current_assets', 'total_liabilities',
+    'current_liabilities', 'non_current_liabilities', 'total_equity', 'share_capital',
+    'retained_earnings', 'cash_equivalents', 'accounts_receivable', 'inventory', 'fixed_assets',
+    'intangible_assets', 'goodwill', 'short_term_debt', 'long_term_debt', 'accounts_payable',
+    'contract_liabilities', 'cfo_net', 'cfi_net', 'cff_net', 'net_cash_flow', 'capex',
+    'cash_paid_for_dividends', 'eps_basic'
+]
+
+
+class NullFetcher(BaseFetcher):
+    """不抓取任何数据的 Fetcher，只用来调用 save_many 写库"""
+    def fetch_financial_data(self, stock_code: str):
+        return True
+
+    def _download(self, stock_code: str):
+        return ()
+
+    def _build_records(self, stock_code: str, *frames):
+        return []
+
+
+def make_stock_codes(n):
+    return [f"{600000 + i:06d}" for i in range(n)]
+
+
+def make_periods(start_year=2010, end_year=2024):
+    periods = []
+    for year in range(start_year, end_year + 1):
+        for month_day, rtype in (('03-31', 'Q1'), ('06-30', 'S1'), ('09-30', 'Q3'), ('12-31', 'A')):
+            periods.append((f"{year}-{month_day}", rtype))
+    return periods
+
+
+def make_march_periods(start_year=2010, end_year=2024):
+    """3 月 31 日年结 (港股常见) 的报告期：3 月为年报，6 / 9 / 12 月为 Q1 / S1 / Q3"""
+    periods = []
+    for year in range(start_year, end_year + 1):
+        for month_day, rtype in (('03-31', 'A'), ('06-30', 'Q1'), ('09-30', 'S1'), ('12-31', 'Q3')):
+            periods.append((f"{year}-{month_day}", rtype))
+    return periods
+
+
+def make_records(periods, rng):
+    records = []
+    for period, rtype in periods:
+        data = {f: rng.uniform(-1e9, 1e11) for f in SYNTHETIC_FIELDS}
+        records.append((period, rtype, data))
+    return records
+
+
+def fresh_db(tmp_dir, name):
+    db_path = Path(tmp_dir) / name
+    with contextlib.redirect_stdout(io.StringIO()):
+        init_db(db_path)
+    return db_path
+
+
+def universe_db(tmp_dir, name, codes, rng, gap_rate=0.1):
+    """临时库：每只股票随机缺失部分报告期，每 5 只中有 1 只为 3 月年结"""
+    db_path = fresh_db(tmp_dir, name)
+    fetcher = NullFetcher(db_path=db_path)
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i, code in enumerate(codes):
+            periods = make_march_periods() if i % 5 == 4 else make_periods()
+            fetcher.save_many(code, make_records([p for p in periods if rng.random() >= gap_rate], rng))
+    return db_path
+
+
+def indicator_table(db_path):
+    """financial_indicators_derived 全表 (按股票、报告期排序，不含自增 id)"""
+    df = repository._frame(get_conn(db_path).execute(
+        "SELECT * FROM financial_indicators_derived ORDER BY stock_code, report_period"
+    ))
+    return df.drop(columns=['id'])
+
+
+def make_raw_frame(stock_code, periods, rng):
+    """构造一只股票的原始报表 (含空值与 0 分母，用于覆盖边界情况)"""
+    rows = []
+    for period, rtype in periods:
+        row = {'stock_code': stock_code, 'report_period': period, 'report_type': rtype}
+        for f in SYNTHETIC_FIELDS:
+            roll = rng.random()
+            row[f] = None if roll < 0.05 else (0.0 if roll < 0.08 else rng.uniform(-1e9, 1e11))
+        rows.append(row)
+    df = pd.DataFrame(rows)
+    df['report_period'] = pd.to_datetime(df['report_period'])
+    return df.set_index('report_period')
+
+
+def load_sina_columns(path=Path(__file__).parent / "cols_debug.txt"):
+    """读取 debug_akshare_cols.py 导出的新浪三大报表列名 {报表名: [列名...]}"""
+    columns = {}
+    lines = path.read_text(encoding='utf-8').splitlines()
+    for line, nxt in zip(lines, lines[1:]):
+        if line.startswith('=== '):
+            columns[line.strip('= ').replace('列名', '')] = ast.literal_eval(nxt.strip())
+    return columns
+
+
+def make_sina_frame(columns, rng, start_year=2005, end_year=2024):
+    """按新浪接口的真实列布局构造一张报表 (字符串数值、千分位、'--' 与空串)"""
+    rows = []
+    for year in range(start_year, end_year + 1):
+        for month_day in ('0331', '0630', '0930', '1231'):
+            row = {}
+            for col in columns:
+                roll = rng.random()
+                row[col] = '--' if roll < 0.03 else ('' if roll < 0.06 else f"{rng.uniform(1e6, 1e10):,.2f}")
+            row['报告日'] = f"{year}{month_day}"
+            row['公告日期'] = f"{year + 1}0415"
+            rows.append(row)
+    return pd.DataFrame(rows)
+
+
+# 新浪三大报表 (akshare symbol 参数)
+SINA_STATEMENTS = ('利润表', '资产负债表', '现金流量表')
+
+
+def make_sina_statements(columns, rng):
+    """一只股票的新浪三大报表 (利润表, 资产负债表, 现金流量表)"""
+    return tuple(make_sina_frame(columns[name], rng) for name in SINA_STATEMENTS)
+
+
+class StubAkshare:
+    """
+    本地桩接口：与 akshare.stock_financial_report_sina 参数相同，固定延迟后返回合成的新浪报表
+    记录每次调用的时间与同时在途的请求数；按 error_rate 抛出 requests.ConnectionError (可重试)，
+    bad_codes 中的股票抛出 KeyError (模拟代码错误，不应重试)
+    """
+
+    def __init__(self, frames, latency, error_rate, bad_codes=()):
+        self.frames = frames
+        self.latency = latency
+        self.error_rate = error_rate
+        self.bad_codes = set(bad_codes)
+        self.times = []
+        self.calls = {}
+        self.errors = {}
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._rng = random.Random(13)
+        self._lock = threading.Lock()
+
+    def stock_financial_report_sina(self, stock, symbol):
+        import requests
+
+        with self._lock:
+            self.times.append(time.monotonic())
+            self.calls[stock] = self.calls.get(stock, 0) + 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            fail = stock not in self.bad_codes and self._rng.random() < self.error_rate
+            if fail:
+                self.errors[stock] = self.errors.get(stock, 0) + 1
+        try:
+            time.sleep(self.latency)
+            if stock in self.bad_codes:
+                raise KeyError(f"result: {stock}")
+            if fail:
+                raise requests.ConnectionError("模拟连接中断")
+            frames = self.frames[int(stock) % len(self.frames)]
+            return frames[SINA_STATEMENTS.index(symbol)]
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+def make_hk_long_frames(stock_code, rng, start_year=2010, end_year=2024, extra_items=60):
+    """按东方财富港股接口的长表格式构造三大报表 (每行一个 报告期 × 科目)"""
+    frames = []
+    for statement in ('income', 'balance', 'cash'):
+        items = [cands[0] for st, cands in HK_FIELDS.values() if st == statement]
+        items += [f"{statement}_科目{i:03d}" for i in range(extra_items)]
+        rows = []
+        for year in range(start_year, end_year + 1):
+            for month_day in ('03-31', '06-30', '09-30', '12-31'):
+                for i, item in enumerate(items):
+                    if rng.random() < 0.1:
+                        continue
+                    rows.append({
+                        'SECUCODE': f"{stock_code}.HK", 'SECURITY_CODE': stock_code,
+                        'SECURITY_NAME_ABBR': f"港股{stock_code}", 'ORG_CODE': f"ORG{stock_code}",
+                        'REPORT_DATE': f"{year}-{month_day} 00:00:00", 'DATE_TYPE_CODE': month_day[:2],
+                        'FISCAL_YEAR': '12-31', 'STD_ITEM_CODE': f"{i:06d}", 'STD_ITEM_NAME': item,
+                        'AMOUNT': float(round(rng.uniform(-1e9, 1e11))), 'STD_REPORT_DATE': f"{year}-{month_day}",
+                    })
+        frames.append(pd.DataFrame(rows))
+    return frames
+
+
+def make_hk_records(codes, rng):
+    """按东方财富长表合成、经 HKShareFetcher._build_records 清洗后的记录：每只股票 [(报告期, 类型, 核心字段, 全量科目)]"""
+    from fetchers.hk_share import HKShareFetcher
+
+    fetcher = HKShareFetcher.__new__(HKShareFetcher)
+    return [fetcher._build_records('00000', *make_hk_long_frames(code, rng)) for code in codes]
+
+
+def raw_json_db(tmp_dir, name, codes, samples):
+    """迁移到长表之前的旧格式库：全量科目以整行 JSON 存在 raw_data 中 (codes 循环复用 samples)"""
+    db_path = fresh_db(tmp_dir, name)
+    with sqlite3.connect(db_path) as conn:
+        for i, code in enumerate(codes):
+            conn.executemany(
+                "INSERT INTO financial_reports_raw (stock_code, report_period, report_type, raw_data) VALUES (?, ?, ?, ?)",
+                [(code, period, rtype, json.dumps(items, ensure_ascii=False)) for period, rtype, _, items in samples[i % len(samples)]]
+            )
+        conn.commit()
+        conn.execute("VACUUM")
+    conn.close()
+    return db_path
+
+
+class CninfoStubHandler(BaseHTTPRequestHandler):
+    """
+    本地巨潮资讯桩服务：orgId 查询、公告分页查询、静态 PDF
+    每只股票近 3 年 12 份定期报告 + 4 份摘要，每页 5 条；每个请求固定延迟 server.latency 秒
+    """
+    protocol_version = "HTTP/1.1"
+    PAGE_SIZE = 5
+    REPORTS = [f"{y}年{name}" for y in (2022, 2023, 2024) for name in ("第一季度报告", "半年度报告", "第三季度报告", "年度报告")]
+    TITLES = REPORTS + [f"{y}年年度报告摘要" for y in (2021, 2022, 2023, 2024)]
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, body, content_type):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        time.sleep(self.server.latency)
+        self.server.count('query')
+        form = {k: v[0] for k, v in parse_qs(self.rfile.read(int(self.headers['Content-Length'])).decode()).items()}
+        if self.path.endswith("/topSearch/query"):
+            payload = [{"code": form['keyWord'], "orgId": f"gs{form['keyWord']}"}]
+        else:
+            code = form['stock'].split(',')[0]
+            page = int(form['pageNum'])
+            rows = self.TITLES[(page - 1) * self.PAGE_SIZE: page * self.PAGE_SIZE]
+            payload = {
+                "announcements": [
+                    {"announcementTitle": f"{code}<em>{title}</em>", "adjunctUrl": f"finalpage/{code}/{i + (page - 1) * self.PAGE_SIZE}.PDF"}
+                    for i, title in enumerate(rows)
+                ],
+                "hasMore": page * self.PAGE_SIZE < len(self.TITLES),
+            }
+        self._reply(json.dumps(payload, ensure_ascii=False).encode('utf-8'), "application/json")
+
+    def do_GET(self):
+        time.sleep(self.server.latency)
+        self.server.count('pdf')
+        body = self.server.pdf_bytes
+        total = len(body)
+        start = 0
+        # 断点续传：If-Range 与 ETag 一致时只返回剩余部分 (206)
+        range_header = self.headers.get('Range')
+        if range_header and self.headers.get('If-Range') == self.server.etag:
+            start = int(range_header.split('=')[1].split('-')[0])
+            if start >= total:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{total}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{total - 1}/{total}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Type", "application/pdf")
+        self.send_header("Content-Length", str(total - start))
+        self.send_header("ETag", self.server.etag)
+        self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+
+        end = total
+        if self.server.drop_rate and self.server.rng.random() < self.server.drop_rate:
+            # 模拟传输中途断线：只发一半就关闭连接
+            end = start + (total - start) // 2
+            self.close_connection = True
+        self.wfile.write(body[start:end])
+        self.server.count('bytes', end - start)
+
+
+class CninfoStub(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency, pdf_kb, drop_rate=0.0):
+        super().__init__(("127.0.0.1", 0), CninfoStubHandler)
+        self.latency = latency
+        self.drop_rate = drop_rate
+        self.rng = random.Random(17)
+        self.pdf_bytes = b"%PDF-1.4\n" + os.urandom(pdf_kb * 1024) + b"\n%%EOF\n"
+        self.etag = '"' + hashlib.sha256(self.pdf_bytes).hexdigest()[:16] + '"'
+        self.requests = {'query': 0, 'pdf': 0, 'bytes': 0}
+        self._lock = threading.Lock()
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def count(self, kind, n=1):
+        with self._lock:
+            self.requests[kind] += n
+
+
+class SleepParser:
+    """用 CPU 空转模拟 PDF 解析耗时 (不依赖 PyMuPDF)，可被进程池序列化"""
+
+    def __init__(self, parse_ms):
+        self.parse_ms = parse_ms
+
+    def parse_pdf(self, pdf_path):
+        pdf_path = Path(pdf_path)
+        txt_path = pdf_path.with_suffix('.txt')
+        deadline = time.process_time() + self.parse_ms / 1000
+        while time.process_time() < deadline:
+            pass
+        txt_path.write_text(pdf_path.name, encoding='utf-8')
+        return txt_path
+
+
+def make_report_pdf(path, n_pages, rng):
+    """合成一份 n_pages 页的财报 PDF (每页 50 行科目与数值)"""
+    import fitz
+
+    doc = fitz.open()
+    for p in range(n_pages):
+        page = doc.new_page()
+        lines = [f"Item {p:04d}-{i:02d}  {rng.uniform(-1e9, 1e10):,.2f}  {rng.uniform(-1e9, 1e10):,.2f}" for i in range(50)]
+        page.insert_text((40, 40), "\n".join(lines), fontsize=8)
+    doc.save(path)
+    doc.close()
+
+
+def filler_lines(rng, n, topic):
+    return [f"{topic}第{i + 1}项：报告期内公司持续推进相关工作，投入金额 {rng.uniform(1e5, 1e8):,.2f} 元，较上年变动 {rng.uniform(-30, 30):.2f}%。"
+            for i in range(n)]
+
+
+def make_annual_report(rng, filler_pages=120, notes_pages=40, year=2023, unit='元', summary_unit='元', notes=False):
+    """
+    合成一份 A 股年报的逐页文本 (目录、年度亮点图表、主要会计数据、经营讨论、三大报表及母公司报表、附注)
+    unit / summary_unit: 报表与主要会计数据表头声明的金额单位，None 表示表头不声明单位 (金额为元)
+    notes: 报表带 "附注" 列 (科目名与金额之间的附注编号，旧正则会把它当成金额)
+    返回 (页文本列表, 真值 {字段: 元}, 期望的章节页码区间)
+    """
+    from extractors import UNITS
+
+    # 净利润不超过营业收入、股东权益不超过总资产
+    revenue = rng.uniform(1e9, 1e11)
+    net_margin = rng.uniform(0.02, 0.3)
+    total_assets = rng.uniform(1e10, 1e12)
+    truth = {
+        'revenue': round(revenue, 2),
+        'net_income_parent': round(revenue * net_margin, 2),
+        'total_assets': round(total_assets, 2),
+        'total_equity': round(total_assets * rng.uniform(0.2, 0.7), 2),
+    }
+    prev = {k: round(v * rng.uniform(0.8, 1.1), 2) for k, v in truth.items()}
+    parent = {k: round(v * rng.uniform(0.3, 0.7), 2) for k, v in truth.items()}
+
+    def amount(value, unit=unit):
+        return f"{value / UNITS[unit or '元']:,.2f}"
+
+    def declared(unit):
+        return f"单位：{unit} 币种：人民币" if unit else "币种：人民币"
+
+    header = f"{declared(unit)}\n项目{' 附注' if notes else ''} {year}年12月31日 {year - 1}年12月31日"
+
+    def row(item, values, key):
+        note = f" {rng.randint(1, 80)}" if notes else ""
+        return f"{item}{note} {amount(values[key])} {amount(prev[key])}"
+
+    pages = [f"股份有限公司\n{year}年年度报告", None, None]
+    # 年度亮点图表：横轴年份紧跟科目名 (旧正则会把年份当成金额)
+    pages[2] = "\n".join([
+        "年度经营亮点",
+        "营业收入", " ".join(str(y) for y in range(year - 4, year + 1)),
+        "归属于上市公司股东的净利润", " ".join(str(y) for y in range(year - 4, year + 1)),
+    ])
+    expected = {}
+    # 主要会计数据之后没有报表标题，按 MAX_SECTION_PAGES 取 3 页
+    expected['主要会计数据'] = [len(pages), len(pages) + 2]
+    pages.append("\n".join([
+        "第二节 公司简介和主要财务指标",
+        "七、主要会计数据和财务指标",
+        declared(summary_unit),
+        f"项目 {year}年 {year - 1}年 本年比上年增减(%)",
+        f"营业收入 {amount(truth['revenue'], summary_unit)} {amount(prev['revenue'], summary_unit)} {rng.uniform(-20, 20):.2f}",
+        f"归属于上市公司股东的净利润 {amount(truth['net_income_parent'], summary_unit)} {amount(prev['net_income_parent'], summary_unit)} {rng.uniform(-20, 20):.2f}",
+        f"总资产 {amount(truth['total_assets'], summary_unit)} {amount(prev['total_assets'], summary_unit)} {rng.uniform(-20, 20):.2f}",
+    ]))
+    for i in range(filler_pages):
+        pages.append("\n".join(["第三节 管理层讨论与分析"] + filler_lines(rng, 30, "经营情况")))
+
+    def statement(title, values, kind):
+        first = "\n".join([title, f"编制单位：股份有限公司", header] + filler_lines(rng, 25, "报表项目"))
+        if kind == 'bs':
+            second = "\n".join(filler_lines(rng, 20, "报表项目") + [
+                row("资产总计", values, 'total_assets'),
+                row("所有者权益合计", values, 'total_equity'),
+                row("负债和所有者权益总计", values, 'total_assets'),
+            ])
+        elif kind == 'is':
+            first = "\n".join([title, header,
+                               row("一、营业总收入", values, 'revenue'),
+                               # 营业收入是营业总收入的一部分 (另有利息、手续费等收入)
+                               row("其中：营业收入", {'revenue': values['revenue'] * 0.9}, 'revenue')] + filler_lines(rng, 20, "报表项目"))
+            second = "\n".join(filler_lines(rng, 20, "报表项目") + [
+                row("归属于母公司股东的净利润", values, 'net_income_parent'),
+            ])
+        else:
+            second = "\n".join(filler_lines(rng, 20, "报表项目") + [
+                f"五、现金及现金等价物净增加额{f' {rng.randint(1, 80)}' if notes else ''} "
+                f"{rng.uniform(-1e9, 1e9):,.2f} {rng.uniform(-1e9, 1e9):,.2f}",
+            ])
+        return [first, second]
+
+    pages.append("第十节 财务报告\n一、审计报告\n" + "\n".join(filler_lines(rng, 20, "审计事项")))
+    for title, kind, values in (
+        ("合并资产负债表", 'bs', truth), ("母公司资产负债表", 'bs', parent),
+        ("合并利润表", 'is', truth), ("母公司利润表", 'is', parent),
+        ("合并现金流量表", 'cf', truth), ("母公司现金流量表", 'cf', parent),
+    ):
+        if title.startswith("合并"):
+            # 章节到下一张报表的标题页为止
+            expected[title] = [len(pages), len(pages) + 2]
+        pages += statement(title, values, kind)
+    pages.append("合并所有者权益变动表\n" + "\n".join(filler_lines(rng, 25, "权益变动")))
+    for i in range(notes_pages):
+        pages.append("\n".join(["七、合并财务报表项目注释"] + filler_lines(rng, 30, "附注")))
+
+    toc = ["目录"] + [f"{name} {'.' * 12} {page + 1}" for name, (page, _) in expected.items()]
+    pages[1] = "\n".join(toc)
+    return pages, truth, expected
+
+
+def write_report_pdf(path, pages, columns=False):
+    """columns=True 时按表格排版：每行第一个词左对齐，其余词按固定列宽排开 (报表各列上下对齐)"""
+    import fitz
+
+    doc = fitz.open()
+    font = fitz.Font("china-s")
+    for text in pages:
+        page = doc.new_page()
+        if not columns:
+            page.insert_text((30, 30), text, fontname="china-s", fontsize=6)
+            continue
+        writer = fitz.TextWriter(page.rect)
+        for i, line in enumerate(text.split("\n")):
+            for j, token in enumerate(line.split(" ")):
+                writer.append((30 if j == 0 else 110 + 90 * j, 30 + 8 * i), token, font=font, fontsize=6)
+        writer.write_text(page)
+    doc.save(path)
+    doc.close()
+
+
+def write_report_txt(txt_path, pages):
+    """按 PDFParser 的格式写出 TXT (页间换行) 与章节索引"""
+    import sections
+
+    offsets, headings = [], []
+    with open(txt_path, 'wb') as f:
+        offset = 0
+        for i, text in enumerate(pages):
+            if i > 0:
+                offset += f.write(b"\n")
+            size = f.write(text.encode('utf-8'))
+            offsets.append([offset, offset + size])
+            headings.append(sections.find_headings(text))
+            offset += size
+    sections.write_index(txt_path, offsets, headings)
+
+
+def within_tolerance(extracted, truth, tolerance=0.02):
+    """提取值与真值相对误差在容差内的字段集合"""
+    return {f for f, v in truth.items()
+            if extracted.get(f) is not None and abs(extracted[f] - v) / max(abs(v), abs(extracted[f])) < tolerance}
+
+
+class FakeAPIError(Exception):
+    """模拟接口错误 (与 google.api_core 异常一样带 .code)"""
+
+    def __init__(self, code):
+        super().__init__(f"{code} 模拟接口错误")
+        self.code = code
+
+
+class FakeLLM:
+    """
+    本地假模型：与 genai.GenerativeModel 相同的 generate_content 接口，固定延迟后用正则引擎"读"原文返回 JSON
+    记录调用次数与输入字符数 (线程安全)；error_rate > 0 时按比例抛出 429 / 503
+    延迟 = latency + 每千字符 latency_per_kchar；批量提示词 (=== 报告期 X ===) 按期返回 {报告期: 结果}
+    """
+    model_name = 'fake-llm'
+
+    def __init__(self, latency=0.5, error_rate=0.0, latency_per_kchar=0.0):
+        from extractors import FieldExtractor
+        with contextlib.redirect_stdout(io.StringIO()):
+            from validator import FinancialDataValidator
+
+        self.latency = latency
+        self.extractor = FieldExtractor(FinancialDataValidator.CRITICAL_FIELDS)
+        self.error_rate = error_rate
+        self.latency_per_kchar = latency_per_kchar
+        self.calls = 0
+        self.errors = 0
+        self.prompt_chars = 0
+        self._rng = random.Random(22)
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt):
+        with self._lock:
+            self.calls += 1
+            self.prompt_chars += len(prompt)
+            error = self._rng.choice((429, 503)) if self._rng.random() < self.error_rate else None
+            if error:
+                self.errors += 1
+        time.sleep(self.latency + len(prompt) / 1000 * self.latency_per_kchar)
+        if error:
+            raise FakeAPIError(error)
+        blocks = re.split(r"=== 报告期 (\S+) ===", prompt)
+        if len(blocks) > 1:
+            result = json.dumps({
+                period: self._read(block.split("财报原文（节选）：", 1)[-1])
+                for period, block in zip(blocks[1::2], blocks[2::2])
+            })
+        else:
+            result = json.dumps(self._read(prompt.split("财报原文（节选）：", 1)[-1]))
+        return type("Response", (), {"text": f"```json\n{result}\n```"})()
+
+    def _read(self, text):
+        # 模型能看出没有声明单位的带两位小数的金额是元，不按数量级猜
+        return {field: match['raw'] if match['unit'] is None else match['value']
+                for field, match in self.extractor.scan(text).items()}
+
+
+def validation_fixture(tmp_dir, n_stocks, n_periods, filler_pages=20, hard_rate=0.0):
+    """
+    临时库 + 合成年报 TXT (含章节索引)：每只股票 n_periods 个年报期，原始数据与年报一致
+    hard_rate: 表头不声明金额单位的年报比例 (正则只能按数量级猜单位)
+    """
+    rng = random.Random(21)
+    db_path = fresh_db(tmp_dir, "validate.db")
+    targets = []
+    conn = get_conn(db_path)
+    for code in make_stock_codes(n_stocks):
+        for year in range(2024 - n_periods + 1, 2025):
+            period = f"{year}-12-31"
+            unit = None if rng.random() < hard_rate else '元'
+            pages, truth, _ = make_annual_report(rng, filler_pages=filler_pages, year=year, unit=unit, summary_unit=unit)
+            txt_path = Path(tmp_dir) / f"{code}_{year}.txt"
+            write_report_txt(txt_path, pages)
+            with conn:
+                conn.execute(
+                    "INSERT INTO financial_reports_raw (stock_code, report_period, report_type, revenue, net_income_parent, "
+                    "total_assets, total_equity) VALUES (?, ?, 'A', ?, ?, ?, ?)",
+                    (code, period, truth['revenue'], truth['net_income_parent'], truth['total_assets'], truth['total_equity'])
+                )
+            repository.record_file(code, period, 'A', str(txt_path.with_suffix('.pdf')), str(txt_path),
+                                   txt_path.stat().st_size, 'SUCCESS', db_path=db_path)
+            targets.append((code, period))
+    return db_path, targets
+
+
+def tables_fixture(tmp_dir, n_reports, filler_pages=20):
+    """
+    临时库 + 带附注列、按表格排版的合成年报 PDF (已解析出 TXT)：单位依次为 元 / 万元 / 不声明
+    每份报告在库中缺一个关键字段 (依次轮换)，留给结构化表格回填
+    返回 (库路径, [(股票, 报告期, PDF 路径, 真值, 缺失字段)])
+    """
+    from pdf_parser import PDFParser
+    with contextlib.redirect_stdout(io.StringIO()):
+        from validator import FinancialDataValidator
+
+    rng = random.Random(25)
+    fields = list(FinancialDataValidator.CRITICAL_FIELDS)
+    db_path = fresh_db(tmp_dir, "tables.db")
+    conn = get_conn(db_path)
+    corpus = []
+    for i in range(n_reports):
+        code, period = f"{600000 + i:06d}", "2023-12-31"
+        unit = ('元', '万元', None)[i % 3]
+        pages, truth, _ = make_annual_report(rng, filler_pages=filler_pages, unit=unit, summary_unit=unit, notes=True)
+        pdf_path = Path(tmp_dir) / f"{code}_{period[:4]}.pdf"
+        write_report_pdf(pdf_path, pages, columns=True)
+        missing = fields[i % len(fields)]
+        with conn:
+            conn.execute(
+                f"INSERT INTO financial_reports_raw (stock_code, report_period, report_type, {', '.join(fields)}) "
+                f"VALUES (?, ?, 'A', {', '.join('?' * len(fields))})",
+                (code, period, *[None if f == missing else truth[f] for f in fields])
+            )
+        repository.record_file(code, period, 'A', str(pdf_path), str(pdf_path.with_suffix('.txt')),
+                               pdf_path.stat().st_size, 'SUCCESS', db_path=db_path)
+        corpus.append((code, period, pdf_path, truth, missing))
+    with contextlib.redirect_stdout(io.StringIO()):
+        PDFParser(workers=1).parse_many([pdf_path for _, _, pdf_path, _, _ in corpus])
+    return db_path, corpus
@@ -0,0 +1,224 @@
+"""
+合并报表的结构化表格 (与 PDF 同名的 .tables.json 旁路文件)
+- 只处理章节索引 (sections.py) 定位到的三大合并报表页
+- 用 PyMuPDF 的单词坐标 (page.get_text('words')) 按行聚类、按表头的报告期列对齐，
+  重建 (科目, 本期, 上期) 行；附注编号列不落在报告期列上，被排除
+- 金额按原文保存，单位取自表头 "单位：元/万元"，lookup 时换算成元
+
+用法:
+    from tables import get_tables, lookup
+    tables = get_tables(pdf_path, txt_path)     # 有缓存直接读取，没有时解析并写出
+    lookup(tables, ['资产总计'])                # {'item', 'current', 'prior', 'unit', 'section'} (元)，找不到返回 None
+
+    python tables.py downloads/688005          # 为目录下已解析的 PDF 预先生成表格文件
+"""
+import json
+import os
+import re
+import sys
+from pathlib import Path
+
+import fitz  # PyMuPDF
+
+from extractors import UNITS
+from sections import find_headings, load_index
+
+TABLES_VERSION = 1
+TABLE_SECTIONS = ['合并资产负债表', '合并利润表', '合并现金流量表']
+
+# 金额：千分位、两位小数，括号或负号表示负数；"-" / "—" 表示空
+_AMOUNT = re.compile(r'[(（]?-?\d[\d,]*(?:\.\d+)?[)）]?')
+_BLANK = {'-', '—', '–', '--', '——'}
+# 表头中的报告期列 (如 "2023年12月31日" / "期末余额" / "本期发生额")
+_PERIOD_HEADER = re.compile(r'\d{4}\s*年|期末|期初|本期|上期|本年|上年')
+_UNIT = re.compile(r'单位\s*[：:]\s*(?:人民币)?\s*(' + '|'.join(sorted(UNITS, key=len, reverse=True)) + ')')
+# 科目名前的序号 / "其中：" 等，和末尾的填列说明
+_ITEM_PREFIX = re.compile(r'^(?:[一二三四五六七八九十]+、|[（(][一二三四五六七八九十\d]+[）)]|\d+[、.．]|其中[：:]|加[：:]|减[：:])+')
+_ITEM_SUFFIX = re.compile(r'[（(][^（）()]*(?:填列|列示)[^（）()]*[）)]$')
+
+
+def normalize_item(item):
+    """去掉科目名中的空白、序号前缀与填列说明，如 "一、营业总收入" → "营业总收入" """
+    item = re.sub(r'\s+', '', item)
+    return _ITEM_SUFFIX.sub('', _ITEM_PREFIX.sub('', item))
+
+
+def _parse_amount(token):
+    if not _AMOUNT.fullmatch(token):
+        return None
+    negative = token[0] in '(（'
+    value = float(token.strip('()（）').replace(',', ''))
+    return -value if negative else value
+
+
+def _rows(words):
+    """按纵坐标把单词聚成行，行内按横坐标排序：[[(x0, x1, 文本), ...], ...]"""
+    rows = []
+    for x0, y0, x1, y1, text, *_ in sorted(words, key=lambda w: ((w[1] + w[3]) / 2, w[0])):
+        mid = (y0 + y1) / 2
+        if rows and abs(mid - rows[-1][0]) <= max(2.0, (y1 - y0) * 0.4):
+            rows[-1][1].append((x0, x1, text))
+        else:
+            rows.append([mid, [(x0, x1, text)]])
+    return [sorted(cells) for _, cells in rows]
+
+
+def _parse_rows(rows, state):
+    """
+    把一页的行转成 [科目, 本期, 上期]
+    state: 跨页保留的 {'section': 章节名, 'anchors': 报告期列中心横坐标, 'note_x': 附注列中心横坐标, 'unit': 单位}，
+           续页没有表头时沿用；遇到其他报表的标题 (章节末页与下一张报表同页) 时置 'done' 并停止
+    """
+    out = []
+    pending_item = ''       # 只有科目名、没有金额的行 (可能是折行的科目名)
+    for cells in rows:
+        line = ''.join(text for _, _, text in cells)
+        headings = find_headings(line)
+        if headings and state['section'] not in headings:
+            state['done'] = True
+            break
+        unit = _UNIT.search(line)
+        if unit:
+            state['unit'] = unit.group(1)
+        headers = [(x0 + x1) / 2 for x0, x1, text in cells if _PERIOD_HEADER.search(text)]
+        if len(headers) >= 2:
+            state['anchors'] = headers[:2]
+            state['note_x'] = next(((x0 + x1) / 2 for x0, x1, text in cells if text == '附注'), None)
+            pending_item = ''
+            continue
+
+        item_parts, amounts = [], []
+        note_x = state.get('note_x')
+        for x0, x1, text in cells:
+            # 附注列 (如 "七、1")：中心落在附注表头左右各半个列距以内
+            if note_x is not None and abs((x0 + x1) / 2 - note_x) < (min(state['anchors']) - note_x) / 2:
+                continue
+            value = None if text in _BLANK else _parse_amount(text)
+            if value is None and text not in _BLANK and not amounts:
+                item_parts.append(text)
+            elif value is not None or text in _BLANK:
+                amounts.append(((x0 + x1) / 2, value))
+        item = normalize_item(''.join(item_parts))
+        if not amounts:
+            pending_item = item
+            continue
+        if not item:
+            item, pending_item = pending_item, ''
+        if not item:
+            continue
+
+        anchors = state.get('anchors')
+        if anchors:
+            # 金额按最近的报告期列归位，离两列都远的 (附注编号等) 丢弃
+            tolerance = max(abs(anchors[1] - anchors[0]) / 2, 1.0)
+            columns = [None, None]
+            for x, value in amounts:
+                distances = [abs(x - a) for a in anchors]
+                col = distances.index(min(distances))
+                if distances[col] <= tolerance:
+                    columns[col] = value
+        else:
+            # 没有表头时取最后两个金额
+            values = [value for _, value in amounts]
+            columns = (values[-2:] if len(values) >= 2 else values + [None])[:2]
+        if columns != [None, None]:
+            out.append([item] + columns)
+        pending_item = ''
+    return out
+
+
+def extract_tables(pdf_path, sections):
+    """
+    sections: {章节名: [首页, 末页]} (章节索引)
+    返回 {章节名: {'unit': 单位或 None, 'rows': [[科目, 本期, 上期], ...]}}，金额为原文数值
+    """
+    tables = {}
+    with fitz.open(pdf_path) as doc:
+        for name in TABLE_SECTIONS:
+            if name not in sections:
+                continue
+            first, last = sections[name]
+            state = {'section': name}
+            rows = []
+            for page_no in range(first, min(last + 1, doc.page_count)):
+                rows += _parse_rows(_rows(doc[page_no].get_text('words')), state)
+                if state.get('done'):
+                    break
+            tables[name] = {'unit': state.get('unit'), 'rows': rows}
+    return tables
+
+
+def tables_path(pdf_path):
+    pdf_path = Path(pdf_path)
+    return pdf_path.with_name(pdf_path.stem + '.tables.json')
+
+
+def load_tables(pdf_path):
+    """读取表格文件；不存在、版本不符或比 PDF 旧时返回 None"""
+    path = tables_path(pdf_path)
+    try:
+        if path.stat().st_mtime < Path(pdf_path).stat().st_mtime:
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return data['tables'] if data.get('version') == TABLES_VERSION else None
+
+
+def build_tables(pdf_path, txt_path=None):
+    """按 TXT 的章节索引解析报表页并写出表格文件 (原子替换)；没有索引时返回 None"""
+    index = load_index(txt_path or Path(pdf_path).with_suffix('.txt'))
+    if not index:
+        return None
+    tables = extract_tables(pdf_path, index['sections'])
+    path = tables_path(pdf_path)
+    tmp_path = path.with_name(path.name + '.part')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'version': TABLES_VERSION, 'tables': tables}, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(tmp_path, path)
+    return tables
+
+
+def get_tables(pdf_path, txt_path=None):
+    """有缓存读缓存，否则解析；PDF 不存在或没有章节索引时返回 None"""
+    if not Path(pdf_path).exists():
+        return None
+    tables = load_tables(pdf_path)
+    if tables is None:
+        tables = build_tables(pdf_path, txt_path)
+    return tables
+
+
+def lookup(tables, patterns, sections=None):
+    """
+    按关键词正则 (整名匹配规范化后的科目名，按列表顺序取优先级) 查找一行
+    返回 {'item', 'current', 'prior' (元), 'unit', 'section'}，找不到返回 None
+    """
+    for pattern in patterns:
+        regex = re.compile(pattern)
+        for name in sections or TABLE_SECTIONS:
+            table = tables.get(name)
+            if not table:
+                continue
+            scale = UNITS[table['unit']] if table['unit'] else 1
+            for item, current, prior in table['rows']:
+                if regex.fullmatch(item):
+                    return {
+                        'item': item,
+                        'current': current * scale if current is not None else None,
+                        'prior': prior * scale if prior is not None else None,
+                        'unit': table['unit'],
+                        'section': name,
+                    }
+    return None
+
+
+if __name__ == "__main__":
+    target_dir = Path(sys.argv[1]) if len(sys.argv) > 1 else Path(__file__).parent / "downloads"
+    pdfs = sorted(target_dir.rglob("*.pdf"))
+    built = 0
+    for pdf_path in pdfs:
+        if load_tables(pdf_path) is None and build_tables(pdf_path) is not None:
+            built += 1
+    print(f"📊 {len(pdfs)} 份 PDF，新生成表格文件 {built} 份")
@@ -0,0 +1,40 @@
+"""
+测试公用夹具 (合成数据工厂与本地桩服务在 synthetic.py，与 benchmark.py 共用)
+"""
+import random
+
+import pytest
+
+from synthetic import CninfoStub, fresh_db, validation_fixture
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """已建表并迁移到最新版本的空临时库"""
+    return fresh_db(tmp_path, "test.db")
+
+
+@pytest.fixture
+def rng():
+    return random.Random(7)
+
+
+@pytest.fixture
+def cninfo_stub():
+    """启动本地巨潮资讯桩服务：cninfo_stub(pdf_kb=64, latency=0.0, drop_rate=0.0)，测试结束时关闭"""
+    stubs = []
+
+    def start(pdf_kb=64, latency=0.0, drop_rate=0.0):
+        stub = CninfoStub(latency, pdf_kb, drop_rate=drop_rate)
+        stubs.append(stub)
+        return stub
+
+    yield start
+    for stub in stubs:
+        stub.shutdown()
+
+
+@pytest.fixture
+def validation_db(tmp_path):
+    """3 只股票 × 2 个年报期的验证库与合成 TXT：(库路径, [(股票, 报告期)])"""
+    return validation_fixture(tmp_path, 3, 2, filler_pages=5)
@@ -0,0 +1,126 @@
+"""calculate_all 进程池分块与 calculate_changed 增量重算"""
+import random
+import sqlite3
+
+import pandas as pd
+import pytest
+
+import repository
+from calculator import FORMULA_VERSION, FinancialCalculator, _prepare_raw, _split_groups, compute_indicators
+from db import get_conn
+from synthetic import indicator_table, make_stock_codes, universe_db
+
+N_STOCKS = 10
+CODES = make_stock_codes(N_STOCKS)
+MARCH_CODE = CODES[4]       # universe_db：每 5 只中的第 5 只为 3 月年结
+
+
+def _calculator(db_path):
+    calc = FinancialCalculator()
+    calc.db_path = db_path
+    return calc
+
+
+def _row_ids(db_path):
+    return {(code, period): row_id for row_id, code, period in get_conn(db_path).execute(
+        "SELECT id, stock_code, report_period FROM financial_indicators_derived"
+    )}
+
+
+@pytest.fixture
+def source_db(tmp_path):
+    """每只股票随机缺失部分报告期、含 3 月年结股票的原始数据库"""
+    return universe_db(tmp_path, "source.db", CODES, random.Random(31))
+
+
+@pytest.fixture
+def computed_db(tmp_path):
+    """报告期齐全、已全量计算过指标的库"""
+    db_path = universe_db(tmp_path, "computed.db", CODES, random.Random(41), gap_rate=0.0)
+    _calculator(db_path).calculate_all(workers=1)
+    return db_path
+
+
+@pytest.mark.parametrize("n_chunks", [1, 3, 7, N_STOCKS - 1, N_STOCKS, N_STOCKS + 5])
+def test_split_groups_keeps_each_stock_in_one_chunk(source_db, n_chunks):
+    raw = repository.raw_inputs(['revenue'], db_path=source_db)
+    chunks = _split_groups(raw, n_chunks)
+    chunk_codes = [set(chunk['stock_code']) for chunk in chunks]
+    assert len(chunks) == min(n_chunks, N_STOCKS)
+    assert sum(len(chunk) for chunk in chunks) == len(raw)
+    assert sum(len(codes) for codes in chunk_codes) == N_STOCKS
+    assert set().union(*chunk_codes) == set(CODES)
+
+
+def test_split_groups_empty(source_db):
+    raw = repository.raw_inputs(['revenue'], db_path=source_db)
+    assert _split_groups(raw.iloc[:0], 4) == []
+
+
+def test_calculate_all_matches_per_stock(source_db, tmp_path):
+    """同一份原始数据复制成三个库：逐只、calculate_all 串行与进程池的入库结果逐行逐列相同"""
+    dbs = {}
+    for name in ('per_stock', 'all_serial', 'all_pool'):
+        dbs[name] = tmp_path / f"{name}.db"
+        target = sqlite3.connect(dbs[name])
+        get_conn(source_db).backup(target)
+        target.close()
+
+    n_raw = len(repository.raw_inputs(['revenue'], db_path=source_db))
+    assert all(_calculator(dbs['per_stock']).calculate_indicators(code) for code in CODES)
+    assert _calculator(dbs['all_serial']).calculate_all(workers=1) == n_raw
+    assert _calculator(dbs['all_pool']).calculate_all(workers=3) == n_raw
+
+    expected = indicator_table(dbs['per_stock'])
+    assert len(expected) == n_raw
+    pd.testing.assert_frame_equal(indicator_table(dbs['all_serial']), expected)
+    pd.testing.assert_frame_equal(indicator_table(dbs['all_pool']), expected)
+
+
+def test_calculate_changed_noop_after_full_run(computed_db):
+    assert _calculator(computed_db).calculate_changed() == 0
+
+
+def test_calculate_changed_rewrites_only_dependents(computed_db):
+    """
+    修正一个 Q1 与两个年报 (含 3 月年结股票的年报) 后只重写依赖它们的报告期
+    重写的行由 INSERT OR REPLACE 分配的新 id 识别；重写后的指标与全量重算一致
+    """
+    calc = _calculator(computed_db)
+    before = _row_ids(computed_db)
+    repository.update_raw(CODES[0], '2020-03-31', {'revenue': 1.23e9}, db_path=computed_db)              # Q1
+    repository.update_raw(CODES[1], '2018-12-31', {'net_income_parent': 4.56e8}, db_path=computed_db)    # 12 月年报
+    repository.update_raw(MARCH_CODE, '2019-03-31', {'eps_basic': 0.78}, db_path=computed_db)           # 3 月年报
+    saved = calc.calculate_changed()
+
+    expected = {
+        # Q1：本期 + 下一年 Q1 (同比、TTM 的上年同期)
+        (CODES[0], '2020-03-31'), (CODES[0], '2021-03-31'),
+        # 12 月年报：本期 + 下一年年报 (同比) + 下一财年的 Q1 / S1 / Q3 (TTM 的上年年报)
+        (CODES[1], '2018-12-31'), (CODES[1], '2019-12-31'),
+        (CODES[1], '2019-03-31'), (CODES[1], '2019-06-30'), (CODES[1], '2019-09-30'),
+        # 3 月年报：下一财年为 2019-06 / 2019-09 / 2019-12 与 2020-03 年报
+        (MARCH_CODE, '2019-03-31'), (MARCH_CODE, '2020-03-31'),
+        (MARCH_CODE, '2019-06-30'), (MARCH_CODE, '2019-09-30'), (MARCH_CODE, '2019-12-31'),
+    }
+    rewritten = {key for key, row_id in _row_ids(computed_db).items() if before.get(key) != row_id}
+    assert rewritten == expected
+    assert saved == len(expected)
+    assert repository.stale_periods(FORMULA_VERSION, db_path=computed_db).empty
+
+    full = compute_indicators(_prepare_raw(calc._load_raw()))
+    full = full.reset_index(drop=True).sort_values(['stock_code', 'report_period'], ignore_index=True)
+    columns = ['stock_code', 'report_period', 'net_profit_ttm', 'eps_ttm', 'revenue_yoy', 'net_profit_yoy']
+    pd.testing.assert_frame_equal(indicator_table(computed_db)[columns], full[columns], check_dtype=False)
+
+
+def test_calculate_changed_recomputes_upgraded_rows(computed_db):
+    """升级前的库：原始行与指标行都没有版本信息 (NULL)，或指标是按上一版公式算的，增量计算也必须全部重算一次"""
+    calc = _calculator(computed_db)
+    total = len(_row_ids(computed_db))
+    with get_conn(computed_db) as conn:
+        conn.execute("UPDATE financial_reports_raw SET updated_at = NULL")
+        conn.execute("UPDATE financial_indicators_derived SET source_updated_at = NULL, "
+                     "formula_version = CASE WHEN id % 2 THEN NULL ELSE ? END", (FORMULA_VERSION - 1,))
+    assert calc.calculate_changed() == total
+    assert calc.calculate_changed() == 0
@@ -0,0 +1,39 @@
+"""正则提取引擎：全文逐关键词检索与单次扫描一致；章节 + 表头单位提取全部命中"""
+import random
+
+import pytest
+
+from extractors import FieldExtractor
+from synthetic import make_annual_report, within_tolerance, write_report_txt
+from validator import FinancialDataValidator
+
+# 报表与主要会计数据的单位组合 (元 / 万元 / 亿元)
+UNIT_CHOICES = [('元', '元'), ('元', '万元'), ('万元', '万元'), ('元', '亿元')]
+
+
+@pytest.fixture(scope="module")
+def corpus(tmp_path_factory):
+    tmp_dir = tmp_path_factory.mktemp("extractors")
+    rng = random.Random(20)
+    reports = []
+    for i, (unit, summary_unit) in enumerate(UNIT_CHOICES):
+        pages, truth, _ = make_annual_report(rng, filler_pages=10, unit=unit, summary_unit=summary_unit)
+        txt_path = tmp_dir / f"{i:03d}.txt"
+        write_report_txt(txt_path, pages)
+        reports.append((txt_path, truth))
+    return reports
+
+
+def test_search_matches_scan(corpus):
+    """含单位、优先级与被长关键词覆盖的命中"""
+    extractor = FieldExtractor(FinancialDataValidator.CRITICAL_FIELDS)
+    for txt_path, _ in corpus:
+        text = txt_path.read_text(encoding='utf-8')
+        assert extractor.search(text) == extractor.scan(text), txt_path.name
+
+
+def test_section_extraction_hits_every_field(corpus):
+    validator = FinancialDataValidator(use_llm=False)
+    for txt_path, truth in corpus:
+        extracted = validator._extract_with_regex(txt_path)
+        assert within_tolerance(extracted, truth) == truth.keys(), txt_path.name
@@ -0,0 +1,113 @@
+"""fetch_many：并发上限、共享主机限速、重试、失败统计与单写入线程"""
+import random
+import threading
+
+import pytest
+import requests
+
+from db import get_conn
+from fetchers.a_share import AShareFetcher
+from fetchers.hk_share import HKShareFetcher
+from synthetic import (SINA_STATEMENTS, StubAkshare, fresh_db, load_sina_columns, make_hk_long_frames,
+                       make_sina_statements, make_stock_codes)
+from throttle import get_bucket
+
+CODES = make_stock_codes(12)
+BAD_CODES = set(CODES[:1])          # 桩接口抛 KeyError：代码错误，不应重试
+BROKEN_CODES = set(CODES[1:2])      # 记录带不存在的列：写库失败
+GOOD_CODES = [code for code in CODES if code not in BAD_CODES | BROKEN_CODES]
+RATE_LIMIT = 100
+LATENCY = 0.05                      # LATENCY × RATE_LIMIT ≥ 并发数，请求才会重叠
+
+
+class StubFetcher(AShareFetcher):
+    """记录 save_many 所在线程与请求用的令牌桶；BROKEN_CODES 的记录带一个不存在的列，写库必然失败"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.writer_threads = set()
+        self.limiters = set()
+
+    def _call_api(self, func_name, **kwargs):
+        self.limiters.add(id(self.limiter))
+        return super()._call_api(func_name, **kwargs)
+
+    def _build_records(self, stock_code, *frames):
+        records = super()._build_records(stock_code, *frames)
+        if stock_code in BROKEN_CODES:
+            records[0][2]['no_such_column'] = 1.0
+        return records
+
+    def save_many(self, *args, **kwargs):
+        self.writer_threads.add(threading.current_thread().name)
+        return super().save_many(*args, **kwargs)
+
+
+@pytest.fixture(scope="module")
+def sina_frames():
+    columns = load_sina_columns()
+    rng = random.Random(12)
+    return [make_sina_statements(columns, rng) for _ in range(5)]
+
+
+def _stored_rows(db_path):
+    return dict(get_conn(db_path).execute(
+        "SELECT stock_code, COUNT(*) FROM financial_reports_raw GROUP BY stock_code"
+    ).fetchall())
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_fetch_many(tmp_path, sina_frames, workers):
+    api = StubAkshare(sina_frames, LATENCY, error_rate=0.2, bad_codes=BAD_CODES)
+    fetcher = StubFetcher(db_path=fresh_db(tmp_path, "fetch.db"), api=api)
+    fetcher.retry_backoff = 0.01
+    results = fetcher.fetch_many(CODES, max_concurrency=workers, rate_limit=RATE_LIMIT)
+
+    # 成功 / 失败统计：代码错误与写库失败都要记为失败
+    assert sorted(code for code, ok in results.items() if not ok) == sorted(BAD_CODES | BROKEN_CODES)
+
+    # 重试：可重试错误被吸收 (每只 3 次请求 + 错误次数)，代码错误只请求一次
+    for code in GOOD_CODES:
+        assert api.calls[code] == len(SINA_STATEMENTS) + api.errors.get(code, 0)
+    assert all(api.calls[code] == 1 for code in BAD_CODES)
+
+    # 并发上限与共享的主机令牌桶
+    assert api.max_in_flight <= workers
+    if workers > 1:
+        assert api.max_in_flight >= 2, "请求没有重叠，并发未生效"
+    assert fetcher.limiters == {id(get_bucket(StubFetcher.HOST, RATE_LIMIT))}
+
+    # 主机限速：任意时间窗内的请求数不超过 令牌桶容量 + 速率 × 窗口长度
+    times = sorted(api.times)
+    for i in range(len(times)):
+        for j in range(i, len(times)):
+            assert j - i + 1 <= RATE_LIMIT + RATE_LIMIT * (times[j] - times[i]) + 1
+
+    # 写库：全部在同一个写入线程，成功的股票行数与清洗结果一致，失败的一行都没有
+    assert len(fetcher.writer_threads) == 1
+    builder = AShareFetcher.__new__(AShareFetcher)
+    expected_rows = [len(builder._build_records('000000', *frames)) for frames in sina_frames]
+    stored = _stored_rows(fetcher.db_path)
+    for code in CODES:
+        want = expected_rows[int(code) % len(sina_frames)] if code in GOOD_CODES else 0
+        assert stored.get(code, 0) == want, code
+
+
+def test_hk_statement_failure_fails_whole_stock(tmp_path):
+    """港股：某张报表重试后仍失败时，整只股票记为失败且不写入 (而不是缺一张表入库)"""
+    frames = dict(zip(SINA_STATEMENTS, make_hk_long_frames('00001', random.Random(14), start_year=2020)))
+
+    class StubHK:
+        def stock_financial_hk_report_em(self, stock, symbol, indicator):
+            if stock == '00002' and symbol == '现金流量表':
+                raise requests.ConnectionError("模拟连接中断")
+            return frames[symbol]
+
+    fetcher = HKShareFetcher(db_path=fresh_db(tmp_path, "hk.db"), api=StubHK())
+    fetcher.retry_backoff = 0.001
+    results = fetcher.fetch_many(['00001', '00002'], max_concurrency=2, rate_limit=1000)
+
+    assert results == {'00001': True, '00002': False}
+    stored = _stored_rows(fetcher.db_path)
+    assert '00002' not in stored
+    assert stored.get('00001')
@@ -0,0 +1,58 @@
+"""compute_indicators：与旧版逐行引擎一致；非 12 月财年的 TTM / 同比"""
+import numpy as np
+import pandas as pd
+
+from calculator import compute_indicators
+from legacy import legacy_indicators
+from synthetic import SYNTHETIC_FIELDS, make_periods, make_raw_frame, make_stock_codes
+
+
+def test_matches_legacy_engine(rng):
+    # YoY 已改为同一报告期同比 (旧引擎比较的是上一行)，不参与对比
+    for code in make_stock_codes(10):
+        df = make_raw_frame(code, make_periods(), rng)
+        expected = legacy_indicators(df).drop(columns=['revenue_yoy', 'net_profit_yoy']).astype(float)
+        actual = compute_indicators(df)[expected.columns].astype(float)
+        pd.testing.assert_frame_equal(actual, expected, check_names=False, check_exact=True)
+
+
+def test_fiscal_year_ttm_and_yoy():
+    """
+    3 月 31 日年结的港股与 12 月年结的股票混在一起计算：
+    Q1 / S1 / Q3 的 TTM 取上一财年年报 (按 report_type == 'A' 对齐)，同比取上年同一报告期
+    """
+    rows = [
+        # (股票, 报告期, 报告类型, 归母净利润累计)
+        ('00001', '2022-03-31', 'A', 100.0), ('00001', '2022-06-30', 'Q1', 30.0),
+        ('00001', '2022-09-30', 'S1', 55.0), ('00001', '2022-12-31', 'Q3', 80.0),
+        ('00001', '2023-03-31', 'A', 120.0), ('00001', '2023-06-30', 'Q1', 40.0),
+        ('00001', '2023-09-30', 'S1', 70.0), ('00001', '2023-12-31', 'Q3', 95.0),
+        ('00001', '2024-03-31', 'A', 150.0),
+        ('600000', '2022-09-30', 'Q3', 60.0), ('600000', '2022-12-31', 'A', 90.0),
+        ('600000', '2023-09-30', 'Q3', 75.0),
+    ]
+    df = pd.DataFrame(rows, columns=['stock_code', 'report_period', 'report_type', 'net_income_parent'])
+    for f in SYNTHETIC_FIELDS:
+        if f != 'net_income_parent':
+            df[f] = np.nan
+    df['eps_basic'] = df['net_income_parent'] / 100
+    df['report_period'] = pd.to_datetime(df['report_period'])
+    ind = compute_indicators(df.set_index('report_period'))
+    actual = {(code, period): (ttm, yoy) for code, period, ttm, yoy in zip(
+        ind['stock_code'], ind['report_period'], ind['net_profit_ttm'], ind['net_profit_yoy'])}
+
+    expected = {
+        # Q1 / S1 / Q3：本期累计 + 上一财年年报 (2023-03-31) - 上年同期累计
+        ('00001', '2023-06-30'): (40 + 120 - 30, (40 - 30) / 30 * 100),
+        ('00001', '2023-09-30'): (70 + 120 - 55, (70 - 55) / 55 * 100),
+        ('00001', '2023-12-31'): (95 + 120 - 80, (95 - 80) / 80 * 100),
+        # 年报：TTM 即本身，同比对上一财年年报
+        ('00001', '2024-03-31'): (150, (150 - 120) / 120 * 100),
+        ('00001', '2023-03-31'): (120, (120 - 100) / 100 * 100),
+        # 上一财年年报不在库里：TTM 为空
+        ('00001', '2022-06-30'): (np.nan, np.nan),
+        ('600000', '2023-09-30'): (75 + 90 - 60, (75 - 60) / 60 * 100),
+    }
+    for key, values in expected.items():
+        assert np.allclose(actual[key], values, equal_nan=True), key
+    np.testing.assert_allclose(ind['eps_ttm'].to_numpy() * 100, ind['net_profit_ttm'].to_numpy())
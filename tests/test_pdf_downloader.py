@@ -0,0 +1,84 @@
+"""PDFDownloader：流水线下载完整性、断线续传与失效临时文件，对本地巨潮资讯桩服务"""
+import hashlib
+import json
+import os
+import sqlite3
+
+import pytest
+
+from pdf_downloader import PDFDownloader
+from synthetic import CninfoStubHandler, SleepParser, make_stock_codes
+
+CODES = make_stock_codes(3)
+EXPECTED = len(CODES) * len(CninfoStubHandler.REPORTS)
+
+
+def _downloader(stub, tmp_path, db_path, **kwargs):
+    return PDFDownloader(
+        download_dir=tmp_path / "downloads", rate_limit=1000, base_url=stub.url, static_url=stub.url,
+        parser=SleepParser(0), db_path=db_path, **kwargs,
+    )
+
+
+def _hashed_rows(db_path, sha256):
+    return sqlite3.connect(db_path).execute(
+        "SELECT COUNT(*) FROM financial_reports_files WHERE sha256 = ?", (sha256,)
+    ).fetchone()[0]
+
+
+def test_download_many_complete(cninfo_stub, tmp_path, db_path):
+    """全部报告下载、解析并入库 (摘要跳过)"""
+    stub = cninfo_stub(pdf_kb=16)
+    stats = _downloader(stub, tmp_path, db_path, max_workers=4).download_many(CODES)
+
+    assert stats['downloaded'] == EXPECTED
+    assert not stats['failed']
+    assert sqlite3.connect(db_path).execute("SELECT COUNT(*) FROM financial_reports_files").fetchone()[0] == EXPECTED
+
+
+def test_resume_after_dropped_connections(cninfo_stub, tmp_path, db_path):
+    """断线后按 Range 续传：文件 sha256 全部一致并入库、无残留 .part；重跑只看元数据跳过"""
+    stub = cninfo_stub(pdf_kb=64, drop_rate=0.25)
+    expected_hash = hashlib.sha256(stub.pdf_bytes).hexdigest()
+    downloader = _downloader(stub, tmp_path, db_path, max_workers=4, parse_workers=0)
+    downloader.retries = 8
+    stats = downloader.download_many(CODES)
+
+    files = list(downloader.base_dir.rglob("*.pdf"))
+    assert not stats['failed']
+    assert len(files) == EXPECTED
+    assert all(hashlib.sha256(f.read_bytes()).hexdigest() == expected_hash for f in files)
+    assert not list(downloader.base_dir.rglob("*.part*"))
+    assert _hashed_rows(db_path, expected_hash) == EXPECTED
+    assert stub.requests['pdf'] > EXPECTED, "桩服务没有断线，未覆盖续传"
+
+    stub.drop_rate = 0
+    stub.requests = {'query': 0, 'pdf': 0, 'bytes': 0}
+    rerun = downloader.download_many(CODES)
+    assert rerun['downloaded'] == 0
+    assert rerun['skipped'] == EXPECTED
+    assert stub.requests['pdf'] == 0
+
+
+@pytest.mark.parametrize("name", ['oversized', 'complete_size', 'range_416'])
+def test_stale_partial_is_discarded(cninfo_stub, tmp_path, db_path, name):
+    """残留 .part 不小于记录的总大小、或续传返回 416 时，丢弃临时文件从头下载"""
+    stub = cninfo_stub(pdf_kb=64)
+    total = len(stub.pdf_bytes)
+    partial, meta = {
+        # 本地比记录的总大小还长 (写入错乱)
+        'oversized': (b"%PDF-" + os.urandom(total + 100), {'etag': stub.etag, 'size': total}),
+        # 大小恰好相等但内容损坏 (重命名前崩溃时无法再校验)
+        'complete_size': (b"%PDF-" + os.urandom(total - 5), {'etag': stub.etag, 'size': total}),
+        # 没有记录总大小，续传起点超出服务器文件 → 416
+        'range_416': (b"%PDF-" + os.urandom(total + 10), {'etag': stub.etag, 'size': None}),
+    }[name]
+    downloader = _downloader(stub, tmp_path, db_path, parse_workers=0)
+    file_path = downloader.base_dir / f"{name}.pdf"
+    file_path.with_name(file_path.name + '.part').write_bytes(partial)
+    file_path.with_name(file_path.name + '.part.json').write_text(json.dumps(meta))
+
+    downloader._download_file(f"{stub.url}/finalpage/{name}.PDF", file_path)
+
+    assert file_path.read_bytes() == stub.pdf_bytes
+    assert not list(downloader.base_dir.glob(f"{name}.pdf.part*"))
@@ -0,0 +1,26 @@
+"""parse_many：进程池 + 大文档按页段拆分写出的 TXT 与旧版逐页拼接逐字节相同"""
+import random
+import shutil
+
+from legacy import legacy_parse_pdf
+from pdf_parser import PAGE_CHUNK, PDFParser
+from synthetic import make_report_pdf
+
+
+def test_parse_many_matches_legacy(tmp_path):
+    legacy_dir, new_dir = tmp_path / "legacy", tmp_path / "new"
+    legacy_dir.mkdir()
+    new_dir.mkdir()
+    rng = random.Random(18)
+    # 年报跨越多个页段 (页数不整除段大小)，季报不拆分
+    for i, n_pages in enumerate((PAGE_CHUNK * 2 + 7, 9, PAGE_CHUNK)):
+        make_report_pdf(legacy_dir / f"{i:03d}.pdf", n_pages, rng)
+        shutil.copy(legacy_dir / f"{i:03d}.pdf", new_dir / f"{i:03d}.pdf")
+
+    results = PDFParser().parse_many(sorted(new_dir.glob("*.pdf")), workers=2)
+
+    for pdf in sorted(legacy_dir.glob("*.pdf")):
+        legacy_parse_pdf(pdf)
+        assert results[new_dir / pdf.name] is not None, pdf.name
+        assert (new_dir / pdf.name).with_suffix('.txt').read_bytes() == pdf.with_suffix('.txt').read_bytes(), pdf.name
+    assert not list(new_dir.glob("*.part"))
@@ -0,0 +1,29 @@
+"""全量科目长表：整行 JSON 迁移后 load_items 读出的宽表与旧版逐行 json.loads 完全相同"""
+import random
+import sqlite3
+
+import pytest
+
+from legacy import legacy_read_items
+from report_items import load_items, migrate_raw_json
+from synthetic import make_hk_records, make_stock_codes, raw_json_db
+
+CODES = [f"{i:05d}" for i in range(4)]
+
+
+@pytest.fixture
+def json_db(tmp_path):
+    samples = make_hk_records(make_stock_codes(2), random.Random(5))
+    return raw_json_db(tmp_path, "json.db", CODES, samples)
+
+
+def test_migrated_items_match_legacy(json_db):
+    conn = sqlite3.connect(json_db)
+    expected = {code: legacy_read_items(conn, code) for code in CODES}
+    with conn:
+        migrate_raw_json(conn.cursor())
+
+    for code in CODES:
+        actual = load_items(conn, code)
+        assert actual[expected[code].columns].astype(float).equals(expected[code].astype(float)), code
+    conn.close()
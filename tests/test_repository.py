@@ -0,0 +1,36 @@
+"""repository：UI 重跑的查询与旧版 f-string SQL + 新建连接的结果逐项相同"""
+import random
+
+import pandas as pd
+import pytest
+
+import repository
+from calculator import FinancialCalculator
+from legacy import legacy_ui_rerun
+from synthetic import NullFetcher, make_periods, make_records, make_stock_codes
+
+CODES = make_stock_codes(3)
+
+
+@pytest.fixture
+def ui_db(db_path):
+    records = make_records(make_periods(2018), random.Random(21))
+    fetcher = NullFetcher(db_path=db_path)
+    for code in CODES:
+        fetcher.save_many(code, records)
+    calc = FinancialCalculator()
+    calc.db_path = db_path
+    calc.calculate_all(workers=1)
+    return db_path
+
+
+@pytest.mark.parametrize("code", CODES + ['999999'])
+def test_ui_queries_match_legacy(ui_db, code):
+    legacy_latest, legacy_periods, legacy_exists, legacy_raw, legacy_derived = legacy_ui_rerun(ui_db, code)
+    df_raw, df_derived = repository.history(code, db_path=ui_db)
+
+    pd.testing.assert_frame_equal(repository.latest_indicators(code, db_path=ui_db), legacy_latest)
+    assert repository.periods(code, db_path=ui_db) == legacy_periods
+    assert repository.has_data(code, db_path=ui_db) == legacy_exists
+    pd.testing.assert_frame_equal(df_raw, legacy_raw)
+    pd.testing.assert_frame_equal(df_derived, legacy_derived)
@@ -0,0 +1,21 @@
+"""章节索引：解析时记录的报表章节页码与合成年报中的实际位置一致"""
+import random
+
+import sections
+from pdf_parser import PDFParser
+from synthetic import make_annual_report, write_report_pdf
+
+
+def test_section_pages(tmp_path):
+    rng = random.Random(19)
+    reports = []
+    for i in range(2):
+        pages, _, expected = make_annual_report(rng, filler_pages=10)
+        pdf_path = tmp_path / f"{i:03d}.pdf"
+        write_report_pdf(pdf_path, pages)
+        reports.append((pdf_path, expected))
+
+    results = PDFParser().parse_many([pdf_path for pdf_path, _ in reports], workers=1)
+
+    for pdf_path, expected in reports:
+        assert sections.load_index(results[pdf_path])['sections'] == expected
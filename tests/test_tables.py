@@ -0,0 +1,38 @@
+"""结构化表格：带附注列的报表 PDF 上全部命中；只回填声明了单位的报表，回填的字段在同一次验证中参与比对"""
+import pytest
+
+import repository
+from synthetic import tables_fixture, within_tolerance
+from validator import FinancialDataValidator
+
+N_REPORTS = 6           # 单位依次为 元 / 万元 / 不声明，缺失字段轮换
+
+
+@pytest.fixture
+def tables_db(tmp_path):
+    return tables_fixture(tmp_path, N_REPORTS, filler_pages=5)
+
+
+def test_structured_tables_hit_every_field(tables_db):
+    """营业总收入优先于其中的营业收入、附注列不会被当作金额"""
+    db_path, corpus = tables_db
+    validator = FinancialDataValidator(use_llm=False, db_path=db_path)
+    for _, _, pdf_path, truth, _ in corpus:
+        found = validator._scan_local(pdf_path.with_suffix('.txt'))
+        assert within_tolerance({f: m['value'] for f, m in found.items()}, truth) == truth.keys(), pdf_path.name
+    validator.close()
+
+
+def test_autofill_declared_units_only(tables_db):
+    db_path, corpus = tables_db
+    validator = FinancialDataValidator(use_llm=False, db_path=db_path, autofill=True)
+    results = validator.validate_many([(code, period) for code, period, _, _, _ in corpus], workers=2)
+    validator.close()
+
+    for i, (code, period, _, truth, missing) in enumerate(corpus):
+        value = repository.raw_row(code, period, [missing], db_path=db_path)[missing]
+        if i % 3 == 2:
+            assert value is None, f"{code}: 未声明单位的报表不应回填"
+        else:
+            assert within_tolerance({missing: value}, {missing: truth[missing]}) == {missing}, code
+            assert results[(code, period)]['details'][missing]['status'] != 'MISSING_AKSHARE', code
@@ -0,0 +1,107 @@
+"""FinancialDataValidator (本地假模型)：LLM 提取缓存、并发验证与重试、多报告期合并请求、分级提取"""
+from db import get_conn
+from synthetic import FakeLLM, validation_fixture
+from validator import FinancialDataValidator
+
+LATENCY = 0.01
+
+
+def _validator(model, db_path, **kwargs):
+    validator = FinancialDataValidator(model=model, db_path=db_path, **kwargs)
+    validator.CONFIDENCE_THRESHOLD = 1.01   # 所有字段都交给 LLM (不走正则快速路径)
+    validator.retry_backoff = 0.01
+    validator.cache.invalidate()
+    return validator
+
+
+def _outcomes(results):
+    return {key: (r['status'], r.get('details')) for key, r in results.items()}
+
+
+def test_llm_cache_hits_and_invalidation(validation_db, tmp_path):
+    """重复验证与调整容差命中缓存；单份 TXT 变化只重新提取这一份；主动失效后全部重新提取"""
+    db_path, targets = validation_db
+    model = FakeLLM(LATENCY)
+    validator = _validator(model, db_path, rpm=None, tpm=None)
+
+    def calls_for_run():
+        before = model.calls
+        results = [validator.validate_report(code, period) for code, period in targets]
+        return model.calls - before, results
+
+    cold_calls, cold = calls_for_run()
+    warm_calls, warm = calls_for_run()
+    assert (cold_calls, warm_calls) == (len(targets), 0)
+    assert [r['details'] for r in warm] == [r['details'] for r in cold]
+
+    validator.TOLERANCE = 0.0001
+    assert calls_for_run()[0] == 0
+    validator.TOLERANCE = FinancialDataValidator.TOLERANCE
+
+    code, period = targets[0]
+    with open(tmp_path / f"{code}_{period[:4]}.txt", 'a', encoding='utf-8') as f:
+        f.write("\n更正公告")
+    assert calls_for_run()[0] == 1
+
+    # 变化前那份 TXT 的旧条目仍在，一并失效
+    assert validator.cache.invalidate(model=model.model_name) == len(targets) + 1
+    assert calls_for_run()[0] == len(targets)
+    validator.close()
+
+
+def test_validate_many_matches_serial(validation_db):
+    """并发验证与逐个验证的结果、质量标记相同；注入的 429 / 503 全部被重试吸收"""
+    db_path, targets = validation_db
+    outcomes = []
+    for workers in (0, 4):
+        model = FakeLLM(LATENCY, error_rate=0.3)
+        validator = _validator(model, db_path, rpm=6000, tpm=None)
+        if workers:
+            results = validator.validate_many(targets, workers=workers)
+        else:
+            results = {(code, period): validator.validate_report(code, period) for code, period in targets}
+        quality = dict(((code, period), q) for code, period, q in get_conn(db_path).execute(
+            "SELECT stock_code, report_period, data_quality FROM financial_reports_raw"
+        ))
+        outcomes.append((_outcomes(results), quality))
+
+        # 调用次数 = 报告数 + 错误数，且每份报告都写入了缓存
+        assert model.errors, "假模型没有注入错误，未覆盖重试"
+        assert model.calls == len(targets) + model.errors
+        assert validator.cache.stats()['entries'] == len(targets)
+        validator.close()
+    assert outcomes[0] == outcomes[1]
+
+
+def test_batched_requests_match_single(validation_db):
+    db_path, targets = validation_db
+    outcomes, stats = [], []
+    for batch_size in (1, 3):
+        validator = _validator(FakeLLM(LATENCY), db_path, rpm=None, tpm=None)
+        validator.BATCH_MAX_PERIODS = batch_size
+        outcomes.append(_outcomes(validator.validate_many(targets, workers=2, batch_size=batch_size)))
+        stats.append(validator.llm_call_stats())
+        validator.close()
+
+    assert outcomes[0] == outcomes[1]
+    assert [s['periods'] for s in stats] == [len(targets), len(targets)]
+    assert stats[1]['requests'] < stats[0]['requests']
+
+
+def test_tiered_extraction_as_accurate_as_all_llm(tmp_path):
+    """表头不声明单位的年报升级给 LLM 后，分级提取与全部交给 LLM 的字段正确数、VERIFIED 数相同"""
+    db_path, targets = validation_fixture(tmp_path, 3, 2, filler_pages=5, hard_rate=0.5)
+    scores = {}
+    for label, threshold in (("all_llm", 1.01), ("tiered", FinancialDataValidator.CONFIDENCE_THRESHOLD)):
+        validator = _validator(FakeLLM(LATENCY), db_path, rpm=None, tpm=None)
+        validator.CONFIDENCE_THRESHOLD = threshold
+        results = validator.validate_many(targets, workers=2)
+        scores[label] = (
+            sum(d.get('status') == 'PASS' for r in results.values() for d in r.get('details', {}).values()),
+            sum(r['status'] == 'VERIFIED' for r in results.values()),
+            validator.llm_call_stats()['requests'],
+        )
+        validator.close()
+
+    assert scores['tiered'][:2] == scores['all_llm'][:2]
+    assert scores['tiered'][2] < scores['all_llm'][2]
@@ -0,0 +1,68 @@
+"""
+并发抓取用的限流与重试工具
+- TokenBucket: 线程安全的令牌桶，按主机共享
+- retry_call: 指数退避重试
+"""
+import random
+import threading
+import time
+
+
+class TokenBucket:
+    """令牌桶限流器：平均每秒 rate 个令牌，最多积攒 capacity 个 (线程安全)"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        """取走 tokens 个令牌，不够时阻塞等待 (超过 capacity 时分批取)"""
+        while tokens > self.capacity:
+            self.acquire(self.capacity)
+            tokens -= self.capacity
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def get_bucket(host, rate, capacity=None):
+    """按主机名获取共享的令牌桶 (同一主机的所有线程共用一个限额)"""
+    with _buckets_lock:
+        bucket = _buckets.get(host)
+        if bucket is None or bucket.rate != rate:
+            bucket = TokenBucket(rate, capacity)
+            _buckets[host] = bucket
+        return bucket
+
+
+def retry_call(func, *args, retries=3, backoff=1.0, max_backoff=30.0, should_retry=None, **kwargs):
+    """
+    调用 func，失败时按指数退避 (带随机抖动) 重试
+    should_retry(exc) 返回 False 时立即抛出，不再重试
+    """
+    attempt = 0
+    while True:
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            attempt += 1
+            if attempt > retries or (should_retry is not None and not should_retry(e)):
+                raise
+            delay = min(max_backoff, backoff * (2 ** (attempt - 1)))
+            delay *= random.uniform(0.5, 1.5)
+            print(f"  🔁 第 {attempt} 次重试 ({type(e).__name__}: {e})，{delay:.1f}s 后重试...")
+            time.sleep(delay)
@@ -1,9 +1,25 @@
-import re
-import sqlite3
 import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from datetime import datetime
 
+import repository
+from db import close_conn, get_writer
+from extractors import UNITS, FieldExtractor, flag
+from llm_cache import LLMCache
+from sections import read_sections
+from throttle import TokenBucket, retry_call
+
+# 结构化表格依赖 PyMuPDF；没有时只用正则 / LLM
+try:
+    from tables import get_tables, lookup
+    HAS_TABLES = True
+except ImportError:
+    HAS_TABLES = False
+    print("⚠️ 未安装 PyMuPDF，跳过结构化表格提取，请运行: pip install pymupdf")
+
 DB_PATH = Path(__file__).parent / "finance.db"
 
 # 尝试导入 Gemini
@@ -14,6 +30,21 @@ except ImportError:
     HAS_GEMINI = False
     print("⚠️ 未安装 google-generativeai，请运行: pip install google-generativeai")
 
+def estimate_tokens(text):
+    """粗略估算 token 数 (中文约一字一个 token，按字符数计偏保守)"""
+    return len(text)
+
+
+def _should_retry_llm(e):
+    """限流 (429)、服务端错误 (5xx) 与网络超时可重试；其余错误 (如密钥无效) 直接失败"""
+    code = getattr(e, 'code', None)
+    try:
+        code = int(code() if callable(code) else code)
+    except (TypeError, ValueError):
+        return isinstance(e, (TimeoutError, ConnectionError))
+    return code == 429 or 500 <= code < 600
+
+
 class FinancialDataValidator:
     """财务数据交叉验证器 (LLM 增强版)"""
     
@@ -27,20 +58,108 @@ class FinancialDataValidator:
         'total_equity': (['股东权益合计', '所有者权益合计', '归属于母公司股东权益合计'], 1e8),
     }
     
-    def __init__(self, use_llm=True, gemini_api_key=None):
-        self.conn = sqlite3.connect(DB_PATH)
-        self.use_llm = use_llm and HAS_GEMINI
+    # 结构化表格 (tables.py) 中的科目名：整名匹配规范化后的科目名，按顺序取优先级
+    # (营收与 field_mapping.A_SHARE_FIELDS 一致，营业总收入优先)
+    TABLE_FIELDS = {
+        'revenue': ['营业总收入', '营业收入'],
+        'net_income_parent': ['归属于母公司(?:股东|所有者)的净利润', '归属于母公司.*净利润'],
+        'total_assets': ['资产总计', '资产合计'],
+        'total_equity': ['(?:所有者|股东)权益(?:[（(]或股东权益[）)])?合计'],
+        'income_tax_expenses': ['所得税费用'],
+        'current_assets': ['流动资产合计'],
+        'non_current_assets': ['非流动资产合计'],
+        'intangible_assets': ['无形资产'],
+        'current_liabilities': ['流动负债合计'],
+        'non_current_liabilities': ['非流动负债合计'],
+        'share_capital': ['实收资本[（(]或股本[）)]', '股本', '实收资本'],
+        'retained_earnings': ['未分配利润'],
+        'net_cash_flow': ['现金及现金等价物净增加额'],
+    }
+    USE_TABLES = True
+    
+    # 分级提取：正则结果置信度 (见 extractors.PENALTIES) 不低于阈值的字段不再交给 LLM
+    CONFIDENCE_THRESHOLD = 0.7
+    # 数值关系校验 (前者绝对值不应超过后者)，违反时两个字段都降低置信度
+    CONSISTENCY_RULES = [('total_equity', 'total_assets'), ('net_income_parent', 'revenue')]
+    
+    # 提取时只读取的章节 (见 sections.py)；没有章节索引时退回全文
+    STATEMENT_SECTIONS = ['主要会计数据', '合并资产负债表', '合并利润表', '合并现金流量表']
+    LLM_MAX_CHARS = 100000
+    # 批量提取时每个请求最多合并的报告期数 (报表页总长同样受 LLM_MAX_CHARS 限制)
+    BATCH_MAX_PERIODS = 4
+
+    # 提示词中的字段：{字段: (参考值名称, 提取说明)}
+    LLM_FIELDS = {
+        'revenue': ('营业收入', '营业收入'),
+        'net_income_parent': ('归母净利润', '归母净利润'),
+        'total_assets': ('总资产', '总资产'),
+        'total_equity': ('股东权益', '股东权益合计'),
+        'income_tax_expenses': ('所得税费用', '所得税费用'),
+        'current_assets': ('流动资产', '流动资产合计'),
+        'non_current_assets': ('非流动资产', '非流动资产合计'),
+        'intangible_assets': ('无形资产', '无形资产'),
+        'current_liabilities': ('流动负债', '流动负债合计'),
+        'non_current_liabilities': ('非流动负债', '非流动负债合计'),
+        'share_capital': ('股本', '实收资本(或股本)'),
+        'retained_earnings': ('未分配利润', '未分配利润'),
+        'net_cash_flow': ('现金流量净额', '现金及现金等价物净增加额'),
+    }
+
+    # 默认模型；PROMPT_VERSION 在修改 _extract_with_llm 的提示词模板时递增 (旧缓存随之失效)
+    MODEL_NAME = 'gemini-2.5-flash'
+    PROMPT_VERSION = 1
+
+    # 模型调用配额 (每分钟请求数 / 每分钟 token 数)，按账号实际配额调整
+    DEFAULT_RPM = 60
+    DEFAULT_TPM = 1_000_000
+
+    # 与 PDF 交叉验证的数据库字段
+    AKSHARE_FIELDS = [
+        'revenue', 'net_income_parent', 'total_assets', 'total_equity',
+        'income_tax_expenses', 'current_assets', 'non_current_assets', 'intangible_assets',
+        'current_liabilities', 'non_current_liabilities', 'share_capital', 'retained_earnings', 'net_cash_flow'
+    ]
+
+    def __init__(self, use_llm=True, gemini_api_key=None, model=None, cache=None, db_path=DB_PATH,
+                 rpm=DEFAULT_RPM, tpm=DEFAULT_TPM, autofill=False):
+        """
+        autofill: 验证时把数据库中为空、报表表格里有的字段回填 (见 autofill_from_tables)
+        model: 可注入的模型对象 (需提供 generate_content(prompt) → 带 .text 的响应)，默认使用 Gemini
+        cache: LLM 提取结果缓存，默认为同一数据库中的 LLMCache
+        rpm / tpm: 模型调用限速，同一个验证器的所有线程共享；为 None 时不限速
+        """
+        self.db_path = db_path
+        self.autofill = autofill
+        self.rpm_limiter = TokenBucket(rpm / 60) if rpm else None
+        self.tpm_limiter = TokenBucket(tpm / 60) if tpm else None
+        self.retries = 3
+        self.retry_backoff = 1.0
+        # validate_many 期间设置：写库交给单写入线程
+        self.writer = None
+        self._writes = []
+        # 每次模型请求的记录 (报告期数、token、耗时)，见 llm_call_stats
+        self.llm_calls = []
+        # 分级提取的升级统计，见 escalation_stats
+        self.tier_stats = {'reports': 0, 'escalated_reports': 0, 'fields': 0, 'escalated_fields': 0}
+        self._stats_lock = threading.Lock()
+        self.use_llm = use_llm and (model is not None or HAS_GEMINI)
+        # 关键词预编译为单个模式，所有报告共用
+        self.extractor = FieldExtractor(self.CRITICAL_FIELDS)
+        self.cache = cache if cache is not None else LLMCache(db_path)
+        self.model = model
         
-        if self.use_llm:
+        if self.use_llm and self.model is None:
             # 配置 Gemini
             if gemini_api_key:
                 genai.configure(api_key=gemini_api_key)
             # 使用 Flash 模型（便宜快速）
-            self.model = genai.GenerativeModel('gemini-2.5-flash')
+            self.model = genai.GenerativeModel(self.MODEL_NAME)
+        self.model_name = getattr(self.model, 'model_name', self.MODEL_NAME)
     
-    def validate_report(self, stock_code, report_period):
+    def validate_report(self, stock_code, report_period, pdf_data=None):
         """
         验证单个财报的数据质量
+        pdf_data: 已提取好的财报数据 (批量提取时传入)，为 None 时在这里提取
         返回: {'status': 'VERIFIED'/'CONFLICT', 'details': {...}}
         """
         # 1. 获取 AkShare 数据
@@ -52,11 +171,15 @@ class FinancialDataValidator:
         txt_path = self._get_txt_path(stock_code, report_period)
         if not txt_path or not Path(txt_path).exists():
             return {'status': 'NO_FILE', 'message': 'PDF/TXT 文件不存在'}
+        if self.autofill:
+            # 回填的字段本次就参与比对 (否则会被误报为 MISSING_AKSHARE)
+            akshare_data.update(self.autofill_from_tables(stock_code, report_period, txt_path, akshare_data))
         
-        # 3. 从 TXT 提取数据（优先使用 LLM）
-        if self.use_llm:
-            print("  🤖 使用 Gemini 提取财务数据...")
-            pdf_data = self._extract_with_llm(txt_path, akshare_data)
+        # 3. 从 TXT 提取数据（正则优先，置信度不足的字段交给 LLM）
+        if pdf_data is not None:
+            pass
+        elif self.use_llm:
+            pdf_data = self._extract_tiered(txt_path, akshare_data)
         else:
             print("  📝 使用正则表达式提取财务数据...")
             pdf_data = self._extract_with_regex(txt_path)
@@ -106,47 +229,171 @@ class FinancialDataValidator:
             'timestamp': datetime.now().isoformat()
         }
     
-    def _extract_with_llm(self, txt_path, akshare_data):
-        """使用 Gemini LLM 提取财务数据"""
+    def _extract_tiered(self, txt_path, akshare_data):
+        """分级提取：先用正则并逐字段打分，只把缺失或置信度不足的字段交给 LLM"""
+        local, escalate = self._tier(txt_path)
+        if not escalate:
+            return {field: match['value'] for field, match in local.items()}
+        print("  🤖 使用 Gemini 提取财务数据...")
+        return self._merge_tiers(local, self._extract_with_llm(txt_path, akshare_data, fields=escalate), escalate)
+    
+    def _tier(self, txt_path):
+        """返回 (正则结果, 需要交给 LLM 的字段列表)，并记录升级统计"""
         try:
-            # 读取文件（只取前 100k 字符，避免超出 token 限制）
-            with open(txt_path, 'r', encoding='utf-8') as f:
-                text = f.read()[:100000]
+            local = self._scan_local(txt_path)
+        except Exception as e:
+            print(f"读取文件失败: {e}")
+            local = {}
+        escalate = [field for field in self.CRITICAL_FIELDS
+                    if field not in local or local[field]['confidence'] < self.CONFIDENCE_THRESHOLD]
+        with self._stats_lock:
+            self.tier_stats['reports'] += 1
+            self.tier_stats['fields'] += len(self.CRITICAL_FIELDS)
+            self.tier_stats['escalated_reports'] += bool(escalate)
+            self.tier_stats['escalated_fields'] += len(escalate)
+        if escalate:
+            reasons = ", ".join(f"{field}({'/'.join(local[field]['flags']) if field in local else '未找到'})"
+                                for field in escalate)
+            print(f"  📝 正则解决 {len(self.CRITICAL_FIELDS) - len(escalate)}/{len(self.CRITICAL_FIELDS)} 个字段，"
+                  f"交给 LLM: {reasons}")
+        else:
+            print(f"  📝 正则解决全部 {len(self.CRITICAL_FIELDS)} 个字段，跳过 LLM")
+        return local, escalate
+    
+    @staticmethod
+    def _merge_tiers(local, llm_data, escalate):
+        """升级字段取 LLM 的结果；LLM 也没给出的保留正则的低置信度值"""
+        merged = {field: match['value'] for field, match in local.items()}
+        for field in escalate:
+            if llm_data.get(field) is not None:
+                merged[field] = llm_data[field]
+        return merged
+    
+    def escalation_stats(self):
+        """分级提取统计：报告数、升级到 LLM 的报告数与字段数及其比例"""
+        with self._stats_lock:
+            stats = dict(self.tier_stats)
+        stats['report_rate'] = stats['escalated_reports'] / stats['reports'] if stats['reports'] else 0.0
+        stats['field_rate'] = stats['escalated_fields'] / stats['fields'] if stats['fields'] else 0.0
+        return stats
+    
+    def _extract_with_llm(self, txt_path, akshare_data, fields=None):
+        """
+        使用 Gemini LLM 提取财务数据
+        fields: 只提取这些字段 (提示词随之收窄)，默认 LLM_FIELDS 全部字段
+        """
+        try:
+            text = self._llm_text(txt_path)
+
+            # 同一段原文 + 同一提示词版本 (含字段范围) + 同一模型的结果直接复用 (参考值只是提示，不进入缓存键)
+            cached = self.cache.get(text, self._cache_version(fields), self.model_name)
+            if cached is not None:
+                print("  💾 命中 LLM 缓存")
+                return cached
+        except Exception as e:
+            print(f"  ⚠️ LLM 提取失败: {e}")
+            return self._extract_with_regex(txt_path)
+        return self._extract_uncached(txt_path, text, akshare_data, fields)
+    
+    def _cache_version(self, fields=None):
+        """缓存键中的提示词版本：收窄字段的提示词另外附上字段列表"""
+        if fields is None:
+            return self.PROMPT_VERSION
+        return f"{self.PROMPT_VERSION}:{'+'.join(fields)}"
+    
+    def _extract_uncached(self, txt_path, text, akshare_data, fields=None):
+        """单份提取 (已确认未命中缓存)"""
+        try:
+            extracted = self._parse_json(self._call_llm(self._build_prompt(text, akshare_data, fields), 1))
             
-            # 构造 Prompt
-            prompt = f"""
+            # 转换 None 为实际的 None
+            extracted = {k: (v if v is not None else None) for k, v in extracted.items()}
+            if fields is not None:
+                extracted = {field: extracted.get(field) for field in fields}
+            self.cache.put(text, self._cache_version(fields), self.model_name, extracted)
+            return extracted
+            
+        except Exception as e:
+            print(f"  ⚠️ LLM 提取失败: {e}")
+            # 降级到正则表达式
+            return self._extract_with_regex(txt_path)
+    
+    def _extract_batch_with_llm(self, items):
+        """
+        多个报告期合并为一次请求：共用一份说明与字段 schema，每期只附参考值和报表页，按报告期拆分返回的 JSON
+        items: [(report_period, txt_path, akshare_data, fields)]，fields 为该期要提取的字段 (None 为全部)
+        返回 {report_period: 提取结果}；批量请求失败或缺少某期时，该期退回单份提取
+        结果按期写入与单份提取相同的缓存键 (两种模板要求的字段和单位一致)
+        """
+        results = {}
+        pending = []
+        for report_period, txt_path, akshare_data, fields in items:
+            text = self._llm_text(txt_path)
+            cached = self.cache.get(text, self._cache_version(fields), self.model_name)
+            if cached is not None:
+                results[report_period] = cached
+            else:
+                pending.append((report_period, txt_path, akshare_data, text, fields))
+        if len(pending) < len(items):
+            print(f"  💾 命中 LLM 缓存 {len(items) - len(pending)} 期")
+
+        for batch in self._pack_batches(pending):
+            if len(batch) > 1:
+                try:
+                    prompt = self._build_batch_prompt([(period, text, data, fields) for period, _, data, text, fields in batch])
+                    extracted = self._parse_json(self._call_llm(prompt, len(batch)))
+                except Exception as e:
+                    print(f"  ⚠️ 批量 LLM 提取失败，逐期重试: {e}")
+                    extracted = {}
+                for report_period, _, _, text, fields in batch:
+                    period_result = extracted.get(report_period)
+                    if isinstance(period_result, dict):
+                        if fields is not None:
+                            period_result = {field: period_result.get(field) for field in fields}
+                        results[report_period] = period_result
+                        self.cache.put(text, self._cache_version(fields), self.model_name, period_result)
+            for report_period, txt_path, akshare_data, text, fields in batch:
+                if report_period not in results:
+                    results[report_period] = self._extract_uncached(txt_path, text, akshare_data, fields)
+        return results
+    
+    def _pack_batches(self, pending):
+        """按顺序装箱：每批最多 BATCH_MAX_PERIODS 期，报表页总长不超过 LLM_MAX_CHARS"""
+        batches, batch, size = [], [], 0
+        for item in pending:
+            if batch and (len(batch) >= self.BATCH_MAX_PERIODS or size + len(item[3]) > self.LLM_MAX_CHARS):
+                batches.append(batch)
+                batch, size = [], 0
+            batch.append(item)
+            size += len(item[3])
+        if batch:
+            batches.append(batch)
+        return batches
+    
+    def _llm_text(self, txt_path):
+        """只发送主要会计数据与三大合并报表所在页；没有索引时取前 100k 字符，避免超出 token 限制"""
+        text = read_sections(txt_path, self.STATEMENT_SECTIONS)
+        if text is None:
+            with open(txt_path, 'r', encoding='utf-8') as f:
+                text = f.read(self.LLM_MAX_CHARS)
+        return text[:self.LLM_MAX_CHARS]
+    
+    def _build_prompt(self, text, akshare_data, fields=None):
+        """单个报告期的提示词 (修改时递增 PROMPT_VERSION)；fields 收窄要提取的字段，默认 LLM_FIELDS 全部"""
+        fields = fields or list(self.LLM_FIELDS)
+        references = "\n".join(
+            f"- {self.LLM_FIELDS[field][0]}: {(akshare_data.get(field) or 0) / 1e8:.2f} 亿元" for field in fields
+        )
+        schema = ",\n".join(f'    "{field}": <{self.LLM_FIELDS[field][1]}，单位：元>' for field in fields)
+        return f"""
 你是一个专业的财务分析师。请从以下财务报告中提取关键数字。
 
 参考值（来自 AkShare，用于对比）：
-- 营业收入: {akshare_data.get('revenue', 0) / 1e8:.2f} 亿元
-- 归母净利润: {akshare_data.get('net_income_parent', 0) / 1e8:.2f} 亿元
-- 总资产: {akshare_data.get('total_assets', 0) / 1e8:.2f} 亿元
-- 股东权益: {akshare_data.get('total_equity', 0) / 1e8:.2f} 亿元
-- 所得税费用: {akshare_data.get('income_tax_expenses', 0) / 1e8:.2f} 亿元
-- 流动资产: {akshare_data.get('current_assets', 0) / 1e8:.2f} 亿元
-- 非流动资产: {akshare_data.get('non_current_assets', 0) / 1e8:.2f} 亿元
-- 无形资产: {akshare_data.get('intangible_assets', 0) / 1e8:.2f} 亿元
-- 流动负债: {akshare_data.get('current_liabilities', 0) / 1e8:.2f} 亿元
-- 非流动负债: {akshare_data.get('non_current_liabilities', 0) / 1e8:.2f} 亿元
-- 股本: {akshare_data.get('share_capital', 0) / 1e8:.2f} 亿元
-- 未分配利润: {akshare_data.get('retained_earnings', 0) / 1e8:.2f} 亿元
-- 现金流量净额: {akshare_data.get('net_cash_flow', 0) / 1e8:.2f} 亿元
+{references}
 
 请从财报原文中提取这些数字（合并报表），返回 JSON 格式：
 {{
-    "revenue": <营业收入，单位：元>,
-    "net_income_parent": <归母净利润，单位：元>,
-    "total_assets": <总资产，单位：元>,
-    "total_equity": <股东权益合计，单位：元>,
-    "income_tax_expenses": <所得税费用，单位：元>,
-    "current_assets": <流动资产合计，单位：元>,
-    "non_current_assets": <非流动资产合计，单位：元>,
-    "intangible_assets": <无形资产，单位：元>,
-    "current_liabilities": <流动负债合计，单位：元>,
-    "non_current_liabilities": <非流动负债合计，单位：元>,
-    "share_capital": <实收资本(或股本)，单位：元>,
-    "retained_earnings": <未分配利润，单位：元>,
-    "net_cash_flow": <现金及现金等价物净增加额，单位：元>
+{schema}
 }}
 
 财报原文（节选）：
@@ -154,146 +401,289 @@ class FinancialDataValidator:
 
 只返回 JSON，不要其他解释。如果某个字段找不到，返回 null。
 """
-            
-            response = self.model.generate_content(prompt)
-            result_text = response.text.strip()
-            
-            # 提取 JSON（去掉可能的 markdown 标记）
-            if '```json' in result_text:
-                result_text = result_text.split('```json')[1].split('```')[0]
-            elif '```' in result_text:
-                result_text = result_text.split('```')[1].split('```')[0]
-            
-            extracted = json.loads(result_text)
-            
-            # 转换 None 为实际的 None
-            return {k: (v if v is not None else None) for k, v in extracted.items()}
-            
-        except Exception as e:
-            print(f"  ⚠️ LLM 提取失败: {e}")
-            # 降级到正则表达式
-            return self._extract_with_regex(txt_path)
+    
+    def _build_batch_prompt(self, periods):
+        """
+        多个报告期的提示词：periods 为 [(report_period, 报表页文本, akshare_data, fields)]
+        schema 取各期字段的并集；某期只需部分字段时在该期注明
+        """
+        wanted = [fields or list(self.LLM_FIELDS) for _, _, _, fields in periods]
+        union = [field for field in self.LLM_FIELDS if any(field in fields for fields in wanted)]
+        schema = ",\n".join(f'        "{field}": <{self.LLM_FIELDS[field][1]}，单位：元>' for field in union)
+        blocks = []
+        for (report_period, text, akshare_data, _), fields in zip(periods, wanted):
+            references = "；".join(
+                f"{self.LLM_FIELDS[field][0]} {(akshare_data.get(field) or 0) / 1e8:.2f}" for field in fields
+            )
+            only = "" if fields == union else f"只需提取：{'、'.join(self.LLM_FIELDS[field][1] for field in fields)}\n"
+            blocks.append(f"=== 报告期 {report_period} ===\n{only}参考值（亿元）：{references}\n财报原文（节选）：\n{text}")
+        blocks = "\n\n".join(blocks)
+        return f"""
+你是一个专业的财务分析师。以下是同一家公司 {len(periods)} 个报告期的财务报告节选，请分别提取每个报告期的关键数字。
+每个报告期附有参考值（来自 AkShare，用于对比）。
+
+请从财报原文中提取这些数字（合并报表），以报告期为键返回 JSON 格式：
+{{
+    "<报告期>": {{
+{schema}
+    }}
+}}
+
+{blocks}
+
+只返回 JSON，不要其他解释。如果某个字段找不到，返回 null。
+"""
+    
+    def _call_llm(self, prompt, periods):
+        """调用模型 (限速 + 重试)，记录本次请求的 token 与耗时，返回响应文本"""
+        t0 = time.perf_counter()
+        response = retry_call(self._generate, prompt, retries=self.retries, backoff=self.retry_backoff,
+                              should_retry=_should_retry_llm)
+        result_text = response.text.strip()
+        # Gemini 响应带 usage_metadata；没有时按字符数估算
+        usage = getattr(response, 'usage_metadata', None)
+        self.llm_calls.append({
+            'periods': periods,
+            'prompt_chars': len(prompt),
+            'prompt_tokens': getattr(usage, 'prompt_token_count', None) or estimate_tokens(prompt),
+            'output_tokens': getattr(usage, 'candidates_token_count', None) or estimate_tokens(result_text),
+            'latency': time.perf_counter() - t0,
+        })
+        return result_text
+    
+    @staticmethod
+    def _parse_json(result_text):
+        # 提取 JSON（去掉可能的 markdown 标记）
+        if '```json' in result_text:
+            result_text = result_text.split('```json')[1].split('```')[0]
+        elif '```' in result_text:
+            result_text = result_text.split('```')[1].split('```')[0]
+        return json.loads(result_text)
+    
+    def llm_call_stats(self, calls=None):
+        """模型请求统计：请求数、覆盖的报告期数、token 与平均耗时 (calls 默认为全部请求记录)"""
+        calls = list(self.llm_calls if calls is None else calls)
+        return {
+            'requests': len(calls),
+            'periods': sum(c['periods'] for c in calls),
+            'prompt_tokens': sum(c['prompt_tokens'] for c in calls),
+            'output_tokens': sum(c['output_tokens'] for c in calls),
+            'avg_latency': sum(c['latency'] for c in calls) / len(calls) if calls else 0.0,
+        }
     
     def _extract_with_regex(self, txt_path):
-        """使用正则表达式提取财务数据（备用方案）"""
+        """使用正则表达式提取财务数据（备用方案，见 extractors.FieldExtractor）"""
         try:
-            with open(txt_path, 'r', encoding='utf-8') as f:
-                text = f.read()
+            found = self._scan_local(txt_path)
         except Exception as e:
             print(f"读取文件失败: {e}")
             return {}
         
+        return {field: match['value'] for field, match in found.items()}
+    
+    def _scan_local(self, txt_path):
+        """
+        本地提取并逐字段打分：先查结构化表格 (按列对齐的本期数)，
+        表格里没有的字段在报表章节内正则匹配，章节内也找不到的再逐关键词检索全文 (mmap，只查缺失字段)
+        """
+        found = {}
+        tables = self._get_tables(txt_path)
+        if tables:
+            for field in self.CRITICAL_FIELDS:
+                row = lookup(tables, self.TABLE_FIELDS[field])
+                if row and row['current'] is not None:
+                    found[field] = self._table_match(row)
+        if len(found) < len(self.CRITICAL_FIELDS):
+            section_text = read_sections(txt_path, self.STATEMENT_SECTIONS)
+            if section_text:
+                for field, match in self.extractor.scan(section_text).items():
+                    found.setdefault(field, match)
+        missing = [field for field in self.CRITICAL_FIELDS if field not in found]
+        if missing:
+            for field, match in self.extractor.scan_file(txt_path, fields=missing).items():
+                found[field] = flag(match, 'full_text')
+        for small, large in self.CONSISTENCY_RULES:
+            if small in found and large in found and abs(found[small]['value']) > abs(found[large]['value']):
+                flag(found[small], 'inconsistent')
+                flag(found[large], 'inconsistent')
+        return found
+    
+    def _generate(self, prompt):
+        """限速后调用一次模型 (每次重试都重新计入配额)"""
+        if self.rpm_limiter:
+            self.rpm_limiter.acquire()
+        if self.tpm_limiter:
+            self.tpm_limiter.acquire(estimate_tokens(prompt))
+        return self.model.generate_content(prompt)
+    
+    def validate_periods(self, stock_code, report_periods):
+        """
+        验证同一股票的多个报告期：LLM 提取按 BATCH_MAX_PERIODS 期合并请求 (见 _extract_batch_with_llm)，再逐期比对
+        返回 {report_period: validate_report 的结果}
+        """
         extracted = {}
-        
-        for field, (keywords, unit) in self.CRITICAL_FIELDS.items():
-            for keyword in keywords:
-                pattern = rf'{keyword}\s*\n?\s*([\d,]+\.?\d*)'
-                matches = re.findall(pattern, text)
-                
-                if matches:
-                    value_str = matches[0].replace(',', '')
+        if self.use_llm:
+            items = []
+            tiers = {}
+            for report_period in report_periods:
+                akshare_data = self._get_akshare_data(stock_code, report_period)
+                txt_path = self._get_txt_path(stock_code, report_period)
+                if not (akshare_data and txt_path and Path(txt_path).exists()):
+                    continue
+                local, escalate = tiers[report_period] = self._tier(txt_path)
+                if escalate:
+                    items.append((report_period, txt_path, akshare_data, escalate))
+                else:
+                    extracted[report_period] = {field: match['value'] for field, match in local.items()}
+            if len(items) > 1:
+                print(f"  🤖 使用 Gemini 批量提取 {stock_code} 的 {len(items)} 个报告期...")
+            elif items:
+                print("  🤖 使用 Gemini 提取财务数据...")
+            if items:
+                for report_period, llm_data in self._extract_batch_with_llm(items).items():
+                    local, escalate = tiers[report_period]
+                    extracted[report_period] = self._merge_tiers(local, llm_data, escalate)
+        return {
+            report_period: self.validate_report(stock_code, report_period, pdf_data=extracted.get(report_period))
+            for report_period in report_periods
+        }
+    
+    def validate_many(self, targets, workers=8, batch_size=1):
+        """
+        并发验证多个报告期：线程池重叠各报告的模型调用 (受 rpm / tpm 限速，429 / 5xx 自动重试)
+        质量标记与缓存写入交给单写入线程
+        targets: [(stock_code, report_period), ...]
+        batch_size > 1 时同一股票每 batch_size 个报告期合并为一个任务 (validate_periods，一次 LLM 请求)
+        返回 {(stock_code, report_period): validate_report 的结果}
+        """
+        targets = list(targets)
+        by_stock = {}
+        for code, period in targets:
+            by_stock.setdefault(code, []).append(period)
+        tasks = [(code, periods[i:i + batch_size]) for code, periods in by_stock.items()
+                 for i in range(0, len(periods), max(batch_size, 1))]
+        print(f"🚀 并发验证 {len(targets)} 个报告期 (并发 {workers}，{len(tasks)} 个任务)...")
+        self.writer = self.cache.writer = get_writer(self.db_path)
+        results = {}
+        calls_before = len(self.llm_calls)
+        t0 = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = {pool.submit(self.validate_periods, code, periods): (code, periods) for code, periods in tasks}
+                for future in as_completed(futures):
+                    code, periods = futures[future]
                     try:
-                        value = float(value_str)
-                        
-                        if value > 1e9:
-                            extracted[field] = value
-                        elif value > 1e5:
-                            extracted[field] = value * 1e4
-                        else:
-                            extracted[field] = value * 1e8
-                        
-                        break
-                    except ValueError:
-                        continue
-        
-        return extracted
+                        for period, result in future.result().items():
+                            results[(code, period)] = result
+                    except Exception as e:
+                        for period in periods:
+                            results[(code, period)] = {'status': 'ERROR', 'message': str(e)}
+            # 等待写线程处理完排队的写入 (FIFO，最后一个完成即全部完成)
+            self.writer.submit(lambda: None).result()
+            for future in self._writes:
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f"  ⚠️ 写入验证结果失败: {e}")
+        finally:
+            self.writer = self.cache.writer = None
+            self._writes = []
+
+        statuses = [r['status'] for r in results.values()]
+        print(f"✅ 并发验证完成: {len(targets)} 个报告期, {time.perf_counter() - t0:.1f}s "
+              f"(VERIFIED {statuses.count('VERIFIED')}, CONFLICT {statuses.count('CONFLICT')}, "
+              f"其他 {len(statuses) - statuses.count('VERIFIED') - statuses.count('CONFLICT')})")
+        if self.use_llm:
+            tier = self.escalation_stats()
+            print(f"  📝 分级提取: {tier['escalated_reports']}/{tier['reports']} 份报告、"
+                  f"{tier['escalated_fields']}/{tier['fields']} 个字段升级到 LLM ({tier['field_rate']:.0%})")
+        stats = self.llm_call_stats(self.llm_calls[calls_before:])
+        if stats['requests']:
+            print(f"  🤖 LLM 请求 {stats['requests']} 次 (覆盖 {stats['periods']} 期), "
+                  f"输入 {stats['prompt_tokens']} / 输出 {stats['output_tokens']} tokens, "
+                  f"平均 {stats['avg_latency']:.1f}s/次")
+        return results
     
     def _get_akshare_data(self, stock_code, report_period):
         """从数据库读取 AkShare 数据"""
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            SELECT revenue, net_income_parent, total_assets, total_equity,
-                   income_tax_expenses, current_assets, non_current_assets, intangible_assets,
-                   current_liabilities, non_current_liabilities, share_capital, retained_earnings, net_cash_flow
-            FROM financial_reports_raw
-            WHERE stock_code = ? AND report_period = ?
-        ''', (stock_code, report_period))
-        
-        row = cursor.fetchone()
-        if not row:
-            return None
-        
-        return {
-            'revenue': row[0],
-            'net_income_parent': row[1],
-            'total_assets': row[2],
-            'total_equity': row[3],
-            'income_tax_expenses': row[4],
-            'current_assets': row[5],
-            'non_current_assets': row[6],
-            'intangible_assets': row[7],
-            'current_liabilities': row[8],
-            'non_current_liabilities': row[9],
-            'share_capital': row[10],
-            'retained_earnings': row[11],
-            'net_cash_flow': row[12]
-        }
+        return repository.raw_row(stock_code, report_period, self.AKSHARE_FIELDS, db_path=self.db_path)
     
     def _get_txt_path(self, stock_code, report_period):
         """从数据库获取 TXT 文件路径"""
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            SELECT txt_path FROM financial_reports_files
-            WHERE stock_code = ? AND report_period = ?
-        ''', (stock_code, report_period))
-        
-        row = cursor.fetchone()
-        if row:
-            txt_path = Path(__file__).parent / row[0]
-            return str(txt_path)
-        return None
+        txt_path = repository.txt_path(stock_code, report_period, db_path=self.db_path)
+        return str(Path(__file__).parent / txt_path) if txt_path else None
+    
+    def _get_tables(self, txt_path):
+        """TXT 同名 PDF 的结构化表格 (首次使用时解析并缓存，见 tables.py)；不可用时返回 None"""
+        if not (self.USE_TABLES and HAS_TABLES):
+            return None
+        try:
+            return get_tables(Path(txt_path).with_suffix('.pdf'), txt_path)
+        except Exception as e:
+            print(f"  ⚠️ 表格解析失败: {e}")
+            return None
+    
+    @staticmethod
+    def _table_match(row):
+        """表格行 → 与 FieldExtractor.scan 相同格式的结果 (单元格按列对齐，只在单位未声明时扣分)"""
+        return flag({
+            'value': row['current'],
+            'raw': row['current'] / (UNITS[row['unit']] if row['unit'] else 1),
+            'keyword': row['item'],
+            'priority': 0,
+            'unit': row['unit'],
+            'offset': None,
+            'prior': row['prior'],
+            'source': 'table',
+        }, *(['guessed_unit'] if row['unit'] is None else []))
+    
+    def autofill_from_tables(self, stock_code, report_period, txt_path=None, akshare_data=None):
+        """把数据库中为空的 AKSHARE_FIELDS 字段用报表表格的本期数回填，返回回填的 {字段: 值}"""
+        txt_path = txt_path or self._get_txt_path(stock_code, report_period)
+        akshare_data = akshare_data or self._get_akshare_data(stock_code, report_period)
+        if not txt_path or not akshare_data:
+            return {}
+        missing = [field for field in self.AKSHARE_FIELDS if akshare_data.get(field) is None]
+        tables = self._get_tables(txt_path) if missing else None
+        if not tables:
+            return {}
+        values = {}
+        for field in missing:
+            row = lookup(tables, self.TABLE_FIELDS[field])
+            if row and row['current'] is not None and row['unit'] is not None:
+                values[field] = row['current']
+        self._autofill_data(stock_code, report_period, values)
+        return values
     
     def _autofill_data(self, stock_code, report_period, data_dict):
-        """回填缺失数据到数据库"""
+        """回填缺失数据到数据库 (同时更新 updated_at，触发增量指标计算)"""
         if not data_dict:
             return
-            
-        cursor = self.conn.cursor()
-        
-        # 构建 UPDATE 语句
-        set_clauses = [f"{k} = ?" for k in data_dict.keys()]
-        values = list(data_dict.values())
-        values.extend([stock_code, report_period])
-        
-        sql = f'''
-            UPDATE financial_reports_raw
-            SET {', '.join(set_clauses)}
-            WHERE stock_code = ? AND report_period = ?
-        '''
         
         try:
-            cursor.execute(sql, values)
-            self.conn.commit()
+            if self.writer is not None:
+                self._writes.append(self.writer.submit(
+                    repository.update_raw, stock_code, report_period, data_dict, db_path=self.db_path
+                ))
+            else:
+                repository.update_raw(stock_code, report_period, data_dict, db_path=self.db_path)
             print(f"  ✅ 已自动回填 {len(data_dict)} 个字段")
         except Exception as e:
             print(f"  ⚠️ 回填失败: {e}")
 
     def _update_quality_flag(self, stock_code, report_period, status, details=None):
         """更新数据库中的质量标记和详情"""
-        cursor = self.conn.cursor()
-        
         # 将详情转换为 JSON 字符串
         details_json = json.dumps(details, ensure_ascii=False) if details else None
-        
-        cursor.execute('''
-            UPDATE financial_reports_raw
-            SET data_quality = ?, validation_details = ?
-            WHERE stock_code = ? AND report_period = ?
-        ''', (status, details_json, stock_code, report_period))
-        self.conn.commit()
+        if self.writer is not None:
+            self._writes.append(self.writer.submit(
+                repository.set_quality, stock_code, report_period, status, details_json, db_path=self.db_path
+            ))
+            return
+        repository.set_quality(stock_code, report_period, status, details_json, db_path=self.db_path)
     
     def close(self):
-        self.conn.close()
+        close_conn(self.db_path)
 
 if __name__ == "__main__":
     # 测试验证器